@@ -0,0 +1,92 @@
+import argparse
+from datetime import date, timedelta
+import random
+import time
+
+from recurrence import RECURRENCE_PRESETS
+from storage import open_storage
+from task_core import Task
+from task_index import PRIORITIES
+
+# Words descriptions are made of, so searches find a realistic spread of
+# matches: common words hit many tasks, rare ones a few
+COMMON_WORDS = ("update", "review", "write", "check", "call", "plan", "fix", "send", "prepare",
+                "meeting", "report", "email", "notes", "budget", "draft", "team", "client")
+RARE_WORDS = ("invoice", "dentist", "quarterly", "migration", "onboarding", "warranty",
+              "passport", "newsletter", "roadmap", "inventory", "renovation", "conference")
+TAG_POOL = ("work", "home", "errand", "urgent", "later", "finance", "health", "family",
+            "project-a", "project-b", "project-c", "reading")
+
+# Share of tasks that are completed, dated, repeating and tagged
+COMPLETED_SHARE = 0.4
+DATED_SHARE = 0.7
+REPEATING_SHARE = 0.02
+TAGGED_SHARE = 0.6
+
+# Creation times are spread over this many days before now, due dates
+# this many days either side of today
+CREATED_SPAN_DAYS = 730
+DUE_SPAN_DAYS = 365
+
+
+def make_task(rng, task_id, now, today):
+    # One synthetic task with every Task.to_dict field in use
+    words = rng.choices(COMMON_WORDS, k=rng.randint(2, 5))
+    if rng.random() < 0.2:
+        words.insert(rng.randrange(len(words) + 1), rng.choice(RARE_WORDS))
+    description = " ".join(words).capitalize() + f" #{task_id}"
+
+    due_date = None
+    recurrence = None
+    if rng.random() < DATED_SHARE:
+        due_date = (today + timedelta(days=rng.randint(-DUE_SPAN_DAYS, DUE_SPAN_DAYS))).isoformat()
+        if rng.random() < REPEATING_SHARE:
+            recurrence = rng.choice(list(RECURRENCE_PRESETS.values()))
+
+    tags = ()
+    if rng.random() < TAGGED_SHARE:
+        tags = rng.sample(TAG_POOL, rng.randint(1, 3))
+
+    completed = rng.random() < COMPLETED_SHARE
+    task = Task(description, rng.choice(PRIORITIES), due_date, completed, task_id, recurrence, tags)
+    task.created = now - rng.randrange(CREATED_SPAN_DAYS * 86400)
+    task.completed_time = (rng.randint(task.created, now) if completed else None)
+    return task
+
+
+def generate_tasks(count, seed=0, now=None):
+    # Yield count tasks with ids 1..count; the same seed and now give the
+    # same tasks
+    rng = random.Random(seed)
+    now = int(time.time()) if now is None else now
+    today = date.fromtimestamp(now)
+    for task_id in range(1, count + 1):
+        yield make_task(rng, task_id, now, today)
+
+
+def write_tasks(filename, count, seed=0, compact=False, now=None):
+    # Stream the tasks straight into the file, so generating millions of
+    # them does not hold them in memory
+    storage = open_storage(filename, compact)
+    try:
+        storage.save(generate_tasks(count, seed, now))
+    finally:
+        storage.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic task file for benchmarking")
+    parser.add_argument("--count", type=int, default=100000, help="number of tasks (default: 100000)")
+    parser.add_argument("--output", required=True,
+                        help="task file to write; .db, .sqlite and .sqlite3 files are SQLite databases")
+    parser.add_argument("--compact", action="store_true", help="write JSON one task per line")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    write_tasks(args.output, args.count, args.seed, args.compact)
+    print(f"Wrote {args.count} tasks to {args.output} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
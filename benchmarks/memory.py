@@ -0,0 +1,78 @@
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from task_core import Task
+from task_store import TaskStore
+
+PRIORITY_CYCLE = ("High", "Medium", "Low")
+
+
+def make_task(i, base_time):
+    task = Task(f"Synthetic task number {i} for the memory benchmark",
+                PRIORITY_CYCLE[i % 3],
+                f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}" if i % 4 else None,
+                i % 5 == 0,
+                i + 1)
+    task.created = base_time - i * 60
+    return task
+
+
+def build_dict(count, base_time):
+    tasks = {}
+    for i in range(count):
+        task = make_task(i, base_time)
+        tasks[task.id] = task
+    return tasks
+
+
+def build_store(count, base_time):
+    tasks = TaskStore()
+    for i in range(count):
+        task = make_task(i, base_time)
+        tasks[task.id] = task
+    return tasks
+
+
+def measure(builder, count):
+    # Memory still held once the layout is built, and the peak while building
+    base_time = int(time.time())
+    gc.collect()
+    tracemalloc.start()
+    tasks = builder(count, base_time)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tasks
+    gc.collect()
+    return {"bytes": current, "peak_bytes": peak, "bytes_per_task": current / count}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare task memory use of the dict and columnar layouts")
+    parser.add_argument("--count", type=int, default=1000000, help="number of tasks (default: 1000000)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {
+        "count": args.count,
+        "dict": measure(build_dict, args.count),
+        "columnar": measure(build_store, args.count),
+    }
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{args.count} tasks")
+    for layout in ("dict", "columnar"):
+        result = results[layout]
+        print(f"  {layout:<9} {result['bytes'] / 2**20:8.1f} MiB  "
+              f"(peak {result['peak_bytes'] / 2**20:.1f} MiB, {result['bytes_per_task']:.0f} B/task)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import COMMON_WORDS, RARE_WORDS, TAG_POOL, write_tasks
+from sort_index import SORT_KEYS
+from task_core import FILTER_NAMES, TaskList, apply_filter, filter_query, new_filters
+
+# Format version of the JSON results, bumped when their layout changes
+RESULTS_VERSION = 1
+
+# Filters timed, in the order a user might click them; each one is applied
+# on its own, starting from no filter
+FILTERS = FILTER_NAMES[1:] + (f"tag:{TAG_POOL[0]}", f"any-tag:{TAG_POOL[1]}",
+                              f"not-tag:{TAG_POOL[2]}")
+
+# Search terms timed: a word most tasks contain, a rare one, a prefix typed
+# halfway and a word no task contains
+SEARCH_TERMS = (COMMON_WORDS[0], RARE_WORDS[0], RARE_WORDS[1][:3], "zzzz")
+
+# Regressions reported by --compare: a median this much slower than the
+# baseline's, and at least this many milliseconds slower
+DEFAULT_THRESHOLD = 0.2
+MIN_REGRESSION_MS = 1.0
+
+# Longest wait for a background load or save in the window
+UI_TIMEOUT_S = 3600
+
+
+def measure(func, repeat, setup=None):
+    # Run func repeat times and summarize the wall-clock times in ms;
+    # setup, if given, runs untimed before each run. Garbage left by earlier
+    # runs is collected first so it is not charged to the next one.
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return {"runs": repeat,
+            "min_ms": round(min(times), 3),
+            "median_ms": round(statistics.median(times), 3),
+            "max_ms": round(max(times), 3)}
+
+
+def model_benchmarks(filename, repeat, workdir):
+    # The TaskList behind both the window and the command line, so these
+    # also run without a display
+    results = {}
+    model = TaskList()
+    results["model.load"] = measure(lambda: model.load(filename), repeat)
+    tasks = len(model)
+
+    copy = os.path.join(workdir, "model" + os.path.splitext(filename)[1])
+    results["model.write"] = measure(lambda: model.write(copy), repeat,
+                                     lambda: os.path.exists(copy) and os.remove(copy))
+    results["model.query"] = measure(lambda: model.query(), repeat)
+    for name in FILTERS:
+        query = filter_query(apply_filter(new_filters(), name))
+        results[f"model.filter:{name}"] = measure(lambda: model.query(**query), repeat)
+    for term in SEARCH_TERMS:
+        results[f"model.search:{term}"] = measure(lambda: model.query(search=term), repeat)
+    # Orders are built on the first sort by a column and kept up to date
+    # after that, so both costs are timed
+    for column in SORT_KEYS:
+        results[f"model.sort:{column}"] = measure(lambda: model.query(sort=column), repeat,
+                                                  model.sort_index.clear)
+        results[f"model.resort:{column}"] = measure(lambda: model.query(sort=column), repeat)
+    results["model.stats"] = measure(lambda: model.stats.summary(), repeat)
+    model.close()
+    return tasks, results
+
+
+def wait_for_io(app):
+    # Run the event loop until the background load or save has finished
+    deadline = time.monotonic() + UI_TIMEOUT_S
+    while app.io_job is not None:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{app.io_job} did not finish within {UI_TIMEOUT_S}s")
+        app.root.update()
+        time.sleep(0.001)
+
+
+def open_window():
+    # A withdrawn Tk root, or the reason there cannot be one
+    try:
+        import tkinter as tk
+    except ImportError as e:
+        return None, f"Tk is not available ({e})"
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return None, f"no display ({e})"
+    root.withdraw()
+    return root, None
+
+
+def ui_benchmarks(root, filename, repeat, workdir):
+    # TaskManager in a withdrawn window: what a user waits for, including
+    # the event loop work each action leaves behind
+    from main import TaskManager
+
+    results = {}
+    try:
+        # TaskManager opens tasks.json from the working directory if there
+        # is one, so it starts in an empty directory
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            app = TaskManager(root)
+        finally:
+            os.chdir(cwd)
+        root.update()
+
+        def load():
+            app.load_from_file(filename)
+            wait_for_io(app)
+
+        results["ui.load_from_file"] = measure(load, repeat)
+
+        # Exported, so the list stays tied to the file being measured
+        copy = os.path.join(workdir, "ui" + os.path.splitext(filename)[1])
+
+        def save():
+            app.save_to_file(copy, job="exporting")
+            wait_for_io(app)
+
+        results["ui.save_to_file"] = measure(save, repeat)
+
+        def refresh():
+            app.refresh_task_list()
+            root.update_idletasks()
+
+        results["ui.refresh_task_list"] = measure(refresh, repeat)
+
+        for name in FILTERS:
+            def switch():
+                app.filter_tasks(name)
+                root.update_idletasks()
+
+            results[f"ui.filter:{name}"] = measure(switch, repeat,
+                                                   lambda: app.filter_tasks("All"))
+        app.filter_tasks("All")
+
+        # From the keystroke's query starting to the list showing its
+        # results; the SEARCH_DELAY_MS debounce in front of it is left out
+        for term in SEARCH_TERMS:
+            def type_term():
+                app.apply_search("", None)
+                app.search_var.set(term)
+                root.after_cancel(app.search_job)
+                app.search_job = None
+
+            def search():
+                app.run_search(app.search_generation)
+                while app.search_term != term:
+                    root.update()
+                root.update_idletasks()
+
+            results[f"ui.search:{term}"] = measure(search, repeat, type_term)
+        app.search_var.set("")
+        root.after_cancel(app.search_job)
+        app.run_search(app.search_generation)
+
+        # Alternate between two rows so each run fills the form
+        items = app.task_tree.get_children()[:2]
+        if len(items) == 2:
+            picks = iter(items * repeat)
+
+            def pick():
+                app.task_tree.selection_set(next(picks))
+
+            def select():
+                app.on_task_select(None)
+                root.update_idletasks()
+
+            results["ui.on_task_select"] = measure(select, repeat, pick)
+        app.model.close()
+    finally:
+        root.destroy()
+    return results
+
+
+def git_revision():
+    # Commit of the code being measured, or None outside a git checkout
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+
+def compare(results, baseline, threshold):
+    # Benchmarks whose median got slower than the baseline's by more than
+    # threshold, as (name, baseline ms, current ms)
+    regressions = []
+    for name, result in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        old, new = before["median_ms"], result["median_ms"]
+        if new > old * (1 + threshold) and new - old >= MIN_REGRESSION_MS:
+            regressions.append((name, old, new))
+    return regressions
+
+
+def print_results(results):
+    print(f"{results['tasks']} tasks from {results['file']} "
+          f"({results['file_bytes'] / 2**20:.1f} MiB), {results['repeat']} runs each")
+    for name, result in results["results"].items():
+        print(f"  {name:<32} {result['median_ms']:10.1f} ms  "
+              f"(min {result['min_ms']:.1f}, max {result['max_ms']:.1f})")
+    if results["ui_skipped"]:
+        print(f"  window benchmarks skipped: {results['ui_skipped']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time loading, saving, filtering, searching "
+                                                 "and sorting a task list")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--file", help="task file to measure (default: generate one)")
+    source.add_argument("--count", type=int, default=100000,
+                        help="number of tasks to generate when no --file is given (default: 100000)")
+    parser.add_argument("--format", choices=("json", "sqlite"), default="json",
+                        help="format of the generated file (default: json)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark (default: 5)")
+    parser.add_argument("--no-ui", action="store_true", help="skip the window benchmarks")
+    parser.add_argument("--output", help="write the results as JSON to this file ('-' for stdout)")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="results file of an earlier run; exit with status 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"slowdown of the median counted as a regression "
+                             f"(default: {DEFAULT_THRESHOLD})")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    workdir = tempfile.mkdtemp(prefix="task-benchmark-")
+    try:
+        filename = args.file and os.path.abspath(args.file)
+        if filename is None:
+            filename = os.path.join(workdir, "tasks.db" if args.format == "sqlite" else "tasks.json")
+            write_tasks(filename, args.count)
+
+        tasks, results = model_benchmarks(filename, args.repeat, workdir)
+        ui_skipped = "--no-ui given"
+        if not args.no_ui:
+            root, ui_skipped = open_window()
+            if root is not None:
+                results.update(ui_benchmarks(root, filename, args.repeat, workdir))
+        file_bytes = os.path.getsize(filename)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = {
+        "version": RESULTS_VERSION,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "file": args.file or f"generated {args.format}",
+        "file_bytes": file_bytes,
+        "tasks": tasks,
+        "repeat": args.repeat,
+        "ui_skipped": ui_skipped,
+        "results": results,
+    }
+
+    if args.output == "-":
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    else:
+        print_results(output)
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(output, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(output, baseline, args.threshold)
+        for name, old, new in regressions:
+            print(f"Regression: {name} {old:.1f} ms -> {new:.1f} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import argparse
+from datetime import date, timedelta
+import os
+import sys
+
+from perf import PERF
+from sort_index import SORT_KEYS
+from task_core import FILTER_NAMES, TAG_FILTERS, TaskList, apply_filter, filter_query, new_filters
+
+DEFAULT_FILE = "tasks.json"
+
+
+def read_stdin_lines():
+    # Non-blank lines from stdin, for commands given "-" instead of arguments
+    for line in sys.stdin:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def expand_args(values):
+    for value in values:
+        if value == "-":
+            yield from read_stdin_lines()
+        else:
+            yield value
+
+
+def format_task(task, due=None):
+    status = "x" if task.completed else " "
+    due = due or task.due_date or "-"
+    repeats = " (repeats)" if task.recurrence else ""
+    tags = "".join(f" #{tag}" for tag in task.tags)
+    return f"{task.id:>6} [{status}] {task.priority:<6} {due:<10} {task.description}{repeats}{tags}"
+
+
+def open_list(filename):
+    # A missing file is an empty list that is created on the first change.
+    # The search index is only built if a command searches.
+    tasks = TaskList()
+    if os.path.exists(filename):
+        tasks.load(filename, search=False)
+    return tasks
+
+
+def finish(tasks, filename):
+    # Changes are already journaled next to an existing file; write the file
+    # itself only when it is new or the journal has grown long
+    if not tasks.is_journaled():
+        tasks.save(filename)
+    tasks.close()
+
+
+def cmd_add(tasks, args):
+    # Read from stdin before locking the file for the batch
+    descriptions = list(expand_args(args.description))
+    with tasks.batch():
+        for description in descriptions:
+            task = tasks.add(description, args.priority, args.due, recurrence=args.repeat,
+                             tags=args.tags)
+            print(task.id)
+
+
+def read_ids(values):
+    try:
+        return [int(value) for value in expand_args(values)]
+    except ValueError as e:
+        raise ValueError(f"Task ids must be numbers: {e}") from None
+
+
+def cmd_complete(tasks, args):
+    tasks.set_completed_many(read_ids(args.ids), not args.undo)
+
+
+def cmd_delete(tasks, args):
+    tasks.delete_many(read_ids(args.ids))
+
+
+def cmd_purge(tasks, args):
+    deleted = tasks.delete_completed(args.older_than)
+    print(f"Deleted {len(deleted)} completed tasks", file=sys.stderr)
+
+
+def cmd_list(tasks, args):
+    filters = new_filters()
+    for name in args.filter:
+        apply_filter(filters, name)
+    for task_id in tasks.query(search=args.search, sort=args.sort, descending=args.descending,
+                               **filter_query(filters)):
+        print(format_task(tasks[task_id]))
+
+
+def cmd_search(tasks, args):
+    for task_id in tasks.query(search=args.term):
+        print(format_task(tasks[task_id]))
+
+
+def cmd_tags(tasks, args):
+    for tag, count in sorted(tasks.tag_counts().items()):
+        print(f"{count:>8} {tag}")
+
+
+def cmd_stats(tasks, args):
+    summary = tasks.stats.summary()
+    print(f"Tasks: {summary['total']}, completed: {summary['completed']} "
+          f"({summary['completion_rate']:.0%}), open: {summary['open']}")
+    print(f"Overdue: {summary['overdue']}, due today: {summary['due_today']}, "
+          f"repeating: {summary['open_repeating']}, no due date: {summary['open_undated']}")
+    for priority, counts in summary["by_priority"].items():
+        print(f"{priority:<8} {counts['open']:>8} open {counts['completed']:>8} completed")
+    if args.history:
+        print("\nDate        Created Completed  Rate")
+        for row in tasks.stats.history(args.history):
+            print(f"{row['date']} {row['created']:>8} {row['completed']:>9} {row['completion_rate']:>5.0%}")
+    if args.burndown:
+        print("\nDate            Due Remaining")
+        for row in tasks.stats.burndown(args.burndown):
+            print(f"{row['date']} {row['due']:>8} {row['remaining']:>9}")
+
+
+def cmd_import(tasks, args):
+    imported = tasks.import_file(args.source)
+    print(f"Imported {len(imported)} tasks from {args.source}", file=sys.stderr)
+
+
+def cmd_agenda(tasks, args):
+    # One line per date a task falls on, repeating tasks once per date
+    start = args.start or date.today().isoformat()
+    try:
+        end = (date.fromisoformat(start) + timedelta(days=args.days - 1)).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid date '{start}', use YYYY-MM-DD") from None
+    for day, task_id in tasks.agenda(start, end):
+        print(format_task(tasks.tasks[task_id], day))
+
+
+def cmd_export(tasks, args):
+    tasks.export(args.target, args.compact)
+    print(f"Exported {len(tasks)} tasks to {args.target}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Manage a task file without starting the window")
+    parser.add_argument("--file", default=DEFAULT_FILE,
+                        help=f"task file, JSON or SQLite (default: {DEFAULT_FILE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add tasks; '-' reads one description per line from stdin")
+    add.add_argument("description", nargs="+")
+    add.add_argument("--priority", default="Medium", choices=("High", "Medium", "Low"))
+    add.add_argument("--due", help="due date as YYYY-MM-DD")
+    add.add_argument("--repeat", help="Daily, Weekly, Monthly, Yearly or an RRULE; "
+                                      "the due date is the first date")
+    add.add_argument("--tags", help="comma separated tags, e.g. work,urgent")
+    add.set_defaults(handler=cmd_add, changes=True)
+
+    complete = commands.add_parser("complete", help="mark tasks completed; '-' reads ids from stdin")
+    complete.add_argument("ids", nargs="+")
+    complete.add_argument("--undo", action="store_true", help="mark them incomplete instead")
+    complete.set_defaults(handler=cmd_complete, changes=True)
+
+    delete = commands.add_parser("delete", help="delete tasks; '-' reads ids from stdin")
+    delete.add_argument("ids", nargs="+")
+    delete.set_defaults(handler=cmd_delete, changes=True)
+
+    purge = commands.add_parser("purge", help="delete completed tasks")
+    purge.add_argument("--older-than", type=int, metavar="DAYS",
+                       help="only tasks created more than DAYS days ago")
+    purge.set_defaults(handler=cmd_purge, changes=True)
+
+    list_parser = commands.add_parser("list", help="list tasks")
+    list_parser.add_argument("--filter", action="append", default=[], metavar="FILTER",
+                             help=f"sidebar filter ({', '.join(FILTER_NAMES)}) or a tag filter "
+                                  f"({', '.join(prefix + 'TAG' for prefix in TAG_FILTERS)}); "
+                                  "repeat to combine")
+    list_parser.add_argument("--search", help="only tasks whose description matches")
+    list_parser.add_argument("--sort", choices=sorted(SORT_KEYS), help="order by this field")
+    list_parser.add_argument("--descending", action="store_true", help="reverse the sort order")
+    list_parser.set_defaults(handler=cmd_list, changes=False)
+
+    search = commands.add_parser("search", help="list tasks whose description matches a term")
+    search.add_argument("term")
+    search.set_defaults(handler=cmd_search, changes=False)
+
+    agenda = commands.add_parser("agenda", help="incomplete tasks by date, with each date of "
+                                                 "repeating tasks")
+    agenda.add_argument("--days", type=int, default=7, help="number of days (default: 7)")
+    agenda.add_argument("--from", dest="start", metavar="DATE",
+                        help="first day as YYYY-MM-DD (default: today)")
+    agenda.set_defaults(handler=cmd_agenda, changes=False)
+
+    tags = commands.add_parser("tags", help="list the tags in use with their task counts")
+    tags.set_defaults(handler=cmd_tags, changes=False)
+
+    stats = commands.add_parser("stats", help="completion, overdue and per-priority counts")
+    stats.add_argument("--history", type=int, metavar="DAYS",
+                       help="also list tasks created and completed on each of the last DAYS days")
+    stats.add_argument("--burndown", type=int, metavar="DAYS",
+                       help="also list open tasks due on each of the next DAYS days")
+    stats.set_defaults(handler=cmd_stats, changes=False)
+
+    import_parser = commands.add_parser("import", help="append the tasks of another task file")
+    import_parser.add_argument("source")
+    import_parser.set_defaults(handler=cmd_import, changes=True)
+
+    export = commands.add_parser("export", help="write the tasks to another task file")
+    export.add_argument("target")
+    export.add_argument("--compact", action="store_true", help="one task per line in JSON output")
+    export.set_defaults(handler=cmd_export, changes=False)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        tasks = open_list(args.file)
+        args.handler(tasks, args)
+        if args.changes:
+            finish(tasks, args.file)
+        else:
+            tasks.close()
+    except KeyError as e:
+        sys.exit(f"error: no task with id {e}")
+    except (OSError, ValueError) as e:
+        sys.exit(f"error: {e}")
+    finally:
+        # TASK_MANAGER_PERF=1 reports where the time went
+        if PERF.enabled:
+            print("\n".join(PERF.report()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import json
+import os
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def journal_path(filename):
+    return filename + JOURNAL_SUFFIX
+
+
+def read_journal_from(path, offset):
+    # Records in complete lines from byte offset on, and the offset after
+    # them. A crash can leave a half-written last line; it is not read, and
+    # the next writer ends it so it is skipped from then on.
+    try:
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            data = file.read()
+    except FileNotFoundError:
+        return [], 0
+
+    end = data.rfind(b"\n") + 1
+    records = []
+    for line in data[:end].splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records, offset + end
+
+
+def put_record(task):
+    return {"op": "put", "task": task.to_dict()}
+
+
+def delete_record(task_id, version=0):
+    record = {"op": "delete", "id": task_id}
+    if version:
+        record["version"] = version
+    return record
+
+
+class Journal:
+    # Write-ahead log next to a task file. Every change is appended as one
+    # JSON line ("put" with the full task, or "delete" with its id) and
+    # flushed to disk before returning, so the file plus its journal always
+    # hold the latest state. compact() callers fold it into the file.
+    # Processes sharing the file append to the same journal with the file
+    # locked, and read what the others appended from offset on.
+    def __init__(self, filename, offset=None, entries=None):
+        self.filename = filename
+        self.path = journal_path(filename)
+        self.file = None
+        if offset is None:
+            records, offset = read_journal_from(self.path, 0)
+            entries = len(records)
+        # Bytes of the journal this list has applied, and records in them
+        self.offset = offset
+        self.entries = entries
+
+    def write(self, records):
+        # Called with the file locked and every earlier record read, so
+        # anything past offset is a line a crash left half-written
+        if self.file is None:
+            self.file = open(self.path, 'a')
+        lines = [json.dumps(record, separators=(",", ":")) + "\n" for record in records]
+        count = len(lines)
+        if os.fstat(self.file.fileno()).st_size > self.offset:
+            lines.insert(0, "\n")
+        self.file.writelines(lines)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.offset = os.fstat(self.file.fileno()).st_size
+        self.entries += count
+
+    def read_new(self):
+        # Records other processes appended since this list last read or
+        # wrote the journal
+        records, self.offset = read_journal_from(self.path, self.offset)
+        self.entries += len(records)
+        return records
+
+    def has_new(self):
+        # A cheap check for read_new() without opening the journal
+        try:
+            return os.path.getsize(self.path) > self.offset
+        except FileNotFoundError:
+            return False
+
+    def restart(self):
+        # Another process folded the journal into the task file; the journal
+        # now only holds records written after that
+        self.close()
+        self.offset = 0
+        self.entries = 0
+
+    def fold(self):
+        # Called with the file locked once the task file holds every record
+        # up to offset. Records past it, appended by other processes after
+        # this list last read the journal, are kept.
+        self.close()
+        records, _ = read_journal_from(self.path, self.offset)
+        if records:
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w') as file:
+                file.writelines(json.dumps(record, separators=(",", ":")) + "\n"
+                                for record in records)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+        self.offset = 0
+        self.entries = len(records)
+
+    def reset(self):
+        # Called once the task file holds everything the journal did
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.offset = 0
+        self.entries = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def apply_journal(tasks, records, task_factory):
+    # Replay journal records onto an id -> task mapping; returns the ids
+    # that were put, the ids that were deleted and the highest version
+    # stamp seen. A record is skipped if the task already has its version
+    # or a later one; records from before version stamps always apply.
+    put_ids = set()
+    deleted_ids = set()
+    highest = 0
+    for record in records:
+        if record.get("op") == "put":
+            task = task_factory(record["task"])
+            highest = max(highest, task.version)
+            current = tasks.get(task.id)
+            if current is not None and 0 < task.version <= current.version:
+                continue
+            tasks[task.id] = task
+            put_ids.add(task.id)
+            deleted_ids.discard(task.id)
+        elif record.get("op") == "delete":
+            version = record.get("version", 0)
+            highest = max(highest, version)
+            current = tasks.get(record["id"])
+            if current is None or (version and version < current.version):
+                continue
+            del tasks[record["id"]]
+            put_ids.discard(record["id"])
+            deleted_ids.add(record["id"])
+    return put_ids, deleted_ids, highest
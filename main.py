@@ -1,38 +1,137 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import json
-from datetime import datetime
+from tkinter import ttk, messagebox, filedialog, simpledialog
+from datetime import date
 import os
+import queue
+import threading
+import time
 
-class Task:
-    def __init__(self, description, priority="Medium", due_date=None, completed=False):
-        self.description = description
-        self.priority = priority
-        self.due_date = due_date
-        self.completed = completed
-        self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-    def to_dict(self):
-        return {
-            "description": self.description,
-            "priority": self.priority,
-            "due_date": self.due_date,
-            "completed": self.completed,
-            "created_at": self.created_at
-        }
-    
-    @classmethod
-    def from_dict(cls, data):
-        task = cls(data["description"], data["priority"], data["due_date"], data["completed"])
-        task.created_at = data["created_at"]
-        return task
+from perf import PERF, timed
+from task_core import (TaskList, apply_filter, clear_tag_filters, describe_filters, filter_query, 
+                       new_filters, read_task_file)
+from recurrence import NO_RECURRENCE, RECURRENCE_PRESETS, describe_recurrence
+from reminders import DUE, OVERDUE
+from sort_index import DAY_COLUMNS, shown_due_date, task_status
+from task_index import PRIORITIES
+from undo import UndoHistory
+
+# Rows rendered below the viewport so resizing never shows empty space
+VIEW_BUFFER_ROWS = 2
+
+# Search waits this long after the last keystroke before running
+SEARCH_DELAY_MS = 150
+
+# Search candidates confirmed per event loop tick
+SEARCH_BATCH = 50000
+
+# Tasks handed from the loader thread to the view at a time
+LOAD_BATCH = 5000
+
+# How often the background I/O queue is checked, and how many messages are
+# handled per check
+IO_POLL_MS = 50
+IO_MESSAGES_PER_POLL = 20
+
+# How often to check whether the journal should be folded into its file
+AUTOSAVE_MS = 60000
+
+# How often to look for changes other processes made to the same file
+SYNC_POLL_MS = 1000
+
+# The statistics window redraws this long after the last change, so a burst
+# of edits redraws it once
+STATS_REFRESH_MS = 500
+
+# Day ranges offered by the statistics window
+STATS_DAYS = ("7", "30", "90", "365")
+
+# How often the perf overlay in the status bar is redrawn while
+# instrumentation is on
+PERF_REFRESH_MS = 1000
+
+# Longest wait for the next reminder, so a clock change or a machine waking
+# from sleep is noticed within this time
+MAX_REMINDER_WAIT_MS = 3600000
+
+# Tree columns with their heading text and the TaskList sort key behind them
+TREE_HEADINGS = {"#0": "ID", "Description": "Description", "Priority": "Priority", 
+                 "Due Date": "Due Date", "Status": "Status"}
+SORT_COLUMNS = {"#0": "id", "Description": "description", "Priority": "priority", 
+                "Due Date": "due_date", "Status": "status"}
+
+# Event state bits of the Shift and Control keys
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+
+# What a profile of one operation is written as, picked by extension
+PROFILE_FILETYPES = [("cProfile stats", "*.prof"), 
+                     ("Profile report", "*.txt"), 
+                     ("Trace of timed operations", "*.json")]
+
+# File dialog choices; the storage backend is picked by extension
+TASK_FILETYPES = [("JSON files", "*.json"), 
+                  ("SQLite databases", "*.db *.sqlite *.sqlite3"), 
+                  ("All files", "*.*")]
 
 class TaskManager:
     def __init__(self, root):
         self.root = root
-        self.tasks = []
-        self.selected_task_index = None
-        self.current_filter = "All"
+        # Tasks, their indexes, unsaved changes and the journal live in the
+        # model; this class only shows them
+        self.model = TaskList(on_journal_error=self.show_journal_error, history=UndoHistory())
+        self.selected_task_id = None
+        # Every selected task id, including rows scrolled out of the tree
+        self.selected_ids = set()
+        
+        # Search state: the applied term, the ids matching it (None when no
+        # search is active), and the pending debounced query
+        self.search_term = ""
+        self.search_results = None
+        self.search_job = None
+        self.search_generation = 0
+        
+        # Background load/save: the job name while one runs ("loading",
+        # "saving" or "exporting"), its file, and the queue and cancel flag
+        # shared with the worker thread
+        self.io_job = None
+        self.io_filename = None
+        self.io_queue = None
+        self.io_cancel = None
+        self.io_started = None
+        
+        # Active sidebar filters; they compose, None means not filtered
+        self.filters = new_filters()
+        # Tags listed in the sidebar, as (name, count) pairs in list order
+        self.shown_tags = ()
+        
+        # Virtualized list state: ids of the tasks that match the current
+        # filter, in display order, where each of them is in that list (None
+        # until visible_position() needs it), and the window of them shown in
+        # the tree
+        self.visible_ids = []
+        self.visible_positions = None
+        self.view_offset = 0
+        self.view_rows = 20
+        
+        # Sort key of the clicked column (None for list order) and direction
+        self.sort_column = None
+        self.sort_descending = False
+        
+        # The pending timer for the next due/overdue reminder and when it
+        # fires, and the date rows are marked overdue against
+        self.reminder_job = None
+        self.reminder_time = None
+        self.today = date.today().isoformat()
+        
+        # Rows currently in the tree, keyed by item id: (values, tags)
+        self.rendered = {}
+        
+        # The statistics window while it is open, and its pending redraw
+        self.stats_window = None
+        self.stats_job = None
+        
+        # The pending refresh of the perf overlay while instrumentation is on
+        self.perf_job = None
         
         # Set up the main window
         self.root.title("Professional Task Manager")
@@ -74,9 +173,17 @@ class TaskManager:
         # Set up event bindings
         self.task_tree.bind("<<TreeviewSelect>>", self.on_task_select)
         root.bind("<F5>", lambda event: self.refresh_task_list())
+        root.bind("<Control-z>", lambda event: self.undo())
+        root.bind("<Control-y>", lambda event: self.redo())
+        root.bind("<Control-Z>", lambda event: self.redo())
+        root.bind("<Escape>", lambda event: self.cancel_io())
+        root.protocol("WM_DELETE_WINDOW", self.exit_app)
         
         # Initialize
         self.load_tasks()
+        self.root.after(AUTOSAVE_MS, self.autosave)
+        self.root.after(SYNC_POLL_MS, self.poll_sync)
+        self.show_perf(PERF.enabled)
 
     def create_menu(self):
         menubar = tk.Menu(self.root)
@@ -87,18 +194,37 @@ class TaskManager:
         file_menu.add_command(label="Open", command=self.load_tasks_from_file)
         file_menu.add_command(label="Save", command=self.save_tasks)
         file_menu.add_command(label="Save As", command=self.save_tasks_as)
+        self.compact_json = tk.BooleanVar(value=False)
+        file_menu.add_checkbutton(label="Compact JSON", variable=self.compact_json)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Import...", command=self.import_tasks)
+        file_menu.add_command(label="Export...", command=self.export_tasks)
+        file_menu.add_separator()
+        file_menu.add_command(label="Cancel Loading", command=self.cancel_io)
+        file_menu.add_command(label="Exit", command=self.exit_app)
         menubar.add_cascade(label="File", menu=file_menu)
         
         # Edit menu
         edit_menu = tk.Menu(menubar, tearoff=0)
+        # Entries 0 and 1, relabelled by update_undo_menu
+        edit_menu.add_command(label="Undo", command=self.undo, accelerator="Ctrl+Z", state=tk.DISABLED)
+        edit_menu.add_command(label="Redo", command=self.redo, accelerator="Ctrl+Y", state=tk.DISABLED)
+        edit_menu.add_separator()
+        self.edit_menu = edit_menu
         edit_menu.add_command(label="Add Task", command=self.show_add_task)
         edit_menu.add_command(label="Edit Task", command=self.edit_task)
         edit_menu.add_command(label="Delete Task", command=self.delete_task)
         edit_menu.add_separator()
         edit_menu.add_command(label="Mark as Completed", command=lambda: self.toggle_task_status(True))
         edit_menu.add_command(label="Mark as Incomplete", command=lambda: self.toggle_task_status(False))
+        priority_menu = tk.Menu(edit_menu, tearoff=0)
+        for priority in PRIORITIES:
+            priority_menu.add_command(label=priority, 
+                                      command=lambda priority=priority: self.set_selected_priority(priority))
+        edit_menu.add_cascade(label="Set Priority", menu=priority_menu)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Select All", command=self.select_all)
+        edit_menu.add_command(label="Delete Completed...", command=self.delete_completed_tasks)
         menubar.add_cascade(label="Edit", menu=edit_menu)
         
         # View menu
@@ -107,6 +233,16 @@ class TaskManager:
         view_menu.add_separator()
         view_menu.add_command(label="Filter by Priority", command=self.show_priority_filter)
         view_menu.add_command(label="Filter by Status", command=self.show_status_filter)
+        view_menu.add_separator()
+        view_menu.add_command(label="Statistics...", command=self.show_statistics)
+        perf_menu = tk.Menu(view_menu, tearoff=0)
+        self.perf_enabled = tk.BooleanVar(value=PERF.enabled)
+        perf_menu.add_checkbutton(label="Instrumentation", variable=self.perf_enabled, 
+                                  command=lambda: self.show_perf(self.perf_enabled.get()))
+        perf_menu.add_command(label="Profile Next Operation...", command=self.show_profile_dialog)
+        perf_menu.add_command(label="Save Snapshot...", command=self.save_perf_snapshot)
+        perf_menu.add_command(label="Reset", command=PERF.reset)
+        view_menu.add_cascade(label="Performance", menu=perf_menu)
         menubar.add_cascade(label="View", menu=view_menu)
         
         # Help menu
@@ -135,6 +271,22 @@ class TaskManager:
                   command=lambda: self.filter_tasks("Completed")).pack(pady=5)
         ttk.Button(self.sidebar_frame, text="Incomplete", width=18,
                   command=lambda: self.filter_tasks("Incomplete")).pack(pady=5)
+        ttk.Button(self.sidebar_frame, text="Due This Week", width=18,
+                  command=lambda: self.filter_tasks("This Week")).pack(pady=5)
+        ttk.Separator(self.sidebar_frame, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=10)
+        
+        # Tags: the selected ones are required (All), alternatives (Any) or
+        # excluded (Not), on top of the filters above
+        self.tag_listbox = tk.Listbox(self.sidebar_frame, selectmode=tk.EXTENDED, height=5, 
+                                      width=20, exportselection=False)
+        self.tag_listbox.pack(pady=5)
+        tag_buttons = ttk.Frame(self.sidebar_frame, style="Sidebar.TFrame")
+        tag_buttons.pack()
+        for text, prefix in (("All", "tag:"), ("Any", "any-tag:"), ("Not", "not-tag:")):
+            ttk.Button(tag_buttons, text=text, width=5, 
+                      command=lambda prefix=prefix: self.filter_tags(prefix)).pack(side=tk.LEFT)
+        ttk.Button(self.sidebar_frame, text="Clear Tag Filters", width=18,
+                  command=self.clear_tag_filters).pack(pady=5)
         ttk.Separator(self.sidebar_frame, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=10)
         
         # Actions
@@ -158,19 +310,18 @@ class TaskManager:
         
         ttk.Label(search_frame, text="Search:").pack(side=tk.LEFT)
         self.search_var = tk.StringVar()
-        self.search_var.trace("w", lambda name, index, mode: self.filter_tasks(self.current_filter))
+        self.search_var.trace("w", lambda name, index, mode: self.schedule_search())
         ttk.Entry(search_frame, textvariable=self.search_var, width=20).pack(side=tk.LEFT, padx=5)
         
         # Task treeview
         tree_frame = ttk.Frame(list_frame)
         tree_frame.pack(fill=tk.BOTH, expand=True, pady=5)
         
-        self.task_tree = ttk.Treeview(tree_frame, columns=("Description", "Priority", "Due Date", "Status"))
-        self.task_tree.heading("#0", text="ID")
-        self.task_tree.heading("Description", text="Description")
-        self.task_tree.heading("Priority", text="Priority")
-        self.task_tree.heading("Due Date", text="Due Date")
-        self.task_tree.heading("Status", text="Status")
+        self.task_tree = ttk.Treeview(tree_frame, columns=("Description", "Priority", "Due Date", "Status"), 
+                                      selectmode="extended")
+        for column, text in TREE_HEADINGS.items():
+            self.task_tree.heading(column, text=text, 
+                                   command=lambda column=column: self.sort_by(column))
         
         self.task_tree.column("#0", width=50, stretch=tk.NO)
         self.task_tree.column("Description", width=300, stretch=tk.YES)
@@ -178,11 +329,29 @@ class TaskManager:
         self.task_tree.column("Due Date", width=100, stretch=tk.NO)
         self.task_tree.column("Status", width=100, stretch=tk.NO)
         
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.task_tree.yview)
-        self.task_tree.configure(yscrollcommand=scrollbar.set)
+        # The tree only ever holds the rows in the viewport, so the scrollbar
+        # is driven by our own offset into visible_ids instead of yview
+        self.scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.on_scroll)
         
         self.task_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.task_tree.bind("<Configure>", self.on_tree_resize)
+        self.task_tree.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.task_tree.bind("<Button-4>", lambda event: self.scroll_rows(-3))
+        self.task_tree.bind("<Button-5>", lambda event: self.scroll_rows(3))
+        self.task_tree.bind("<Up>", self.on_tree_key)
+        self.task_tree.bind("<Down>", self.on_tree_key)
+        self.task_tree.bind("<Prior>", lambda event: self.scroll_rows(-self.view_rows))
+        self.task_tree.bind("<Next>", lambda event: self.scroll_rows(self.view_rows))
+        self.task_tree.bind("<Button-1>", self.on_tree_click)
+        self.task_tree.bind("<Control-a>", lambda event: self.select_all() or "break")
+        
+        # Configure tags
+        self.task_tree.tag_configure("high", background="#ffe6e6")
+        self.task_tree.tag_configure("low", background="#e6ffe6")
+        self.task_tree.tag_configure("completed", foreground="gray")
+        self.task_tree.tag_configure("overdue", foreground="#c00000")
 
     def create_task_form(self):
         self.form_frame = ttk.Frame(self.content_frame)
@@ -220,6 +389,21 @@ class TaskManager:
         self.due_date_var = tk.StringVar()
         ttk.Entry(due_date_frame, textvariable=self.due_date_var, width=15).pack(pady=5)
         
+        # Repeat rule, a preset or any RRULE typed in
+        repeat_frame = ttk.Frame(subform)
+        repeat_frame.pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Label(repeat_frame, text="Repeats:").pack(anchor=tk.W)
+        self.recurrence_var = tk.StringVar(value=NO_RECURRENCE)
+        ttk.Combobox(repeat_frame, textvariable=self.recurrence_var, 
+                     values=[NO_RECURRENCE] + list(RECURRENCE_PRESETS), width=15).pack(pady=5)
+        
+        # Tags, separated by commas or spaces
+        tags_frame = ttk.Frame(subform)
+        tags_frame.pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Label(tags_frame, text="Tags:").pack(anchor=tk.W)
+        self.tags_var = tk.StringVar()
+        ttk.Entry(tags_frame, textvariable=self.tags_var, width=20).pack(pady=5)
+        
         # Form buttons
         ttk.Button(form_right, text="Add Task", command=self.add_task).pack(pady=5)
         ttk.Button(form_right, text="Update Task", command=self.update_task).pack(pady=5)
@@ -240,129 +424,274 @@ class TaskManager:
         self.task_count_var.set("Tasks: 0")
         count_label = ttk.Label(status_frame, textvariable=self.task_count_var)
         count_label.pack(side=tk.RIGHT, padx=5, pady=2)
+        
+        # Shown only while instrumentation is on
+        self.perf_var = tk.StringVar()
+        self.perf_label = ttk.Label(status_frame, textvariable=self.perf_var, foreground="#555555")
+        
+        # Shown only while a file is loaded or saved in the background
+        self.progress_var = tk.DoubleVar()
+        self.progress_bar = ttk.Progressbar(status_frame, variable=self.progress_var, 
+                                            maximum=100, length=120)
+        self.cancel_button = ttk.Button(status_frame, text="Cancel", command=self.cancel_io)
 
+    @timed("add")
     def add_task(self):
-        description = self.description_var.get().strip()
-        if not description:
-            messagebox.showerror("Error", "Please enter a task description")
+        if not self.check_idle():
             return
         
-        priority = self.priority_var.get()
-        due_date = self.due_date_var.get() if self.due_date_var.get().strip() else None
-        
-        # Validate due date format if provided
-        if due_date:
-            try:
-                datetime.strptime(due_date, "%Y-%m-%d")
-            except ValueError:
-                messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
-                return
-        
-        # Create and add the task
-        task = Task(description, priority, due_date)
-        self.tasks.append(task)
+        # Create and add the task; the model validates the fields
+        try:
+            task = self.model.add(self.description_var.get(), self.priority_var.get(), 
+                                  self.due_date_var.get(), recurrence=self.recurrence_var.get(), 
+                                  tags=self.tags_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
         
         # Update UI
         self.clear_form()
-        self.refresh_task_list()
-        self.set_status(f"Task '{description}' added successfully")
+        self.refresh_task(task, added=True)
+        self.set_status(f"Task '{task.description}' added successfully")
 
     def show_add_task(self):
         self.clear_form()
         self.description_var.set("")
         self.priority_var.set("Medium")
         self.due_date_var.set("")
-        self.selected_task_index = None
+        self.recurrence_var.set(NO_RECURRENCE)
+        self.tags_var.set("")
+        self.selected_task_id = None
 
+    @timed("select")
     def on_task_select(self, event):
-        selection = self.task_tree.selection()
+        # The tree only holds the rendered window: rows selected there replace
+        # the rendered part of selected_ids, the rest of it is kept
+        selection = {int(item_id) for item_id in self.task_tree.selection()}
+        self.selected_ids.difference_update(int(item_id) for item_id in self.rendered)
+        self.selected_ids.update(selection)
+        
+        # The form edits one task; with several selected only the bulk
+        # actions apply
+        if len(self.selected_ids) != 1:
+            self.selected_task_id = None
+            if self.selected_ids:
+                self.set_status(f"{len(self.selected_ids)} tasks selected")
+            return
+        
         if selection:
-            item_id = selection[0]
-            task_index = int(self.task_tree.item(item_id)["text"]) - 1
+            task_id = next(iter(self.selected_ids))
             
-            if 0 <= task_index < len(self.tasks):
-                self.selected_task_index = task_index
-                task = self.tasks[task_index]
+            # Re-selecting the same task while scrolling must not overwrite
+            # edits that are in progress in the form
+            if task_id == self.selected_task_id:
+                return
+            
+            if task_id in self.model.tasks:
+                self.selected_task_id = task_id
+                task = self.model.tasks[task_id]
                 
                 # Update form with selected task
                 self.description_var.set(task.description)
                 self.priority_var.set(task.priority)
                 self.due_date_var.set(task.due_date if task.due_date else "")
+                self.recurrence_var.set(describe_recurrence(task.recurrence))
+                self.tags_var.set(", ".join(task.tags))
 
     def edit_task(self):
-        if self.selected_task_index is None:
+        if self.selected_task_id is None:
             messagebox.showinfo("Info", "Please select a task to edit")
             return
         
         # Just populate the form for editing
-        task = self.tasks[self.selected_task_index]
+        task = self.model.tasks[self.selected_task_id]
         self.description_var.set(task.description)
         self.priority_var.set(task.priority)
         self.due_date_var.set(task.due_date if task.due_date else "")
+        self.recurrence_var.set(describe_recurrence(task.recurrence))
+        self.tags_var.set(", ".join(task.tags))
 
+    @timed("update")
     def update_task(self):
-        if self.selected_task_index is None:
-            messagebox.showinfo("Info", "Please select a task to update")
+        if not self.check_idle():
             return
         
-        description = self.description_var.get().strip()
-        if not description:
-            messagebox.showerror("Error", "Please enter a task description")
+        if self.selected_task_id is None:
+            messagebox.showinfo("Info", "Please select a task to update")
             return
         
-        priority = self.priority_var.get()
-        due_date = self.due_date_var.get() if self.due_date_var.get().strip() else None
-        
-        # Validate due date format if provided
-        if due_date:
-            try:
-                datetime.strptime(due_date, "%Y-%m-%d")
-            except ValueError:
-                messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
-                return
-        
         # Update the task
-        task = self.tasks[self.selected_task_index]
-        task.description = description
-        task.priority = priority
-        task.due_date = due_date
+        try:
+            task = self.model.update(self.selected_task_id, 
+                                     description=self.description_var.get(), 
+                                     priority=self.priority_var.get(), 
+                                     due_date=self.due_date_var.get(), 
+                                     recurrence=self.recurrence_var.get(), 
+                                     tags=self.tags_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        except KeyError:
+            self.show_deleted_elsewhere()
+            return
         
         # Update UI
         self.clear_form()
-        self.refresh_task_list()
-        self.set_status(f"Task '{description}' updated successfully")
+        self.refresh_task(task)
+        self.set_status(f"Task '{task.description}' updated successfully")
 
     def delete_task(self):
-        if self.selected_task_index is None:
+        if not self.check_idle():
+            return
+        
+        task_ids = self.get_selected_ids()
+        if not task_ids:
             messagebox.showinfo("Info", "Please select a task to delete")
             return
         
-        task = self.tasks[self.selected_task_index]
-        confirm = messagebox.askyesno("Confirm Delete", 
-                                     f"Are you sure you want to delete the task '{task.description}'?")
+        if len(task_ids) == 1:
+            task = self.model.tasks[task_ids[0]]
+            question = f"Are you sure you want to delete the task '{task.description}'?"
+        else:
+            question = f"Are you sure you want to delete the {len(task_ids)} selected tasks?"
         
-        if confirm:
-            del self.tasks[self.selected_task_index]
-            self.clear_form()
-            self.selected_task_index = None
-            self.refresh_task_list()
-            self.set_status("Task deleted successfully")
+        if messagebox.askyesno("Confirm Delete", question):
+            self.bulk_delete(task_ids)
 
     def toggle_task_status(self, completed):
-        if self.selected_task_index is None:
+        if not self.check_idle():
+            return
+        
+        task_ids = self.get_selected_ids()
+        if not task_ids:
+            messagebox.showinfo("Info", "Please select a task to update")
+            return
+        
+        self.bulk_set_completed(task_ids, completed)
+
+    def set_selected_priority(self, priority):
+        if not self.check_idle():
+            return
+        
+        task_ids = self.get_selected_ids()
+        if not task_ids:
             messagebox.showinfo("Info", "Please select a task to update")
             return
         
-        task = self.tasks[self.selected_task_index]
-        task.completed = completed
+        self.bulk_set_priority(task_ids, priority)
+
+    def delete_completed_tasks(self):
+        if not self.check_idle():
+            return
         
+        days = simpledialog.askinteger("Delete Completed", 
+                                       "Delete completed tasks created more than how many days ago?\n"
+                                       "Enter 0 to delete all completed tasks.", 
+                                       parent=self.root, minvalue=0, initialvalue=30)
+        if days is None:
+            return
+        
+        with PERF.timing("delete.completed"):
+            deleted = self.model.delete_completed(days or None)
+            self.after_bulk_delete(deleted)
+
+    def get_selected_ids(self):
+        # Selected tasks in list order
+        return sorted(task_id for task_id in self.selected_ids if task_id in self.model)
+
+    def select_all(self):
+        # Selects every task the current filter and search show
+        self.selected_ids = set(self.visible_ids)
+        self.selected_task_id = None
+        self.render_viewport()
+        self.set_status(f"{len(self.selected_ids)} tasks selected")
+
+    @timed("delete")
+    def bulk_delete(self, task_ids):
+        # One model call, one index pass and one list refresh however many
+        # tasks go
+        try:
+            deleted = self.model.delete_many(task_ids)
+        except KeyError:
+            self.show_deleted_elsewhere()
+            return
+        self.after_bulk_delete(deleted)
+
+    def after_bulk_delete(self, deleted):
+        self.selected_ids.difference_update(deleted)
+        if self.search_results is not None:
+            self.search_results.difference_update(deleted)
+        self.clear_form()
         self.refresh_task_list()
+        if len(deleted) == 1:
+            self.set_status("Task deleted successfully")
+        else:
+            self.set_status(f"{len(deleted)} tasks deleted")
+
+    @timed("complete")
+    def bulk_set_completed(self, task_ids, completed):
+        try:
+            tasks = self.model.set_completed_many(task_ids, completed)
+        except KeyError:
+            self.show_deleted_elsewhere()
+            return
+        self.refresh_tasks(tasks)
         status_text = "completed" if completed else "marked as incomplete"
-        self.set_status(f"Task '{task.description}' {status_text}")
+        if len(tasks) == 1:
+            self.set_status(f"Task '{tasks[0].description}' {status_text}")
+        else:
+            self.set_status(f"{len(tasks)} tasks {status_text}")
+
+    @timed("priority")
+    def bulk_set_priority(self, task_ids, priority):
+        try:
+            tasks = self.model.update_many(task_ids, priority=priority)
+        except KeyError:
+            self.show_deleted_elsewhere()
+            return
+        self.refresh_tasks(tasks)
+        self.set_status(f"Priority of {len(tasks)} tasks set to {priority}")
+
+    @timed("import")
+    def bulk_import(self, filename):
+        # Imported tasks are indexed in one pass and shown with one refresh
+        imported = self.model.import_file(filename)
+        self.refresh_search()
+        self.refresh_task_list()
+        return imported
 
+    @timed("filter")
     def filter_tasks(self, filter_type):
-        self.current_filter = filter_type
+        # Sidebar filters compose: one priority, one status and one due range
+        # can be active together, "All" clears them
+        apply_filter(self.filters, filter_type)
         self.refresh_task_list()
+        self.set_status(f"Filter: {self.describe_filters()}")
+
+    @timed("filter.tags")
+    def filter_tags(self, prefix):
+        names = [self.shown_tags[index][0] for index in self.tag_listbox.curselection()]
+        if not names:
+            messagebox.showinfo("Info", "Please select one or more tags in the sidebar")
+            return
+        for name in names:
+            apply_filter(self.filters, prefix + name)
+        self.tag_listbox.selection_clear(0, tk.END)
+        self.refresh_task_list()
+        self.set_status(f"Filter: {self.describe_filters()}")
+
+    def clear_tag_filters(self):
+        clear_tag_filters(self.filters)
+        self.refresh_task_list()
+        self.set_status(f"Filter: {self.describe_filters()}")
+
+    def set_filter(self, kind, value):
+        self.filters[kind] = None if value == "All" else value
+        self.refresh_task_list()
+        self.set_status(f"Filter: {self.describe_filters()}")
+
+    def describe_filters(self):
+        return describe_filters(self.filters)
 
     def show_priority_filter(self):
         filter_window = tk.Toplevel(self.root)
@@ -373,7 +702,7 @@ class TaskManager:
         
         ttk.Label(filter_window, text="Select Priority Filter:").pack(pady=10)
         
-        selected_filter = tk.StringVar(value=self.current_filter)
+        selected_filter = tk.StringVar(value=self.filters["priority"] or "All")
         
         ttk.Radiobutton(filter_window, text="All Tasks", variable=selected_filter, 
                        value="All").pack(anchor=tk.W, padx=20, pady=5)
@@ -385,7 +714,7 @@ class TaskManager:
                        value="Low").pack(anchor=tk.W, padx=20, pady=5)
         
         ttk.Button(filter_window, text="Apply", 
-                  command=lambda: [self.filter_tasks(selected_filter.get()), filter_window.destroy()]).pack(pady=10)
+                  command=lambda: [self.set_filter("priority", selected_filter.get()), filter_window.destroy()]).pack(pady=10)
 
     def show_status_filter(self):
         filter_window = tk.Toplevel(self.root)
@@ -396,7 +725,7 @@ class TaskManager:
         
         ttk.Label(filter_window, text="Select Status Filter:").pack(pady=10)
         
-        selected_filter = tk.StringVar(value=self.current_filter)
+        selected_filter = tk.StringVar(value=self.filters["status"] or "All")
         
         ttk.Radiobutton(filter_window, text="All Tasks", variable=selected_filter, 
                        value="All").pack(anchor=tk.W, padx=20, pady=5)
@@ -406,136 +735,884 @@ class TaskManager:
                        value="Incomplete").pack(anchor=tk.W, padx=20, pady=5)
         
         ttk.Button(filter_window, text="Apply", 
-                  command=lambda: [self.filter_tasks(selected_filter.get()), filter_window.destroy()]).pack(pady=10)
+                  command=lambda: [self.set_filter("status", selected_filter.get()), filter_window.destroy()]).pack(pady=10)
 
     def clear_form(self):
         self.description_var.set("")
         self.priority_var.set("Medium")
         self.due_date_var.set("")
-        self.selected_task_index = None
+        self.recurrence_var.set(NO_RECURRENCE)
+        self.tags_var.set("")
+        self.selected_task_id = None
+
+    def show_journal_error(self, error):
+        messagebox.showerror("Error", f"Error writing journal, changes are kept only until you save: {error}")
 
+    def matches_filter(self, task):
+        return self.model.matches(task, search=self.search_term, **filter_query(self.filters))
+
+    @timed("refresh")
     def refresh_task_list(self):
-        # Clear current items
-        for item in self.task_tree.get_children():
-            self.task_tree.delete(item)
-        
-        # Filter tasks based on current filter
-        filtered_tasks = self.tasks
-        search_term = self.search_var.get().lower()
-        
-        if self.current_filter == "High":
-            filtered_tasks = [t for t in filtered_tasks if t.priority == "High"]
-        elif self.current_filter == "Medium":
-            filtered_tasks = [t for t in filtered_tasks if t.priority == "Medium"]
-        elif self.current_filter == "Low":
-            filtered_tasks = [t for t in filtered_tasks if t.priority == "Low"]
-        elif self.current_filter == "Completed":
-            filtered_tasks = [t for t in filtered_tasks if t.completed]
-        elif self.current_filter == "Incomplete":
-            filtered_tasks = [t for t in filtered_tasks if not t.completed]
-        
-        # Apply search filter if search term exists
-        if search_term:
-            filtered_tasks = [t for t in filtered_tasks if search_term in t.description.lower()]
-        
-        # Populate tree
-        for i, task in enumerate(filtered_tasks):
-            item_id = self.task_tree.insert("", tk.END, text=str(self.tasks.index(task) + 1),
-                                          values=(task.description, 
-                                                 task.priority,
-                                                 task.due_date if task.due_date else "Not set",
-                                                 "Completed" if task.completed else "Pending"))
-            
-            # Apply color based on priority
-            if task.priority == "High":
-                self.task_tree.item(item_id, tags=("high",))
-            elif task.priority == "Low":
-                self.task_tree.item(item_id, tags=("low",))
-                
-            # Apply style for completed tasks
-            if task.completed:
-                self.task_tree.item(item_id, tags=("completed",))
+        # Filter tasks through the indexes and the applied search results,
+        # in the order kept for the sorted column
+        if self.model.remote_ids:
+            self.take_remote_changes()
+        self.visible_ids = self.model.query(ids=self.search_results, sort=self.sort_column, 
+                                            descending=self.sort_descending, 
+                                            **filter_query(self.filters))
+        self.visible_positions = None
+        
+        self.render_viewport()
+        self.update_task_count()
+
+    def visible_position(self, task_id):
+        # Where task_id is in visible_ids, None if it is not shown. Full
+        # refreshes leave the map out; the first single-task change after
+        # one builds it, and keeps it up to date from then on.
+        if self.visible_positions is None:
+            self.visible_positions = dict(zip(self.visible_ids, range(len(self.visible_ids))))
+        return self.visible_positions.get(task_id)
+
+    def refresh_tasks(self, tasks):
+        # A single change is applied to the visible list in place; a bulk
+        # change refreshes the list once
+        if len(tasks) == 1:
+            self.refresh_task(tasks[0])
+        else:
+            self.refresh_task_list()
+
+    @timed("refresh.task")
+    def refresh_task(self, task, added=False, removed=False):
+        # Apply a single task change to the visible list; the tree diff in
+        # render_viewport then only touches the rows that actually changed.
+        # Changes from other processes picked up on the way need a full
+        # refresh.
+        if self.model.remote_ids:
+            self.refresh_task_list()
+            return
+        if self.search_results is not None:
+            if not removed and self.model.matches(task, search=self.search_term):
+                self.search_results.add(task.id)
+            else:
+                self.search_results.discard(task.id)
+        
+        old = self.visible_position(task.id)
+        new = old
+        wanted = not removed and self.matches_filter(task)
+        
+        if old is not None and (not wanted or self.sort_column is not None):
+            # A task in a sorted list may have moved, so it is placed again
+            del self.visible_ids[old]
+            del self.visible_positions[task.id]
+            new = None
+        if wanted and new is None:
+            if self.sort_column is not None:
+                # Bisect into the sorted list rather than sorting it again
+                new = self.model.sorted_position(self.visible_ids, task.id, 
+                                                 self.sort_column, self.sort_descending)
+            elif added:
+                # Newly added tasks always go at the end
+                new = len(self.visible_ids)
+            else:
+                # An edit brought the task into the filter, so find its place
+                self.refresh_task_list()
+                return
+            self.visible_ids.insert(new, task.id)
+        if (old, new) != (None, None) and task.id not in self.visible_positions:
+            # Only the tasks between its old and new place moved; one that
+            # came or went moved every task after it
+            start = min(position for position in (old, new) if position is not None)
+            end = max(old, new) + 1 if None not in (old, new) else len(self.visible_ids)
+            self.visible_positions.update(zip(self.visible_ids[start:end], range(start, end)))
+        
+        self.render_viewport()
+        self.update_task_count()
+
+    @timed("undo")
+    def undo(self):
+        self.replay_history(self.model.undo, "Undid", "Nothing to undo")
+
+    @timed("redo")
+    def redo(self):
+        self.replay_history(self.model.redo, "Redid", "Nothing to redo")
+
+    def replay_history(self, replay, done, nothing):
+        # However many tasks the step touches, the model applies it in one
+        # batch and the list is refreshed once
+        if not self.check_idle():
+            return
+        step = replay()
+        if step is None:
+            self.set_status(nothing)
+            return
+        self.selected_ids = {task_id for task_id in self.selected_ids if task_id in self.model}
+        self.clear_form()
+        self.refresh_search()
+        self.refresh_task_list()
+        self.set_status(f"{done} {step.describe()}")
+
+    def update_undo_menu(self):
+        # Name the change Undo and Redo would revert or repeat
+        history = self.model.history
+        for index, action, label in ((0, "Undo", history.undo_label()), 
+                                     (1, "Redo", history.redo_label())):
+            self.edit_menu.entryconfigure(index, label=f"{action} {label}" if label else action, 
+                                          state=tk.NORMAL if label else tk.DISABLED)
+
+    def take_remote_changes(self):
+        # Forget selections of tasks other processes deleted and re-run the
+        # search over the tasks they changed; the caller refreshes the list
+        changed = self.model.take_remote_changes()
+        self.selected_ids = {task_id for task_id in self.selected_ids if task_id in self.model}
+        if self.selected_task_id is not None and self.selected_task_id not in self.model:
+            self.clear_form()
+        self.refresh_search()
+        self.set_status(f"{len(changed)} tasks changed by another process")
+
+    def poll_sync(self):
+        # Show changes other processes made to the same file; skipped while
+        # a worker is reading or writing the list
+        if self.io_job is None and self.model.sync() and self.model.remote_ids:
+            self.refresh_task_list()
+        self.root.after(SYNC_POLL_MS, self.poll_sync)
+
+    def show_deleted_elsewhere(self):
+        self.refresh_task_list()
+        messagebox.showinfo("Info", "A selected task was deleted by another process, nothing was changed")
+
+    @timed("sort")
+    def sort_by(self, column):
+        # Clicking the sorted column again reverses it
+        sort_column = SORT_COLUMNS[column]
+        if sort_column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = sort_column
+            self.sort_descending = False
+        
+        for heading, text in TREE_HEADINGS.items():
+            if heading == column:
+                text += " \u25bc" if self.sort_descending else " \u25b2"
+            self.task_tree.heading(heading, text=text)
+        
+        self.view_offset = 0
+        self.refresh_task_list()
+        direction = "descending" if self.sort_descending else "ascending"
+        self.set_status(f"Sorted by {TREE_HEADINGS[column]}, {direction}")
+
+    def schedule_search(self):
+        # Debounce typing so only the last keystroke runs a query; bumping
+        # the generation also abandons a query that is still in flight
+        self.search_generation += 1
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY_MS, self.run_search, self.search_generation)
+
+    @timed("search")
+    def run_search(self, generation):
+        self.search_job = None
+        term = self.search_var.get().lower()
+        if not term:
+            self.apply_search(term, None)
+            return
         
-        # Configure tags
-        self.task_tree.tag_configure("high", background="#ffe6e6")
-        self.task_tree.tag_configure("low", background="#e6ffe6")
-        self.task_tree.tag_configure("completed", foreground="gray")
+        candidates = list(self.model.get_search_index().candidates(term))
+        self.verify_search(generation, term, candidates, 0, [])
+
+    @timed("search.verify")
+    def verify_search(self, generation, term, candidates, start, matched):
+        # Confirm candidates in batches, giving way to newer queries
+        if generation != self.search_generation:
+            return
         
-        # Update status bar
-        self.task_count_var.set(f"Tasks: {len(self.tasks)} (Showing: {len(filtered_tasks)})")
+        end = start + SEARCH_BATCH
+        matched.extend(self.model.search_index.verify(term, candidates[start:end]))
+        if end < len(candidates):
+            self.root.after(1, self.verify_search, generation, term, candidates, end, matched)
+        else:
+            self.apply_search(term, set(matched))
+
+    def apply_search(self, term, results):
+        self.search_term = term
+        self.search_results = results
+        self.refresh_task_list()
+
+    @timed("status")
+    def update_task_count(self):
+        # The completion rate and overdue count come from the maintained
+        # aggregates, not from a pass over the tasks
+        stats = self.model.stats
+        rate = stats.completed / stats.total if stats.total else 0
+        self.task_count_var.set(f"Tasks: {len(self.model)} (Showing: {len(self.visible_ids)}) | "
+                                f"Completed: {rate:.0%} | Overdue: {stats.overdue(self.today)}")
+        self.refresh_tag_list()
+        self.update_undo_menu()
+        if self.stats_window is not None and self.stats_job is None:
+            self.stats_job = self.root.after(STATS_REFRESH_MS, self.draw_statistics)
+        # Every change to the list passes through here, and may have moved
+        # the next deadline
+        self.schedule_reminders()
+
+    @timed("tags")
+    def refresh_tag_list(self):
+        # The counts come from the tag index, so this stays cheap however
+        # many tasks there are; the listbox is only rebuilt when they change
+        tags = tuple(sorted(self.model.tag_counts().items()))
+        if tags == self.shown_tags:
+            return
+        self.shown_tags = tags
+        self.tag_listbox.delete(0, tk.END)
+        for name, count in tags:
+            self.tag_listbox.insert(tk.END, f"{name} ({count})")
+
+    def schedule_reminders(self):
+        # Sleep until the next deadline instead of polling the task list
+        when = self.model.reminders.next_time()
+        if when == self.reminder_time:
+            return
+        if self.reminder_job is not None:
+            self.root.after_cancel(self.reminder_job)
+            self.reminder_job = None
+        self.reminder_time = when
+        if when is not None:
+            delay = int((when - time.time()) * 1000)
+            self.reminder_job = self.root.after(min(max(0, delay), MAX_REMINDER_WAIT_MS), 
+                                                self.fire_reminders)
+
+    def fire_reminders(self):
+        self.reminder_job = None
+        self.reminder_time = None
+        today = date.today().isoformat()
+        if today != self.today and self.sort_column in DAY_COLUMNS:
+            # Statuses changed with the day, so the order did too
+            self.today = today
+            self.refresh_task_list()
+        self.today = today
+        
+        events = self.model.reminders.pop_due()
+        if events:
+            # Re-rendering updates the status column of the rows in view
+            self.render_viewport()
+            self.set_status(self.describe_reminders(events))
+        self.schedule_reminders()
+
+    def describe_reminders(self, events):
+        if len(events) == 1:
+            kind, task_id = events[0]
+            description = self.model.tasks[task_id].description
+            if kind == OVERDUE:
+                return f"Task '{description}' is overdue"
+            return f"Task '{description}' is due today"
+        
+        overdue = sum(1 for kind, _ in events if kind == OVERDUE)
+        due = sum(1 for kind, _ in events if kind == DUE)
+        parts = []
+        if overdue:
+            parts.append(f"{overdue} overdue")
+        if due:
+            parts.append(f"{due} due today")
+        return "Reminders: " + ", ".join(parts)
+
+    def task_row(self, task):
+        # Apply color based on priority, completed tasks are greyed out
+        if task.completed:
+            tags = ("completed",)
+        elif task.priority == "High":
+            tags = ("high",)
+        elif task.priority == "Low":
+            tags = ("low",)
+        else:
+            tags = ()
+        
+        # A repeating task shows its next date and is never overdue while
+        # the series goes on; sorting by status uses the same date
+        due_date = shown_due_date(task, self.today)
+        if task.recurrence and task.due_date:
+            repeats = describe_recurrence(task.recurrence)
+            due_text = f"{due_date} ({repeats})" if due_date else f"Ended ({repeats})"
+        else:
+            due_text = due_date if due_date else "Not set"
+        
+        status = task_status(task.completed, due_date, self.today)
+        if status == "Overdue":
+            tags += ("overdue",)
+        
+        description = task.description
+        if task.tag_ids:
+            description += "  " + " ".join(f"#{tag}" for tag in task.tags)
+        
+        values = (description, 
+                  task.priority,
+                  due_text,
+                  status)
+        return values, tags
+
+    @timed("render")
+    def render_viewport(self):
+        # Clamp the offset so the last page is always full
+        max_offset = max(0, len(self.visible_ids) - self.view_rows)
+        self.view_offset = min(max(0, self.view_offset), max_offset)
+        
+        # Only the rows that fit in the viewport, plus a small buffer so a
+        # partially visible last row is never blank
+        end = self.view_offset + self.view_rows + VIEW_BUFFER_ROWS
+        window = self.visible_ids[self.view_offset:end]
+        wanted = {str(task_id) for task_id in window}
+        
+        # Drop rows that scrolled out or no longer match
+        stale = [item_id for item_id in self.rendered if item_id not in wanted]
+        inserted = updated = moved = 0
+        if stale:
+            self.task_tree.delete(*stale)
+            for item_id in stale:
+                del self.rendered[item_id]
+        
+        # Insert, update or move only the rows that differ
+        for position, task_id in enumerate(window):
+            item_id = str(task_id)
+            values, tags = self.task_row(self.model.tasks[task_id])
+            
+            if item_id not in self.rendered:
+                self.task_tree.insert("", position, iid=item_id, text=item_id, 
+                                      values=values, tags=tags)
+                inserted += 1
+            else:
+                if self.rendered[item_id] != (values, tags):
+                    self.task_tree.item(item_id, values=values, tags=tags)
+                    updated += 1
+                if self.task_tree.index(item_id) != position:
+                    self.task_tree.move(item_id, "", position)
+                    moved += 1
+            self.rendered[item_id] = (values, tags)
+        
+        if PERF.enabled:
+            PERF.count("tree.delete", len(stale))
+            PERF.count("tree.insert", inserted)
+            PERF.count("tree.update", updated)
+            PERF.count("tree.move", moved)
+        
+        # Keep the selected tasks highlighted while scrolling
+        selection = [item_id for item_id in self.rendered if int(item_id) in self.selected_ids]
+        if set(selection) != set(self.task_tree.selection()):
+            self.task_tree.selection_set(selection)
+        
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        total = len(self.visible_ids)
+        if total <= self.view_rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.view_offset / total, 
+                               min(1.0, (self.view_offset + self.view_rows) / total))
+
+    def scroll_rows(self, delta):
+        offset = self.view_offset
+        self.view_offset += delta
+        self.render_viewport()
+        return "break" if self.view_offset != offset else None
+
+    def on_scroll(self, action, value, unit=None):
+        if action == "moveto":
+            self.view_offset = int(float(value) * len(self.visible_ids))
+            self.render_viewport()
+        elif action == "scroll":
+            step = self.view_rows if unit == "pages" else 1
+            self.scroll_rows(int(value) * step)
+
+    def on_mouse_wheel(self, event):
+        # Windows reports multiples of 120, macOS reports small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll_rows(-delta * 3)
+
+    def on_tree_click(self, event):
+        # A plain click starts a new selection, dropping rows that were
+        # selected further up or down the list
+        if not event.state & (SHIFT_MASK | CONTROL_MASK):
+            self.selected_ids.clear()
+
+    def on_tree_key(self, event):
+        # Scroll the window when the arrow keys run off its first/last row
+        if not event.state & SHIFT_MASK:
+            self.selected_ids.clear()
+        children = self.task_tree.get_children()
+        if not children:
+            return None
+        focus = self.task_tree.focus()
+        if event.keysym == "Up" and focus == children[0]:
+            row, delta = 0, -1
+        elif event.keysym == "Down" and focus in children[self.view_rows - 1:]:
+            row, delta = children.index(focus), 1
+        else:
+            return None
+        
+        if self.scroll_rows(delta):
+            # Move the cursor onto the row that scrolled into view
+            item_id = self.task_tree.get_children()[row]
+            self.task_tree.focus(item_id)
+            self.task_tree.selection_set(item_id)
+        return "break"
+
+    def on_tree_resize(self, event):
+        rowheight = self.style.lookup("Treeview", "rowheight")
+        rowheight = int(rowheight) if rowheight else 20
+        # Leave room for the heading row
+        rows = max(1, (event.height - rowheight) // rowheight)
+        if rows != self.view_rows:
+            self.view_rows = rows
+            self.render_viewport()
 
     def save_tasks(self):
-        if not hasattr(self, 'current_file'):
+        if not self.check_idle():
+            return
+        
+        if self.model.current_file is None:
             self.save_tasks_as()
             return
         
-        try:
-            self.save_to_file(self.current_file)
-            self.set_status(f"Tasks saved to {self.current_file}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error saving tasks: {e}")
+        # Every change is already in the journal; only fold it into the file
+        # once it has grown long
+        if self.model.is_journaled():
+            self.set_status(f"All changes saved to {self.model.current_file}")
+            return
+        
+        self.save_to_file(self.model.current_file)
+
+    def autosave(self):
+        # Periodically fold a long journal into its task file
+        if self.io_job is None and self.model.needs_compaction():
+            self.save_to_file(self.model.journal.filename)
+        self.root.after(AUTOSAVE_MS, self.autosave)
 
     def save_tasks_as(self):
+        if not self.check_idle():
+            return
+        
         filename = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=TASK_FILETYPES
         )
         
         if filename:
-            try:
-                self.save_to_file(filename)
-                self.current_file = filename
-                self.set_status(f"Tasks saved to {filename}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error saving tasks: {e}")
+            self.save_to_file(filename)
+
+    def save_to_file(self, filename, job="saving"):
+        # Written on a worker thread; check_idle refuses changes until it is
+        # done, so the writer sees a consistent task list. Saving the list's
+        # own file first catches up with other processes sharing it.
+        if job == "saving" and filename == self.model.current_file:
+            self.model.sync(wait=True)
+            if self.model.remote_ids:
+                self.refresh_task_list()
+        incremental = job == "saving" and filename == self.model.synced_file
+        self.start_io(job, filename, self.save_worker, filename, self.compact_json.get(), incremental)
+
+    def save_worker(self, io_queue, cancel, filename, compact, incremental):
+        # Runs on the worker thread
+        try:
+            self.model.write(filename, compact, incremental, 
+                             lambda fraction: io_queue.put(("progress", fraction)))
+        except Exception as e:
+            io_queue.put(("error", f"Error saving tasks: {e}"))
+        else:
+            io_queue.put(("saved", filename))
 
-    def save_to_file(self, filename):
-        with open(filename, 'w') as file:
-            data = [task.to_dict() for task in self.tasks]
-            json.dump(data, file, indent=2)
+    def finish_save(self, job, filename):
+        self.model.saved(filename, export=job == "exporting")
+        if job == "exporting":
+            self.set_status(f"Tasks exported to {filename}")
+        else:
+            self.set_status(f"Tasks saved to {filename}")
 
     def load_tasks(self):
         # Check for default save file
         default_file = "tasks.json"
         if os.path.exists(default_file):
             self.load_from_file(default_file)
-            self.current_file = default_file
 
     def load_tasks_from_file(self):
+        if not self.check_idle():
+            return
+        
         filename = filedialog.askopenfilename(
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=TASK_FILETYPES
         )
         
         if filename:
             try:
                 self.load_from_file(filename)
-                self.current_file = filename
-                self.set_status(f"Tasks loaded from {filename}")
             except Exception as e:
                 messagebox.showerror("Error", f"Error loading tasks: {e}")
 
     def load_from_file(self, filename):
-        with open(filename, 'r') as file:
-            data = json.load(file)
-            self.tasks = [Task.from_dict(item) for item in data]
-            self.refresh_task_list()
+        # Parsed on a worker thread: tasks are shown batch by batch as they
+        # arrive, starting with the first screenful, and the indexes are
+        # built on the worker as well. A file that cannot be opened raises
+        # here, before the current list is replaced.
+        with open(filename, 'rb'):
+            pass
+        
+        self.model.clear()
+        self.selected_ids = set()
+        self.refresh_search()
+        self.view_offset = 0
+        self.refresh_task_list()
+        
+        self.start_io("loading", filename, self.load_worker, filename, 
+                      self.view_rows + VIEW_BUFFER_ROWS)
+
+    def load_worker(self, io_queue, cancel, filename, first_batch):
+        # Runs on the worker thread, so it must not touch Tk or the model
+        try:
+            loaded = read_task_file(filename, 
+                                    lambda batch: io_queue.put(("tasks", batch)), 
+                                    lambda fraction: io_queue.put(("progress", fraction)), 
+                                    cancel, first_batch, LOAD_BATCH)
+        except Exception as e:
+            io_queue.put(("error", f"Error loading tasks: {e}"))
+        else:
+            io_queue.put(("loaded", loaded))
+
+    @timed("load.batch")
+    def add_loaded_tasks(self, tasks):
+        # The indexes arrive when loading finishes, so only the visible list
+        # is kept up to date while tasks stream in, in file order even when
+        # sorted; finish_load puts it in order
+        self.model.add_loaded(tasks)
+        for task in tasks:
+            if self.matches_filter(task):
+                self.visible_ids.append(task.id)
+        self.visible_positions = None
+        self.render_viewport()
+        self.update_task_count()
+
+    @timed("load.install")
+    def finish_load(self, filename, loaded):
+        self.model.install(loaded)
+        self.refresh_search()
+        self.refresh_task_list()
+        
+        # A cancelled load is only part of the file, so the model does not
+        # tie the list to it
+        if loaded.cancelled:
+            self.set_status(f"Loading cancelled after {len(self.model)} tasks from {filename}")
+        elif loaded.records:
+            self.set_status(f"Tasks loaded from {filename}, {len(loaded.records)} unsaved changes recovered")
+        else:
+            self.set_status(f"Tasks loaded from {filename}")
+
+    def check_idle(self):
+        # The task list must not change while a worker is reading or writing it
+        if self.io_job is None:
+            return True
+        messagebox.showinfo("Info", f"Please wait until {self.io_job} has finished")
+        return False
+
+    def start_io(self, job, filename, worker, *args):
+        self.io_job = job
+        self.io_started = time.perf_counter()
+        self.io_filename = filename
+        self.io_queue = queue.Queue()
+        self.io_cancel = threading.Event()
+        threading.Thread(target=worker, args=(self.io_queue, self.io_cancel) + args, 
+                         daemon=True).start()
+        
+        self.progress_var.set(0)
+        self.progress_bar.pack(side=tk.RIGHT, padx=5, pady=2)
+        if job == "loading":
+            self.cancel_button.pack(side=tk.RIGHT, padx=5, pady=2)
+        self.set_status(f"{job.capitalize()} {filename}...")
+        self.root.after(IO_POLL_MS, self.poll_io, self.io_queue)
+
+    def poll_io(self, io_queue):
+        # Handle what the worker reported since the last poll, a bounded
+        # number of messages at a time so the window stays responsive
+        for _ in range(IO_MESSAGES_PER_POLL):
+            if io_queue is not self.io_queue:
+                return
+            try:
+                kind, value = io_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.handle_io_message(kind, value)
+        
+        if io_queue is self.io_queue:
+            self.root.after(IO_POLL_MS, self.poll_io, io_queue)
+
+    def handle_io_message(self, kind, value):
+        job, filename = self.io_job, self.io_filename
+        if kind == "progress":
+            self.progress_var.set(value * 100)
+            if job == "loading":
+                self.set_status(f"Loading {filename}... {len(self.model)} tasks")
+        elif kind == "tasks":
+            self.add_loaded_tasks(value)
+        elif kind == "loaded":
+            started = self.io_started
+            self.end_io()
+            self.finish_load(filename, value)
+            if PERF.enabled:
+                PERF.record("io.loading", started, time.perf_counter())
+        elif kind == "saved":
+            started = self.io_started
+            self.end_io()
+            self.finish_save(job, value)
+            if PERF.enabled:
+                PERF.record(f"io.{job}", started, time.perf_counter())
+        elif kind == "error":
+            self.end_io()
+            if job == "loading":
+                # Keep whatever was read before the error
+                self.model.keep_partial()
+                self.refresh_search()
+                self.refresh_task_list()
+            self.set_status("Ready")
+            messagebox.showerror("Error", value)
+
+    def end_io(self):
+        self.io_job = None
+        self.io_started = None
+        self.io_filename = None
+        self.io_queue = None
+        self.io_cancel = None
+        self.progress_bar.pack_forget()
+        self.cancel_button.pack_forget()
+
+    def cancel_io(self):
+        # Only loads can be cancelled; saves always run to completion
+        if self.io_job == "loading":
+            self.io_cancel.set()
+            self.set_status("Cancelling...")
+
+    def exit_app(self):
+        if self.io_job in ("saving", "exporting"):
+            if not messagebox.askyesno("Confirm Exit", 
+                                       "Tasks are still being saved. Exit anyway?"):
+                return
+        self.model.close()
+        self.root.quit()
+
+    def import_tasks(self):
+        if not self.check_idle():
+            return
+        
+        filename = filedialog.askopenfilename(filetypes=TASK_FILETYPES)
+        if not filename:
+            return
+        
+        try:
+            imported = self.bulk_import(filename)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error importing tasks: {e}")
+            return
+        self.set_status(f"Imported {len(imported)} tasks from {filename}")
+
+    def export_tasks(self):
+        if not self.check_idle():
+            return
+        
+        filename = filedialog.asksaveasfilename(defaultextension=".json", filetypes=TASK_FILETYPES)
+        if filename:
+            self.save_to_file(filename, job="exporting")
 
     def new_tasks(self):
-        if self.tasks:
+        if not self.check_idle():
+            return
+        
+        if self.model.tasks:
             confirm = messagebox.askyesno("Confirm New", 
-                                        "This will clear all current tasks. Continue?")
+                                        "This will clear all current tasks and cannot be undone. Continue?")
             if not confirm:
                 return
         
-        self.tasks = []
-        self.clear_form()
-        self.refresh_task_list()
+        with PERF.timing("clear"):
+            self.model.clear()
+            self.selected_ids = set()
+            self.refresh_search()
+            self.clear_form()
+            self.refresh_task_list()
         self.set_status("New task list created")
 
+    def refresh_search(self):
+        # Re-run the applied search after the model replaced many tasks
+        if self.search_term:
+            self.search_results = self.model.search(self.search_term)
+
     def set_status(self, message):
         self.status_var.set(message)
 
+    def show_statistics(self):
+        if self.stats_window is not None:
+            self.stats_window.lift()
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Statistics")
+        window.geometry("640x600")
+        window.transient(self.root)
+        window.protocol("WM_DELETE_WINDOW", self.close_statistics)
+        
+        controls = ttk.Frame(window)
+        controls.pack(fill=tk.X, padx=10, pady=(10, 0))
+        ttk.Label(controls, text="Days:").pack(side=tk.LEFT)
+        self.stats_days = tk.StringVar(value="30")
+        days_box = ttk.Combobox(controls, textvariable=self.stats_days, values=STATS_DAYS, 
+                                width=6, state="readonly")
+        days_box.pack(side=tk.LEFT, padx=5)
+        days_box.bind("<<ComboboxSelected>>", lambda event: self.draw_statistics())
+        
+        self.stats_summary_var = tk.StringVar()
+        ttk.Label(window, textvariable=self.stats_summary_var, justify=tk.LEFT).pack(
+            anchor=tk.W, padx=10, pady=10)
+        
+        ttk.Label(window, text="Created (grey) and completed (green) per day, "
+                               "completion rate (line)").pack(anchor=tk.W, padx=10)
+        self.history_canvas = tk.Canvas(window, height=170, background="white")
+        self.history_canvas.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        ttk.Label(window, text="Burndown: open tasks due per day (bars) and "
+                               "still due after it (line)").pack(anchor=tk.W, padx=10)
+        self.burndown_canvas = tk.Canvas(window, height=170, background="white")
+        self.burndown_canvas.pack(fill=tk.BOTH, expand=True, padx=10, pady=(5, 10))
+        for canvas in (self.history_canvas, self.burndown_canvas):
+            canvas.bind("<Configure>", lambda event: self.draw_statistics())
+        
+        self.stats_window = window
+        self.draw_statistics()
+
+    def close_statistics(self):
+        if self.stats_job is not None:
+            self.root.after_cancel(self.stats_job)
+            self.stats_job = None
+        self.stats_window.destroy()
+        self.stats_window = None
+
+    @timed("stats")
+    def draw_statistics(self):
+        self.stats_job = None
+        if self.stats_window is None:
+            return
+        
+        stats = self.model.stats
+        days = int(self.stats_days.get())
+        summary = stats.summary(self.today)
+        lines = [f"Tasks: {summary['total']}    Completed: {summary['completed']} "
+                 f"({summary['completion_rate']:.0%})    Open: {summary['open']}", 
+                 f"Overdue: {summary['overdue']}    Due today: {summary['due_today']}    "
+                 f"Repeating: {summary['open_repeating']}    No due date: {summary['open_undated']}"]
+        lines.append("    ".join(f"{priority}: {counts['open']} open, {counts['completed']} done" 
+                                   for priority, counts in summary["by_priority"].items()))
+        self.stats_summary_var.set("\n".join(lines))
+        
+        history = stats.history(days)
+        self.draw_chart(self.history_canvas, [row["date"] for row in history], 
+                        [([row["created"] for row in history], "#c8c8c8"), 
+                         ([row["completed"] for row in history], "#4caf50")], 
+                        [row["completion_rate"] for row in history], 1.0)
+        burndown = stats.burndown(days)
+        remaining = [row["remaining"] for row in burndown]
+        self.draw_chart(self.burndown_canvas, [row["date"] for row in burndown], 
+                        [([row["due"] for row in burndown], "#90caf9")], 
+                        remaining, max(remaining, default=0))
+
+    def draw_chart(self, canvas, dates, bar_series, line, line_top):
+        # Bars share one scale, the line is scaled to line_top; dates label
+        # the first and last day
+        canvas.delete("all")
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
+        margin = 20
+        if width <= 2 * margin or height <= 2 * margin or not dates:
+            return
+        
+        plot_width = width - 2 * margin
+        plot_height = height - 2 * margin
+        step = plot_width / len(dates)
+        bar_top = max((max(values, default=0) for values, _ in bar_series), default=0) or 1
+        for values, color in bar_series:
+            for index, value in enumerate(values):
+                if value:
+                    x = margin + index * step
+                    y = margin + plot_height * (1 - value / bar_top)
+                    canvas.create_rectangle(x, y, x + max(1, step - 1), margin + plot_height, 
+                                            fill=color, outline="")
+        
+        line_top = line_top or 1
+        points = []
+        for index, value in enumerate(line):
+            points.extend((margin + (index + 0.5) * step, margin + plot_height * (1 - value / line_top)))
+        if len(points) >= 4:
+            canvas.create_line(*points, fill="#c62828", width=2)
+        
+        canvas.create_line(margin, margin + plot_height, width - margin, margin + plot_height)
+        canvas.create_text(margin, height - 4, text=dates[0], anchor=tk.SW, font=("Arial", 8))
+        canvas.create_text(width - margin, height - 4, text=dates[-1], anchor=tk.SE, font=("Arial", 8))
+        canvas.create_text(margin, 2, text=f"max {bar_top}", anchor=tk.NW, font=("Arial", 8))
+
+    def show_perf(self, enabled):
+        # Switched off, timed operations only check the flag and the
+        # overlay stops redrawing
+        PERF.enabled = enabled
+        self.perf_enabled.set(enabled)
+        if enabled:
+            self.perf_label.pack(side=tk.RIGHT, padx=5, pady=2)
+            if self.perf_job is None:
+                self.update_perf()
+        else:
+            PERF.capture = None
+            self.perf_label.pack_forget()
+            if self.perf_job is not None:
+                self.root.after_cancel(self.perf_job)
+                self.perf_job = None
+
+    def update_perf(self):
+        self.perf_var.set(PERF.describe())
+        # Profiles may have been written on the worker thread
+        for capture in PERF.take_finished():
+            if capture.error is not None:
+                messagebox.showerror("Error", f"Error writing profile: {capture.error}")
+            else:
+                self.set_status(f"Profile of '{capture.name}' written to {capture.filename}")
+        self.perf_job = self.root.after(PERF_REFRESH_MS, self.update_perf)
+
+    def show_profile_dialog(self):
+        profile_window = tk.Toplevel(self.root)
+        profile_window.title("Profile Next Operation")
+        profile_window.geometry("320x130")
+        profile_window.resizable(False, False)
+        profile_window.transient(self.root)
+        
+        ttk.Label(profile_window, text="Profile the next call of:").pack(pady=10)
+        names = sorted(PERF.names)
+        selected = tk.StringVar(value="refresh")
+        ttk.Combobox(profile_window, textvariable=selected, values=names, 
+                     state="readonly").pack(padx=20)
+        
+        ttk.Button(profile_window, text="Choose File...", 
+                   command=lambda: self.arm_profile(selected.get(), profile_window)).pack(pady=10)
+
+    def arm_profile(self, name, window):
+        filename = filedialog.asksaveasfilename(parent=window, defaultextension=".prof", 
+                                                filetypes=PROFILE_FILETYPES)
+        if not filename:
+            return
+        window.destroy()
+        PERF.arm(name, filename)
+        self.show_perf(True)
+        self.set_status(f"Profiling the next '{name}' operation")
+
+    def save_perf_snapshot(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".json", 
+                                                filetypes=[("JSON files", "*.json")])
+        if not filename:
+            return
+        try:
+            PERF.write_snapshot(filename)
+        except OSError as e:
+            messagebox.showerror("Error", f"Error saving snapshot: {e}")
+            return
+        self.set_status(f"Performance snapshot saved to {filename}")
+
     def show_about(self):
         about_window = tk.Toplevel(self.root)
         about_window.title("About Task Manager")
@@ -0,0 +1,272 @@
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+import json
+import os
+import threading
+import time
+
+# Set TASK_MANAGER_PERF=1 to time the instrumented operations from the
+# start; the window can also switch it on and off from the View menu
+PERF_ENV = "TASK_MANAGER_PERF"
+
+# Upper bounds in ms of the latency histogram buckets; a last bucket holds
+# anything slower
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Latest calls per operation the histograms and percentiles cover
+ROLLING_WINDOW = 1000
+
+# What capture files hold, by extension: a Chrome trace of the timed
+# operations, a pstats text report, or binary cProfile stats otherwise
+TRACE_EXTENSION = ".json"
+REPORT_EXTENSION = ".txt"
+
+NO_TIMING = nullcontext()
+
+
+def env_enabled():
+    return os.environ.get(PERF_ENV, "") not in ("", "0")
+
+
+def bucket_labels():
+    labels = [f"<={bound}ms" for bound in BUCKET_BOUNDS_MS]
+    labels.append(f">{BUCKET_BOUNDS_MS[-1]}ms")
+    return labels
+
+
+class LatencyHistogram:
+    # Call count and total time since the last reset, and bucket counts
+    # and percentiles over the latest ROLLING_WINDOW calls. The buckets are
+    # adjusted as samples enter and leave the window.
+    def __init__(self, window=ROLLING_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def add(self, ms):
+        if len(self.samples) == self.samples.maxlen:
+            self.buckets[bisect_left(BUCKET_BOUNDS_MS, self.samples[0])] -= 1
+        self.samples.append(ms)
+        self.buckets[bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def percentile(self, fraction):
+        # Nearest-rank percentile of the window, 0.0 when it is empty
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self):
+        return {"count": self.count,
+                "total_ms": round(self.total_ms, 3),
+                "last_ms": round(self.samples[-1], 3) if self.samples else 0.0,
+                "p50_ms": round(self.percentile(0.5), 3),
+                "p95_ms": round(self.percentile(0.95), 3),
+                "max_ms": round(max(self.samples, default=0.0), 3),
+                "buckets": dict(zip(bucket_labels(), self.buckets))}
+
+
+class Capture:
+    # Profiles the next call of one operation into filename, on whichever
+    # thread it runs. A trace also holds every timed operation that ran,
+    # on any thread, while that call was in progress.
+    def __init__(self, name, filename):
+        self.name = name
+        self.filename = filename
+        self.trace = filename.lower().endswith(TRACE_EXTENSION)
+        self.running = False
+        # (name, thread id, start, end) of the operations timed meanwhile
+        self.spans = []
+        self.error = None
+
+    def run(self, instruments, func, args, kwargs):
+        import cProfile
+
+        profiler = None if self.trace else cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            if profiler is None:
+                return func(*args, **kwargs)
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            instruments.record(self.name, started, time.perf_counter())
+            instruments.finish_capture(self, profiler)
+
+    def write(self, profiler):
+        if profiler is None:
+            origin = min((span[2] for span in self.spans), default=0.0)
+            events = [{"name": name, "ph": "X", "pid": os.getpid(), "tid": thread_id,
+                       "ts": round((start - origin) * 1e6, 1),
+                       "dur": round((end - start) * 1e6, 1)}
+                      for name, thread_id, start, end in self.spans]
+            with open(self.filename, 'w') as file:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        elif self.filename.lower().endswith(REPORT_EXTENSION):
+            import pstats
+
+            with open(self.filename, 'w') as file:
+                pstats.Stats(profiler, stream=file).sort_stats("cumulative").print_stats()
+        else:
+            profiler.dump_stats(self.filename)
+
+
+class Instruments:
+    # Latency histograms and counters for the operations marked with
+    # timed(). Switched off, a timed operation costs one attribute check,
+    # and timing() hands out a shared do-nothing context.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        # Operations are timed on the Tk thread and the I/O worker
+        self.lock = threading.Lock()
+        # Every name passed to timed(), the operations a capture can profile
+        self.names = set()
+        self.histograms = {}
+        self.counters = {}
+        # (name, ms) of the latest timed operation
+        self.last = None
+        # The armed or running Capture, and finished ones not yet reported
+        self.capture = None
+        self.finished = []
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.last = None
+
+    def record(self, name, started, ended):
+        ms = (ended - started) * 1000
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(ms)
+            self.last = (name, ms)
+            if self.capture is not None and self.capture.running and self.capture.trace:
+                self.capture.spans.append((name, threading.get_ident(), started, ended))
+
+    def count(self, name, step=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + step
+
+    def call(self, name, func, args, kwargs):
+        capture = self.capture
+        if capture is not None and capture.name == name and self.start_capture(capture):
+            return capture.run(self, func, args, kwargs)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(name, started, time.perf_counter())
+
+    def timing(self, name):
+        # Time a block: with PERF.timing("load.parse"): ...
+        if not self.enabled:
+            return NO_TIMING
+        return self._timing(name)
+
+    @contextmanager
+    def _timing(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started, time.perf_counter())
+
+    def arm(self, name, filename):
+        # Profile the next call of name into filename; switches timing on
+        with self.lock:
+            self.capture = Capture(name, filename)
+            self.enabled = True
+
+    def start_capture(self, capture):
+        # Only the first call to reach the armed capture runs it
+        with self.lock:
+            if self.capture is not capture or capture.running:
+                return False
+            capture.running = True
+            return True
+
+    def finish_capture(self, capture, profiler):
+        with self.lock:
+            self.capture = None
+        try:
+            capture.write(profiler)
+        except OSError as e:
+            capture.error = e
+        with self.lock:
+            self.finished.append(capture)
+
+    def take_finished(self):
+        # Captures written since the last call, for reporting on the Tk
+        # thread
+        with self.lock:
+            finished, self.finished = self.finished, []
+        return finished
+
+    def slowest(self):
+        # (name, histogram) of the operation with the highest p95, or None
+        with self.lock:
+            histograms = list(self.histograms.items())
+        if not histograms:
+            return None
+        return max(histograms, key=lambda item: item[1].percentile(0.95))
+
+    def snapshot(self):
+        with self.lock:
+            return {"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "operations": {name: histogram.summary()
+                                   for name, histogram in sorted(self.histograms.items())},
+                    "counters": dict(sorted(self.counters.items()))}
+
+    def write_snapshot(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+    def report(self):
+        # One line per operation, slowest p95 first
+        snapshot = self.snapshot()
+        operations = snapshot["operations"]
+        lines = [f"{'operation':<20} {'calls':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+        for name, summary in sorted(operations.items(), key=lambda item: -item[1]["p95_ms"]):
+            lines.append(f"{name:<20} {summary['count']:>8} {summary['p50_ms']:>9.1f} "
+                         f"{summary['p95_ms']:>9.1f} {summary['max_ms']:>9.1f}")
+        for name, count in snapshot["counters"].items():
+            lines.append(f"{name:<20} {count:>8}")
+        return lines
+
+    def describe(self):
+        # One line for the status bar: the latest operation and the one
+        # with the slowest p95
+        if self.last is None:
+            return "perf: waiting"
+        name, ms = self.last
+        text = f"perf: {name} {ms:.1f} ms"
+        slowest = self.slowest()
+        if slowest is not None:
+            slow_name, histogram = slowest
+            text += f" | slowest p95 {slow_name} {histogram.percentile(0.95):.1f} ms"
+        return text
+
+
+PERF = Instruments(env_enabled())
+
+
+def timed(name):
+    # Decorator timing every call of a function as the operation name
+    PERF.names.add(name)
+
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PERF.enabled:
+                return func(*args, **kwargs)
+            return PERF.call(name, func, args, kwargs)
+        return wrapper
+    return decorate
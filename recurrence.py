@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+# Choices offered by the form, as the RRULE strings stored on tasks; any
+# other RFC 5545 RRULE (e.g. "FREQ=WEEKLY;BYDAY=MO,WE") is accepted as well
+RECURRENCE_PRESETS = {
+    "Daily": "FREQ=DAILY",
+    "Weekly": "FREQ=WEEKLY",
+    "Monthly": "FREQ=MONTHLY",
+    "Yearly": "FREQ=YEARLY",
+}
+NO_RECURRENCE = "Never"
+
+# Occurrence lists remembered, keyed by rule, series start and window
+OCCURRENCE_CACHE_SIZE = 4096
+RULE_CACHE_SIZE = 1024
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Tasks only carry dates, so rules repeating within a day are refused
+SUB_DAILY_FREQS = ("HOURLY", "MINUTELY", "SECONDLY")
+SUB_DAILY_PARTS = ("BYHOUR", "BYMINUTE", "BYSECOND")
+
+# Most occurrences expanded for one window, whatever its length
+MAX_OCCURRENCES = 10000
+
+
+def check_recurrence(value):
+    # None for a one-off task, otherwise the RRULE string to store. Preset
+    # names are translated, anything else must parse as an RRULE.
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("A repeat rule must be text")
+    if not value.strip() or value.strip() == NO_RECURRENCE:
+        return None
+    value = value.strip()
+    for name, rule in RECURRENCE_PRESETS.items():
+        if value.lower() == name.lower():
+            return rule
+
+    rule = value.upper()
+    if rule.startswith("RRULE:"):
+        rule = rule[len("RRULE:"):]
+    if is_sub_daily(rule):
+        raise ValueError(f"Invalid repeat rule '{value}', tasks repeat at most daily")
+    try:
+        get_rule(rule, "2000-01-01")
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid repeat rule '{value}', use {', '.join(RECURRENCE_PRESETS)} "
+                         "or an RRULE such as FREQ=WEEKLY;BYDAY=MO") from None
+    return rule
+
+
+def is_sub_daily(rule):
+    parts = dict(part.partition("=")[::2] for part in rule.upper().split(";"))
+    return parts.get("FREQ") in SUB_DAILY_FREQS or any(name in parts for name in SUB_DAILY_PARTS)
+
+
+def describe_recurrence(rule):
+    # The preset name for a stored rule, or the rule itself
+    for name, preset in RECURRENCE_PRESETS.items():
+        if rule == preset:
+            return name
+    return rule or NO_RECURRENCE
+
+
+@lru_cache(maxsize=RULE_CACHE_SIZE)
+def get_rule(rule, start):
+    # The dateutil rrule for a series starting on the YYYY-MM-DD date start.
+    # dateutil is only imported once a repeating task is used. A sub-daily
+    # rule read from an older file counts as invalid, like one that does
+    # not parse.
+    from dateutil.rrule import rrulestr
+
+    if is_sub_daily(rule):
+        raise ValueError(f"Repeat rule '{rule}' repeats within a day")
+    return rrulestr(rule, dtstart=datetime.strptime(start, DATE_FORMAT))
+
+
+@lru_cache(maxsize=OCCURRENCE_CACHE_SIZE)
+def occurrences(rule, start, window_from, window_to):
+    # YYYY-MM-DD dates of the series within [window_from, window_to], each
+    # once; only this window is generated, however long the series runs,
+    # and at most MAX_OCCURRENCES occurrences of it
+    try:
+        series = get_rule(rule, start)
+        after = datetime.strptime(window_from, DATE_FORMAT)
+        before = datetime.strptime(window_to, DATE_FORMAT) + timedelta(days=1)
+    except (ValueError, TypeError):
+        return ()
+    dates = []
+    for when in series.xafter(after, count=MAX_OCCURRENCES, inc=True):
+        if when >= before:
+            break
+        day = when.date().isoformat()
+        if not dates or dates[-1] != day:
+            dates.append(day)
+    return tuple(dates)
+
+
+@lru_cache(maxsize=OCCURRENCE_CACHE_SIZE)
+def next_occurrence(rule, start, on_or_after):
+    # The first date of the series on or after on_or_after, or None once the
+    # series has ended
+    try:
+        when = get_rule(rule, start).after(datetime.strptime(on_or_after, DATE_FORMAT), inc=True)
+    except (ValueError, TypeError):
+        return None
+    return when.date().isoformat() if when else None
+
+
+def day_after(day):
+    return (datetime.strptime(day, DATE_FORMAT) + timedelta(days=1)).date().isoformat()
+
+
+def occurs_between(rule, start, due_from=None, due_to=None):
+    # True if the series has a date in the range; either end may be open
+    if due_to is not None and start > due_to:
+        return False
+    if due_from is None:
+        return True
+    if due_to is None:
+        return next_occurrence(rule, start, max(start, due_from)) is not None
+    return bool(occurrences(rule, start, due_from, due_to))
@@ -0,0 +1,169 @@
+import heapq
+import time
+
+from recurrence import day_after, next_occurrence
+
+# Reminder kinds: "due" fires when a task's due date starts, "overdue" once
+# it has passed without the task being completed. A repeating task only gets
+# "due", for one date of its series at a time.
+DUE = "due"
+OVERDUE = "overdue"
+
+# Stale heap entries tolerated, relative to the live ones, before the heap
+# is rebuilt without them
+STALE_RATIO = 2
+STALE_MIN = 64
+
+
+def day_bounds(due_date, cache):
+    # Local epoch seconds at the start and end of a YYYY-MM-DD day; None
+    # for anything else. Due dates repeat a lot, so cache holds the answers.
+    bounds = cache.get(due_date)
+    if bounds is None and due_date not in cache:
+        try:
+            year, month, day = int(due_date[:4]), int(due_date[5:7]), int(due_date[8:10])
+            start = time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))
+            end = time.mktime((year, month, day + 1, 0, 0, 0, 0, 0, -1))
+            bounds = (start, end)
+        except (ValueError, OverflowError):
+            bounds = None
+        cache[due_date] = bounds
+    return bounds
+
+
+class ReminderIndex:
+    # Min-heap of upcoming reminder times for incomplete tasks with a due
+    # date, so the next deadline is known without scanning the list. A
+    # changed or deleted task's entries are not searched for; its stamp is
+    # bumped and the old entries are skipped when they reach the top.
+    def __init__(self):
+        # (when, task_id, kind, stamp)
+        self.heap = []
+        # task id -> ((due_date, recurrence), stamp, entries still in the heap)
+        self.scheduled = {}
+        self.live = 0
+        self.next_stamp = 0
+        self.bounds_cache = {}
+
+    def clear(self):
+        self.__init__()
+
+    def rebuild(self, tasks, now=None):
+        self.clear()
+        now = time.time() if now is None else now
+        for task in tasks:
+            self.heap.extend(self._schedule(task, now))
+        heapq.heapify(self.heap)
+
+    def add(self, task):
+        self.update(task)
+
+    def update(self, task, now=None):
+        current = self.scheduled.get(task.id)
+        if current is not None and current[0] == self._key(task):
+            return
+        self.remove(task.id)
+        for entry in self._schedule(task, time.time() if now is None else now):
+            heapq.heappush(self.heap, entry)
+
+    def update_many(self, tasks):
+        for task in tasks:
+            self.update(task)
+
+    def remove(self, task_id):
+        current = self.scheduled.pop(task_id, None)
+        if current is not None:
+            self.live -= current[2]
+            self._compact_if_stale()
+
+    def remove_many(self, task_ids):
+        for task_id in task_ids:
+            self.remove(task_id)
+
+    def next_time(self):
+        # When the earliest pending reminder is due, or None
+        self._drop_stale()
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now=None):
+        # (kind, task id) for every reminder due by now, oldest first
+        now = time.time() if now is None else now
+        events = []
+        while True:
+            self._drop_stale()
+            if not self.heap or self.heap[0][0] > now:
+                return events
+            when, task_id, kind, _ = heapq.heappop(self.heap)
+            # The task stays in scheduled after its last reminder so an edit
+            # that keeps the due date does not fire it again
+            key, stamp, remaining = self.scheduled[task_id]
+            self.scheduled[task_id] = (key, stamp, remaining - 1)
+            self.live -= 1
+            events.append((kind, task_id))
+
+            due_date, recurrence = key
+            if recurrence:
+                # Move on to the series' next date
+                day = day_after(time.strftime("%Y-%m-%d", time.localtime(when)))
+                self._push_occurrence(task_id, recurrence, due_date, day, stamp)
+
+    @staticmethod
+    def _key(task):
+        # What the reminders of a task depend on; None if it gets none
+        if task.completed or not task.due_date:
+            return None
+        return (task.due_date, task.recurrence)
+
+    def _schedule(self, task, now):
+        # Entries for one task, recorded in scheduled; a day that is already
+        # over only gets its overdue reminder
+        key = self._key(task)
+        if key is None:
+            return []
+        due_date, recurrence = key
+        stamp = self.next_stamp
+        self.next_stamp += 1
+        if recurrence:
+            self.scheduled[task.id] = (key, stamp, 0)
+            today = time.strftime("%Y-%m-%d", time.localtime(now))
+            return self._occurrence_entries(task.id, recurrence, due_date, today, stamp)
+
+        bounds = day_bounds(due_date, self.bounds_cache)
+        if bounds is None:
+            return []
+        start, end = bounds
+        entries = [(end, task.id, OVERDUE, stamp)]
+        if end > now:
+            entries.append((start, task.id, DUE, stamp))
+        self.scheduled[task.id] = (key, stamp, len(entries))
+        self.live += len(entries)
+        return entries
+
+    def _occurrence_entries(self, task_id, recurrence, due_date, on_or_after, stamp):
+        # The reminder for the next date of a series, if it has one left
+        day = next_occurrence(recurrence, due_date, on_or_after)
+        bounds = day_bounds(day, self.bounds_cache) if day else None
+        if bounds is None:
+            return []
+        key, stamp, remaining = self.scheduled[task_id]
+        self.scheduled[task_id] = (key, stamp, remaining + 1)
+        self.live += 1
+        return [(bounds[0], task_id, DUE, stamp)]
+
+    def _push_occurrence(self, task_id, recurrence, due_date, on_or_after, stamp):
+        for entry in self._occurrence_entries(task_id, recurrence, due_date, on_or_after, stamp):
+            heapq.heappush(self.heap, entry)
+
+    def _is_live(self, entry):
+        current = self.scheduled.get(entry[1])
+        return current is not None and current[1] == entry[3]
+
+    def _drop_stale(self):
+        while self.heap and not self._is_live(self.heap[0]):
+            heapq.heappop(self.heap)
+
+    def _compact_if_stale(self):
+        stale = len(self.heap) - self.live
+        if stale > STALE_MIN and stale > self.live * STALE_RATIO:
+            self.heap = [entry for entry in self.heap if self._is_live(entry)]
+            heapq.heapify(self.heap)
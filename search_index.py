@@ -0,0 +1,141 @@
+from bisect import bisect_left, insort
+
+# Terms at least this long are answered from the trigram index, shorter
+# ones match the start of a word
+GRAM_SIZE = 3
+
+
+def trigrams(text):
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class SearchIndex:
+    # Inverted index over task descriptions: trigram -> ids for substring
+    # search and word -> ids (with a sorted word list) for prefix search
+    def __init__(self):
+        self.grams = {}
+        self.words = {}
+        self.sorted_words = []
+        # Lowercased description for each indexed task id
+        self.texts = {}
+
+    def clear(self):
+        self.__init__()
+
+    def rebuild(self, tasks):
+        # Bulk load, sorting the word list once at the end
+        self.clear()
+        grams = self.grams
+        words = self.words
+        for task in tasks:
+            text = task.description.lower()
+            self.texts[task.id] = text
+            for gram in trigrams(text):
+                grams.setdefault(gram, set()).add(task.id)
+            for word in set(text.split()):
+                words.setdefault(word, set()).add(task.id)
+        self.sorted_words = sorted(words)
+
+    def add(self, task_id, description):
+        text = description.lower()
+        self.texts[task_id] = text
+        for gram in trigrams(text):
+            self.grams.setdefault(gram, set()).add(task_id)
+        for word in set(text.split()):
+            if word not in self.words:
+                self.words[word] = set()
+                insort(self.sorted_words, word)
+            self.words[word].add(task_id)
+
+    def remove(self, task_id):
+        text = self.texts.pop(task_id, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            self._discard(self.grams, gram, task_id)
+        for word in set(text.split()):
+            if self._discard(self.words, word, task_id):
+                del self.sorted_words[bisect_left(self.sorted_words, word)]
+
+    def remove_many(self, task_ids):
+        # Like remove() for each id, but prunes the sorted word list once
+        emptied = set()
+        for task_id in task_ids:
+            text = self.texts.pop(task_id, None)
+            if text is None:
+                continue
+            for gram in trigrams(text):
+                self._discard(self.grams, gram, task_id)
+            for word in set(text.split()):
+                if self._discard(self.words, word, task_id):
+                    emptied.add(word)
+        if emptied:
+            self.sorted_words = [word for word in self.sorted_words if word not in emptied]
+
+    def update(self, task_id, description):
+        # Re-index only when the text actually changed
+        if self.texts.get(task_id) != description.lower():
+            self.remove(task_id)
+            self.add(task_id, description)
+
+    @staticmethod
+    def matches(term, text):
+        if len(term) >= GRAM_SIZE:
+            return term in text
+        return any(word.startswith(term) for word in text.split())
+
+    def candidates(self, term):
+        # Ids that may match term; the caller confirms them with verify()
+        if len(term) < GRAM_SIZE:
+            return self.prefix_ids(term)
+
+        # Intersect the posting lists, smallest first
+        postings = []
+        for gram in trigrams(term):
+            ids = self.grams.get(gram)
+            if not ids:
+                return set()
+            postings.append(ids)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for ids in postings[1:]:
+            result.intersection_update(ids)
+            if not result:
+                break
+        return result
+
+    def verify(self, term, task_ids):
+        # Trigram hits can be false positives ("abcd" vs "abc bcd"), prefix
+        # hits are exact already. Candidates may be checked in batches while
+        # the list changes, so tasks deleted meanwhile are left out.
+        texts = self.texts
+        if len(term) < GRAM_SIZE:
+            return [task_id for task_id in task_ids if task_id in texts]
+        result = []
+        for task_id in task_ids:
+            text = texts.get(task_id)
+            if text is not None and term in text:
+                result.append(task_id)
+        return result
+
+    def search(self, term):
+        return set(self.verify(term, self.candidates(term)))
+
+    def prefix_ids(self, prefix):
+        result = set()
+        position = bisect_left(self.sorted_words, prefix)
+        while position < len(self.sorted_words) and self.sorted_words[position].startswith(prefix):
+            result.update(self.words[self.sorted_words[position]])
+            position += 1
+        return result
+
+    def _discard(self, postings, key, task_id):
+        # Returns True when the posting list became empty and was dropped
+        ids = postings.get(key)
+        if ids is None:
+            return False
+        ids.discard(task_id)
+        if not ids:
+            del postings[key]
+            return True
+        return False
@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import json
+from urllib.parse import parse_qs, urlsplit
+
+from cli import DEFAULT_FILE, open_list
+from recurrence import check_recurrence
+from tag_index import check_tags
+from sort_index import SORT_KEYS
+from task_core import Task, apply_filter, check_completed, check_description, check_due_date
+from task_core import check_fields, check_priority, check_series, check_task_id, filter_query
+from task_core import new_filters
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Tasks per page of GET /tasks unless ?limit= asks for fewer
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Longest history and burndown GET /stats returns, in days
+MAX_STATS_DAYS = 3660
+
+# Largest request body accepted, so one client cannot exhaust memory
+MAX_BODY_BYTES = 64 << 20
+
+STATUS_TEXT = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request",
+               404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def check_new_task(data):
+    # Fields of a task to add, validated before anything is changed
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object for each task")
+    fields = {"description": check_description(data.get("description", "")),
+              "priority": check_priority(data.get("priority", "Medium")),
+              "due_date": check_due_date(data.get("due_date")),
+              "completed": check_completed(data.get("completed", False)),
+              "recurrence": check_recurrence(data.get("recurrence")),
+              "tags": check_tags(data.get("tags"))}
+    check_series(fields["recurrence"], fields["due_date"])
+    return fields
+
+
+def batch_list(data, name):
+    # One of the lists of a batch request; missing means empty
+    items = data.get(name, [])
+    if not isinstance(items, list):
+        raise ValueError(f"Expected {name} to be a list")
+    return items
+
+
+def check_batch_id(task_id):
+    # Task ids in a batch are JSON numbers; bool is an int subclass but no id
+    if type(task_id) is not int:
+        raise ValueError(f"Invalid task id {task_id!r}, use a whole number")
+    return task_id
+
+
+def check_task_record(data):
+    # A full Task.to_dict() record, as written to task files
+    if isinstance(data, dict):
+        check_task_id(data.get("id"))
+    try:
+        return Task.from_dict(data)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Expected task records with description, priority, due_date, "
+                         "completed and created_at") from None
+
+
+def page_args(query):
+    try:
+        offset = int(query.get("offset", ["0"])[0])
+        limit = int(query.get("limit", [str(PAGE_SIZE)])[0])
+    except ValueError:
+        raise ValueError("offset and limit must be integers") from None
+    if offset < 0 or limit < 0:
+        raise ValueError("offset and limit must not be negative")
+    return offset, min(limit, MAX_PAGE_SIZE)
+
+
+class TaskServer:
+    # The TaskList behind a small HTTP/JSON API. Requests are handled on
+    # one event loop, so reads never see a half-applied change. Changes take
+    # write_lock, which is also held while the file is rewritten on a worker
+    # thread; reads can carry on meanwhile since writing only reads tasks.
+    # Other processes may share the file: changes catch up with theirs
+    # first, and reads pick them up unless a write is in progress. Nothing
+    # waits for another process on the event loop: a change finding the
+    # file busy fails with 503, and reads make do with what they have.
+    def __init__(self, filename):
+        self.filename = filename
+        self.tasks = open_list(filename)
+        self.write_lock = asyncio.Lock()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, path, query, body, keep_alive = request
+                status, payload = await self.dispatch(method, path, query, body)
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HttpError as e:
+            self.write_response(writer, e.status, {"error": str(e)}, False)
+        except ValueError:
+            # A request or header line longer than the stream's limit
+            self.write_response(writer, 400, {"error": "Request line too long"}, False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(400, "Malformed request line") from None
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length") from None
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+        url = urlsplit(target)
+        return method.upper(), url.path.rstrip("/") or "/", parse_qs(url.query), body, keep_alive
+
+    def write_response(self, writer, status, payload, keep_alive):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if body:
+            head.append("Content-Type: application/json")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def dispatch(self, method, path, query, body):
+        parts = path.strip("/").split("/")
+        try:
+            if method == "GET":
+                self.sync()
+            data = json.loads(body) if body else None
+            if parts == ["tags"]:
+                if method == "GET":
+                    return 200, self.tasks.tag_counts()
+                raise HttpError(405, f"{method} is not supported on {path}")
+            if parts == ["stats"]:
+                if method == "GET":
+                    return 200, self.get_stats(query)
+                raise HttpError(405, f"{method} is not supported on {path}")
+            if parts[0] != "tasks":
+                raise HttpError(404, f"No such resource {path}")
+
+            if len(parts) == 1:
+                if method == "GET":
+                    return 200, self.list_tasks(query)
+                if method == "POST":
+                    return 201, await self.add_task(data)
+            elif parts[1] == "batch" and len(parts) == 2:
+                if method == "POST":
+                    return 200, await self.batch(data)
+            else:
+                if not parts[1].isdigit():
+                    raise HttpError(404, f"No such resource {path}")
+                task_id = int(parts[1])
+                if len(parts) == 2:
+                    if method == "GET":
+                        return 200, self.tasks[task_id].to_dict()
+                    if method in ("PATCH", "PUT"):
+                        return 200, await self.update_task(task_id, data)
+                    if method == "DELETE":
+                        await self.delete_task(task_id)
+                        return 204, None
+                elif parts[2:] == ["toggle"] and method == "POST":
+                    return 200, await self.toggle_task(task_id)
+                else:
+                    raise HttpError(404, f"No such resource {path}")
+            raise HttpError(405, f"{method} is not supported on {path}")
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except KeyError as e:
+            return 404, {"error": f"No task with id {e}"}
+        except TimeoutError as e:
+            # Another process kept the file locked
+            return 503, {"error": str(e)}
+        except ValueError as e:
+            # Includes malformed JSON and non-numeric task ids
+            return 400, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"Internal error: {e}"}
+
+    def sync(self):
+        if not self.write_lock.locked():
+            self.tasks.sync()
+            self.tasks.take_remote_changes()
+
+    def get_stats(self, query):
+        # GET /stats?days=30: the summary plus the history of the last and
+        # the burndown of the next days days, all from maintained aggregates
+        try:
+            days = int(query.get("days", ["30"])[0])
+        except ValueError:
+            raise ValueError("days must be an integer") from None
+        if not 0 < days <= MAX_STATS_DAYS:
+            raise ValueError(f"days must be between 1 and {MAX_STATS_DAYS}")
+        stats = self.tasks.stats
+        return {"summary": stats.summary(),
+                "history": stats.history(days),
+                "burndown": stats.burndown(days)}
+
+    def list_tasks(self, query):
+        # GET /tasks?filter=High&filter=Incomplete&search=term&sort=due_date
+        #     &descending=1&offset=0&limit=100
+        filters = new_filters()
+        for name in query.get("filter", []):
+            apply_filter(filters, name)
+        search = query.get("search", [None])[0]
+        sort = query.get("sort", [None])[0]
+        if sort is not None and sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort '{sort}', use one of {', '.join(SORT_KEYS)}")
+        descending = query.get("descending", ["0"])[0] not in ("0", "false", "")
+        offset, limit = page_args(query)
+
+        task_ids = self.tasks.query(search=search, sort=sort, descending=descending,
+                                    **filter_query(filters))
+        page = task_ids[offset:offset + limit]
+        return {"total": len(task_ids), "offset": offset, "limit": limit,
+                "tasks": [self.tasks[task_id].to_dict() for task_id in page]}
+
+    async def add_task(self, data):
+        fields = check_new_task(data)
+        async with self.write_lock:
+            with self.tasks.batch(wait=False):
+                task = self.tasks.add(**fields)
+            await self.changed()
+        return task.to_dict()
+
+    async def update_task(self, task_id, data):
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object of task fields")
+        async with self.write_lock:
+            with self.tasks.batch(wait=False):
+                task = self.tasks.update(task_id, **data)
+            await self.changed()
+        return task.to_dict()
+
+    async def delete_task(self, task_id):
+        async with self.write_lock:
+            with self.tasks.batch(wait=False):
+                self.tasks.delete(task_id)
+            await self.changed()
+
+    async def toggle_task(self, task_id):
+        async with self.write_lock:
+            # Toggled from the state after catching up with other processes
+            with self.tasks.batch(wait=False):
+                task = self.tasks.set_completed(task_id, not self.tasks[task_id].completed)
+            await self.changed()
+        return task.to_dict()
+
+    async def batch(self, data):
+        # {"add": [fields...], "import": [Task.to_dict()...],
+        #  "update": [{"id": 1, fields...}...], "delete": [ids...]}
+        # Everything is validated first, so a bad entry changes nothing;
+        # the changes are then journaled in one write.
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object with add, import, update and delete lists")
+        added = [check_new_task(item) for item in batch_list(data, "add")]
+        imported = [check_task_record(item) for item in batch_list(data, "import")]
+        updates = []
+        for item in batch_list(data, "update"):
+            if not isinstance(item, dict) or "id" not in item:
+                raise ValueError("Each update needs an id")
+            fields = dict(item)
+            task_id = check_batch_id(fields.pop("id"))
+            updates.append((task_id, check_fields(fields)))
+        deleted = [check_batch_id(task_id) for task_id in batch_list(data, "delete")]
+
+        async with self.write_lock:
+            with self.tasks.batch(wait=False):
+                # Checked against the tasks as they are after catching up,
+                # before the first change
+                for task_id in [task_id for task_id, _ in updates] + deleted:
+                    if task_id not in self.tasks:
+                        raise KeyError(task_id)
+                series = {}
+                for task_id, fields in updates:
+                    task = self.tasks[task_id]
+                    recurrence, due_date = series.get(task_id, (task.recurrence, task.due_date))
+                    series[task_id] = (fields.get("recurrence", recurrence),
+                                       fields.get("due_date", due_date))
+                    check_series(*series[task_id])
+                added_ids = [self.tasks.add(**fields).id for fields in added]
+                imported_ids = self.tasks.import_tasks(imported) if imported else []
+                for task_id, fields in updates:
+                    self.tasks.update(task_id, **fields)
+                self.tasks.delete_many(deleted)
+            await self.changed()
+        return {"added": added_ids, "imported": imported_ids,
+                "updated": len(updates), "deleted": len(set(deleted))}
+
+    async def changed(self):
+        # Called with write_lock held. Changes are journaled next to an
+        # existing file; the file itself is only rewritten when it is new or
+        # its journal has grown long.
+        if not self.tasks.is_journaled():
+            # Unless another process has just folded the journal in. One
+            # busy with the file right now leaves it for the next change.
+            if self.tasks.sync() and not self.tasks.is_journaled():
+                await self.save()
+
+    async def save(self):
+        loop = asyncio.get_running_loop()
+        incremental = self.filename == self.tasks.synced_file
+        await loop.run_in_executor(None, self.tasks.write, self.filename, False, incremental)
+        self.tasks.saved(self.filename)
+
+    async def close(self):
+        # Every change is already in the file or its journal
+        async with self.write_lock:
+            self.tasks.close()
+
+
+async def serve(filename, host, port):
+    app = TaskServer(filename)
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    print(f"Serving {filename} on http://{host}:{port}/tasks")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await app.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a task file over a local HTTP/JSON API")
+    parser.add_argument("--file", default=DEFAULT_FILE,
+                        help=f"task file, JSON or SQLite (default: {DEFAULT_FILE})")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.file, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
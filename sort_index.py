@@ -0,0 +1,200 @@
+from bisect import bisect_left, insort
+from datetime import date
+
+from recurrence import next_occurrence
+from task_index import PRIORITIES
+
+# Bulk changes touching at least this many tasks rebuild each sorted order in
+# one pass instead of moving entries one at a time
+BULK_CHANGES = 64
+
+# A filtered list smaller than the whole order by this factor is sorted on
+# its own instead of being picked out of the order
+SMALL_SELECTION_RATIO = 16
+
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+
+# The Status column's values, in the order it sorts them
+STATUSES = ("Overdue", "Due Today", "Pending", "Completed")
+STATUS_RANK = {status: rank for rank, status in enumerate(STATUSES)}
+
+# Columns whose keys also depend on the day; their orders are rebuilt when
+# it changes
+DAY_COLUMNS = ("status",)
+
+
+def due_date_key(task):
+    # Tasks without a due date sort after every dated task
+    return (task.due_date is None, task.due_date or "")
+
+
+def shown_due_date(task, today):
+    # The date a task is shown as due on: a repeating one is due on the next
+    # date of its series from today on, None once the series has ended
+    if task.recurrence and task.due_date:
+        return next_occurrence(task.recurrence, task.due_date, max(task.due_date, today))
+    return task.due_date
+
+
+def task_status(completed, due_date, today):
+    # The Status column for a task shown as due on due_date
+    if completed:
+        return "Completed"
+    if due_date and due_date < today:
+        return "Overdue"
+    if due_date == today:
+        return "Due Today"
+    return "Pending"
+
+
+def status_key(task, today):
+    # By the status shown, and within it by the date shown
+    due_date = shown_due_date(task, today)
+    return (STATUS_RANK[task_status(task.completed, due_date, today)],
+            due_date is None, due_date or "")
+
+
+# Sort key for each sortable column, computed once when a task is indexed.
+# YYYY-MM-DD due dates sort correctly as strings and creation times are
+# already epoch seconds, so no column parses a date while comparing. Keys of
+# DAY_COLUMNS also take the day, as YYYY-MM-DD.
+SORT_KEYS = {
+    "id": lambda task: task.id,
+    "description": lambda task: task.description.casefold(),
+    "priority": lambda task: PRIORITY_RANK.get(task.priority, len(PRIORITY_RANK)),
+    "due_date": due_date_key,
+    "status": status_key,
+    "created": lambda task: task.created,
+}
+
+
+class SortIndex:
+    # Sorted (key, id) lists for the columns the list has been sorted by.
+    # An order is built the first time its column is sorted and then kept in
+    # step with every change, so re-sorting never sorts the whole list again.
+    def __init__(self):
+        self.orders = {}
+        # column -> {task id: key} for each built order
+        self.keys = {}
+        # column -> the day the keys of a DAY_COLUMNS order are for
+        self.days = {}
+
+    def clear(self):
+        # Orders are rebuilt on demand after a bulk load
+        self.__init__()
+
+    def rebuild(self, tasks):
+        # Like the other indexes, but orders are only built when sorted by
+        self.clear()
+
+    def key_function(self, column):
+        key = SORT_KEYS[column]
+        if column in DAY_COLUMNS:
+            today = self.days[column]
+            return lambda task: key(task, today)
+        return key
+
+    def order(self, column, tasks):
+        # The (key, id) list for column, building it from tasks if needed
+        if column in DAY_COLUMNS:
+            today = date.today().isoformat()
+            if self.days.get(column) != today:
+                self.orders.pop(column, None)
+                self.keys.pop(column, None)
+                self.days[column] = today
+        if column not in self.orders:
+            key = self.key_function(column)
+            keys = {task_id: key(task) for task_id, task in tasks.items()}
+            self.keys[column] = keys
+            self.orders[column] = sorted((value, task_id) for task_id, value in keys.items())
+        return self.orders[column]
+
+    def sort(self, column, task_ids, tasks, descending=False):
+        # task_ids (any iterable, None for every task) in column order
+        order = self.order(column, tasks)
+        if task_ids is None:
+            result = [task_id for _, task_id in order]
+        elif len(task_ids) * SMALL_SELECTION_RATIO < len(order):
+            keys = self.keys[column]
+            result = sorted(task_ids, key=lambda task_id: (keys[task_id], task_id))
+        else:
+            result = [task_id for _, task_id in order if task_id in task_ids]
+        if descending:
+            result.reverse()
+        return result
+
+    def position(self, column, task_ids, task_id, descending=False):
+        # Where task_id belongs in task_ids, a list already in column order
+        keys = self.keys[column]
+        wanted = (keys[task_id], task_id)
+        low, high = 0, len(task_ids)
+        while low < high:
+            middle = (low + high) // 2
+            current = (keys[task_ids[middle]], task_ids[middle])
+            if (current > wanted) if descending else (current < wanted):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def add(self, task):
+        self.update(task)
+
+    def update(self, task):
+        for column, keys in self.keys.items():
+            key = self.key_function(column)(task)
+            if task.id in keys:
+                if keys[task.id] == key:
+                    continue
+                self._remove(self.orders[column], (keys[task.id], task.id))
+            keys[task.id] = key
+            insort(self.orders[column], (key, task.id))
+
+    def remove(self, task_id):
+        for column, keys in self.keys.items():
+            if task_id in keys:
+                self._remove(self.orders[column], (keys.pop(task_id), task_id))
+
+    def update_many(self, tasks):
+        if len(tasks) < BULK_CHANGES:
+            for task in tasks:
+                self.update(task)
+            return
+        for column, keys in self.keys.items():
+            key = self.key_function(column)
+            removed = set()
+            added = []
+            for task in tasks:
+                value = key(task)
+                if task.id in keys:
+                    if keys[task.id] == value:
+                        continue
+                    removed.add((keys[task.id], task.id))
+                keys[task.id] = value
+                added.append((value, task.id))
+            self._replace(column, removed, added)
+
+    def remove_many(self, task_ids):
+        if len(task_ids) < BULK_CHANGES:
+            for task_id in task_ids:
+                self.remove(task_id)
+            return
+        for column, keys in self.keys.items():
+            removed = {(keys.pop(task_id), task_id) for task_id in task_ids if task_id in keys}
+            self._replace(column, removed, [])
+
+    def _replace(self, column, removed, added):
+        if not removed and not added:
+            return
+        order = self.orders[column]
+        if removed:
+            order = [entry for entry in order if entry not in removed]
+        # Mostly sorted already, so this is close to linear
+        order.extend(added)
+        order.sort()
+        self.orders[column] = order
+
+    def _remove(self, order, entry):
+        position = bisect_left(order, entry)
+        if position < len(order) and order[position] == entry:
+            del order[position]
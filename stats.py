@@ -0,0 +1,219 @@
+from datetime import date, timedelta
+from itertools import accumulate
+import time
+
+from task_index import PRIORITIES
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Day series over at least this many counted days use NumPy when it is
+# installed; below that the plain loop is just as fast
+VECTORIZE_MIN_DAYS = 1000
+
+
+def load_numpy():
+    # NumPy is optional; None when it is not installed
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def due_ordinal(due_date):
+    # Date ordinal of a YYYY-MM-DD due date, None for anything else
+    try:
+        return date.fromisoformat(due_date).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def day_series(counts, first, last, vectorized=None):
+    # Per-day totals for the day ordinals first..last from a day ordinal ->
+    # count dict, and running totals that include every earlier day.
+    # vectorized=None picks NumPy for long histories if it is installed.
+    numpy = None
+    if vectorized or (vectorized is None and len(counts) >= VECTORIZE_MIN_DAYS):
+        numpy = load_numpy()
+        if numpy is None and vectorized:
+            raise ValueError("NumPy is not installed")
+
+    if numpy is not None:
+        days = numpy.fromiter(counts.keys(), dtype=numpy.int64, count=len(counts))
+        values = numpy.fromiter(counts.values(), dtype=numpy.int64, count=len(counts))
+        inside = (days >= first) & (days <= last)
+        totals = numpy.bincount(days[inside] - first, weights=values[inside],
+                                minlength=last - first + 1).astype(numpy.int64)
+        running = numpy.cumsum(totals) + values[days < first].sum()
+        return totals.tolist(), running.tolist()
+
+    totals = [counts.get(day, 0) for day in range(first, last + 1)]
+    before = sum(count for day, count in counts.items() if day < first)
+    return totals, list(accumulate(totals, initial=before))[1:]
+
+
+def add_count(counts, key, step):
+    # Adjust a key -> count dict, dropping keys that reach zero
+    count = counts.get(key, 0) + step
+    if count:
+        counts[key] = count
+    else:
+        del counts[key]
+
+
+class TaskStats:
+    # Aggregates behind the statistics panel and the status bar: counts per
+    # priority and status, open tasks per due date and tasks created and
+    # completed per day. Like the indexes they are adjusted on each change,
+    # so no statistic is computed by scanning the task list.
+    def __init__(self):
+        self.total = 0
+        self.completed = 0
+        # priority -> [open, completed]
+        self.by_priority = {priority: [0, 0] for priority in PRIORITIES}
+        # Open one-off tasks per due date; repeating and undated open tasks
+        # are only counted
+        self.open_by_due = {}
+        self.open_repeating = 0
+        self.open_undated = 0
+        # Day ordinal -> tasks created / completed that day. Tasks completed
+        # before completion times were recorded are not in completed_by_day.
+        self.created_by_day = {}
+        self.completed_by_day = {}
+        # Last counted entry for each task id, see _entry()
+        self.entries = {}
+        # UTC day -> local UTC offset in seconds, None if it changes that day
+        self.day_offsets = {}
+
+    def clear(self):
+        self.__init__()
+
+    def rebuild(self, tasks):
+        self.clear()
+        for task in tasks:
+            entry = self._entry(task)
+            self.entries[task.id] = entry
+            self._count(entry, 1)
+
+    def add(self, task):
+        self.update(task)
+
+    def update(self, task):
+        old = self.entries.get(task.id)
+        new = self._entry(task)
+        if old == new:
+            return
+        if old is not None:
+            self._count(old, -1)
+        self.entries[task.id] = new
+        self._count(new, 1)
+
+    def update_many(self, tasks):
+        for task in tasks:
+            self.update(task)
+
+    def remove(self, task_id):
+        entry = self.entries.pop(task_id, None)
+        if entry is not None:
+            self._count(entry, -1)
+
+    def remove_many(self, task_ids):
+        for task_id in task_ids:
+            self.remove(task_id)
+
+    def overdue(self, today):
+        # Open one-off tasks due before today (YYYY-MM-DD)
+        return sum(count for due_date, count in self.open_by_due.items() if due_date < today)
+
+    def summary(self, today=None):
+        today = today or date.today().isoformat()
+        open_count = self.total - self.completed
+        return {
+            "total": self.total,
+            "completed": self.completed,
+            "open": open_count,
+            "completion_rate": self.completed / self.total if self.total else 0.0,
+            "overdue": self.overdue(today),
+            "due_today": self.open_by_due.get(today, 0),
+            "open_repeating": self.open_repeating,
+            "open_undated": self.open_undated,
+            "by_priority": {priority: {"open": counts[0], "completed": counts[1]}
+                            for priority, counts in self.by_priority.items()},
+        }
+
+    def history(self, days=30, today=None, vectorized=None):
+        # One row per day for the last days days up to today: tasks created
+        # and completed that day and the share of all tasks created so far
+        # that were completed by the end of it
+        today = today or date.today()
+        first = today.toordinal() - days + 1
+        last = today.toordinal()
+        created, created_running = day_series(self.created_by_day, first, last, vectorized)
+        completed, completed_running = day_series(self.completed_by_day, first, last, vectorized)
+        return [{"date": date.fromordinal(first + offset).isoformat(),
+                 "created": created[offset],
+                 "completed": completed[offset],
+                 "completion_rate": (completed_running[offset] / created_running[offset]
+                                     if created_running[offset] else 0.0)}
+                for offset in range(days)]
+
+    def burndown(self, days=30, today=None, vectorized=None):
+        # One row per day for the next days days from today: open tasks due
+        # that day and the open dated tasks still due after it. Overdue
+        # tasks count as due today.
+        today = today or date.today()
+        first = today.toordinal()
+        last = first + days - 1
+        by_day = {}
+        for due_date, count in self.open_by_due.items():
+            day = due_ordinal(due_date)
+            if day is not None:
+                by_day[day] = by_day.get(day, 0) + count
+        due, due_running = day_series(by_day, first, last, vectorized)
+        total = sum(by_day.values())
+        # Tasks already overdue are due on the first day
+        overdue = due_running[0] - due[0] if days else 0
+        return [{"date": (today + timedelta(days=offset)).isoformat(),
+                 "due": due[offset] + (overdue if offset == 0 else 0),
+                 "remaining": total - due_running[offset]}
+                for offset in range(days)]
+
+    def _entry(self, task):
+        # (priority, completed, due date or None, repeating, created day,
+        # completed day or None)
+        completed_time = task.completed_time
+        return (task.priority, task.completed, task.due_date, bool(task.recurrence),
+                self._day(task.created),
+                self._day(completed_time) if completed_time is not None else None)
+
+    def _count(self, entry, step):
+        priority, completed, due_date, repeating, created_day, completed_day = entry
+        self.total += step
+        self.by_priority.setdefault(priority, [0, 0])[completed] += step
+        if completed:
+            self.completed += step
+        elif repeating and due_date:
+            self.open_repeating += step
+        elif due_date:
+            add_count(self.open_by_due, due_date, step)
+        else:
+            self.open_undated += step
+        add_count(self.created_by_day, created_day, step)
+        if completed and completed_day is not None:
+            add_count(self.completed_by_day, completed_day, step)
+
+    def _day(self, seconds):
+        # Local day ordinal of a timestamp. The UTC offset is looked up once
+        # per UTC day; only on days it changes is each timestamp converted.
+        utc_day = seconds // 86400
+        if utc_day not in self.day_offsets:
+            start = utc_day * 86400
+            offset = time.localtime(start).tm_gmtoff
+            if time.localtime(start + 86399).tm_gmtoff != offset:
+                offset = None
+            self.day_offsets[utc_day] = offset
+        offset = self.day_offsets[utc_day]
+        if offset is None:
+            return date.fromtimestamp(seconds).toordinal()
+        return (seconds + offset) // 86400 + EPOCH_ORDINAL
+
@@ -0,0 +1,261 @@
+import json
+import os
+
+from task_core import Task
+
+# Files with these extensions are opened with SqliteStorage, anything else
+# is treated as a JSON task list
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# Bytes read from disk per step while streaming a task file
+READ_CHUNK_SIZE = 1 << 16
+
+WHITESPACE = " \t\n\r"
+
+
+# SQLite rows read between progress reports
+PROGRESS_ROWS = 10000
+
+
+def iter_json_tasks(filename, progress=None):
+    # Yield Task objects one at a time from a JSON array of task dicts
+    # without loading the whole file or the whole list into memory.
+    # progress, if given, is called with the fraction of the file read.
+    decoder = json.JSONDecoder()
+    total = max(1, os.path.getsize(filename))
+    read = 0
+    with open(filename, 'r') as file:
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+        count = 0
+
+        while True:
+            # Skip whitespace and separators between array items
+            while position < len(buffer) and buffer[position] in WHITESPACE + ",":
+                if buffer[position] == "," and not started:
+                    raise ValueError(f"{filename}: expected a JSON list of tasks")
+                position += 1
+
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(f"{filename}: expected a JSON list of tasks")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == "]":
+                    return
+
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # The item may continue in the next chunk
+                    if eof:
+                        raise
+                else:
+                    count += 1
+                    yield task_from_record(item, filename, count)
+                    position = end
+                    continue
+            elif eof:
+                raise ValueError(f"{filename}: unexpected end of file")
+
+            chunk = file.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            if progress is not None:
+                read += len(chunk)
+                progress(min(1.0, read / total))
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def task_from_record(item, filename, count):
+    # Task.from_dict() for the count-th record of filename, with any
+    # problem reported as a ValueError naming both
+    try:
+        return Task.from_dict(item)
+    except KeyError as e:
+        reason = f"missing {e}"
+    except TypeError:
+        reason = "not a task record"
+    except ValueError as e:
+        reason = str(e)
+    raise ValueError(f"{filename}: task record {count} is invalid, {reason}")
+
+
+def report_progress(tasks, total, progress):
+    # Pass tasks through, calling progress with the fraction done every
+    # PROGRESS_ROWS tasks
+    for count, task in enumerate(tasks, 1):
+        if count % PROGRESS_ROWS == 0:
+            progress(count / total)
+        yield task
+
+
+def write_json_tasks(filename, tasks, compact=False):
+    # Serialize tasks one at a time; compact output puts each task on one
+    # line instead of indenting it. The file is replaced only once the new
+    # contents are completely written.
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, 'w') as file:
+        file.write("[")
+        separator = "\n"
+        for task in tasks:
+            if compact:
+                text = json.dumps(task.to_dict(), separators=(",", ":"))
+            else:
+                text = "  " + json.dumps(task.to_dict(), indent=2).replace("\n", "\n  ")
+            file.write(separator)
+            file.write(text)
+            separator = ",\n"
+        file.write("\n]" if separator != "\n" else "]")
+    os.replace(temp_filename, filename)
+
+
+def open_storage(filename, compact=False):
+    # Pick the storage backend from the file extension
+    if os.path.splitext(filename)[1].lower() in SQLITE_EXTENSIONS:
+        return SqliteStorage(filename)
+    return JsonStorage(filename, compact)
+
+
+class JsonStorage:
+    # A whole-file JSON task list; every save rewrites the file, so it has
+    # no save_changes()
+    incremental = False
+
+    def __init__(self, filename, compact=False):
+        self.filename = filename
+        self.compact = compact
+
+    def load(self, progress=None):
+        return iter_json_tasks(self.filename, progress)
+
+    def save(self, tasks):
+        write_json_tasks(self.filename, tasks, self.compact)
+
+    def changes(self, since):
+        # Tasks stamped after version since, and the ids of all tasks. The
+        # whole file is parsed, but only the changed tasks are kept.
+        changed = []
+        ids = set()
+        for task in self.load():
+            ids.add(task.id)
+            if task.version > since:
+                changed.append(task)
+        return changed, ids
+
+    def close(self):
+        pass
+
+
+class SqliteStorage:
+    # Tasks in an SQLite database. Saves can write only the rows that
+    # changed, in a single transaction. TaskList filters and searches with
+    # its own indexes, which also see changes still in the journal, so the
+    # only index here is the one changes() reads by.
+    incremental = True
+
+    COLUMNS = ("id, description, priority, due_date, completed, created_at, recurrence, tags, "
+               "completed_at, version")
+    UPSERT = f"INSERT OR REPLACE INTO tasks ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+    def __init__(self, filename):
+        import sqlite3
+
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    priority TEXT NOT NULL,
+                    due_date TEXT,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    created_at INTEGER NOT NULL,
+                    recurrence TEXT,
+                    tags TEXT,
+                    completed_at INTEGER,
+                    version INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+            # Databases written before tasks could repeat, be tagged, record
+            # their completion time or carry version stamps lack those columns
+            columns = {row[1] for row in self.connection.execute("PRAGMA table_info(tasks)")}
+            for column, kind in (("recurrence", "TEXT"), ("tags", "TEXT"),
+                                 ("completed_at", "INTEGER"),
+                                 ("version", "INTEGER NOT NULL DEFAULT 0")):
+                if column not in columns:
+                    self.connection.execute(f"ALTER TABLE tasks ADD COLUMN {column} {kind}")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS tasks_version ON tasks (version)")
+            # Older databases also indexed the filter columns, which only
+            # slowed down writes
+            for (name,) in self.connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND name IN "
+                    "('tasks_priority', 'tasks_completed', 'tasks_due_date')").fetchall():
+                self.connection.execute(f"DROP INDEX {name}")
+
+    def load(self, progress=None):
+        if progress is None:
+            return self.rows()
+        return self.load_with_progress(progress)
+
+    def load_with_progress(self, progress):
+        total = max(1, self.count())
+        for count, task in enumerate(self.rows(), 1):
+            if count % PROGRESS_ROWS == 0:
+                progress(min(1.0, count / total))
+            yield task
+
+    def rows(self):
+        # Tasks in id order, yielded as the cursor produces them. Filtering
+        # and search are left to TaskList's indexes, which also see the
+        # changes still in the journal.
+        for row in self.connection.execute(f"SELECT {self.COLUMNS} FROM tasks ORDER BY id"):
+            yield self.row_to_task(row)
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def changes(self, since):
+        # Tasks stamped after version since, and the ids of all tasks
+        cursor = self.connection.execute(
+            f"SELECT {self.COLUMNS} FROM tasks WHERE version > ? ORDER BY id", (since,))
+        changed = [self.row_to_task(row) for row in cursor]
+        return changed, {row[0] for row in self.connection.execute("SELECT id FROM tasks")}
+
+    def save(self, tasks):
+        # Replace the whole table with tasks
+        with self.connection:
+            self.connection.execute("DELETE FROM tasks")
+            self.connection.executemany(self.UPSERT, (self.task_to_row(task) for task in tasks))
+
+    def save_changes(self, changed_tasks, deleted_ids):
+        # Write only the rows that changed since the last save, in one
+        # transaction
+        with self.connection:
+            self.connection.executemany("DELETE FROM tasks WHERE id = ?",
+                                        ((task_id,) for task_id in deleted_ids))
+            self.connection.executemany(self.UPSERT,
+                                        (self.task_to_row(task) for task in changed_tasks))
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def task_to_row(task):
+        return (task.id, task.description, task.priority, task.due_date,
+                int(task.completed), task.created, task.recurrence,
+                ",".join(task.tags) or None, task.completed_time, task.version)
+
+    @staticmethod
+    def row_to_task(row):
+        task = Task(row[1], row[2], row[3], bool(row[4]), row[0], row[6],
+                    row[7].split(",") if row[7] else ())
+        task.created = row[5]
+        task.completed_time = row[8]
+        task.version = row[9]
+        return task
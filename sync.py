@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+# Several processes may work on one task file. Each change is made with the
+# file's lock held, after applying what the others appended to its journal,
+# so changes are never made to a stale list; see TaskList.batch().
+
+# The lock is taken on a file next to the task file that is never removed,
+# so every process locks the same file
+LOCK_SUFFIX = ".lock"
+
+# How long a change waits for another process to release the file, and how
+# often it tries meanwhile
+LOCK_TIMEOUT = 30
+LOCK_RETRY = 0.01
+
+
+def file_stamp(filename):
+    # Changes whenever the file is rewritten: JSON files are replaced, SQLite
+    # databases written in place. None if it does not exist.
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def next_version(version):
+    # Version stamp for a new change after version, the highest one seen.
+    # Stamps follow the clock in microseconds, so even lists that never saw
+    # each other's changes stamp later changes higher.
+    return max(version + 1, time.time_ns() // 1000)
+
+
+def try_lock(file, exclusive):
+    # One attempt at the OS lock; False if another process holds it
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) |
+                        fcntl.LOCK_NB)
+        else:
+            # Windows has no shared locks, so readers lock exclusively too
+            import msvcrt
+
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def unlock(file):
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class FileLock:
+    # Advisory lock on a task file shared by processes, shared for reading
+    # and exclusive for changing it. Threads of one process take turns, and
+    # a thread that already holds it may take it again; the first hold
+    # decides whether it is shared. Where no lock file can be created, e.g.
+    # in a read-only directory, it does not lock at all.
+    def __init__(self, filename):
+        self.filename = filename
+        self.path = filename + LOCK_SUFFIX
+        self.thread_lock = threading.RLock()
+        self.file = None
+        self.depth = 0
+
+    def acquire(self, exclusive=True, timeout=LOCK_TIMEOUT):
+        # True once held; False if it was still busy after timeout seconds
+        deadline = time.monotonic() + timeout
+        if not self.thread_lock.acquire(timeout=timeout):
+            return False
+        if self.depth:
+            self.depth += 1
+            return True
+
+        try:
+            if self.file is None:
+                self.file = open(self.path, 'a+')
+        except OSError:
+            self.depth = 1
+            return True
+        while not try_lock(self.file, exclusive):
+            if time.monotonic() >= deadline:
+                self.thread_lock.release()
+                return False
+            time.sleep(LOCK_RETRY)
+        self.depth = 1
+        return True
+
+    def release(self):
+        self.depth -= 1
+        if not self.depth and self.file is not None:
+            unlock(self.file)
+        self.thread_lock.release()
+
+    @contextmanager
+    def hold(self, exclusive=True, timeout=LOCK_TIMEOUT):
+        # acquire() for a with block; raises TimeoutError if the file stays
+        # busy
+        if not self.acquire(exclusive, timeout):
+            raise TimeoutError(f"{self.filename} is locked by another process, try again later")
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def close(self):
+        if self.file is not None and not self.depth:
+            self.file.close()
+            self.file = None
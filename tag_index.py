@@ -0,0 +1,218 @@
+from itertools import compress
+import re
+import threading
+
+# Tag names are interned: each distinct tag gets a small integer id for the
+# life of the process, and tasks hold a sorted tuple of ids instead of their
+# own copies of the strings. Ids are never written to files.
+TAG_IDS = {}
+TAG_NAMES = []
+# Files are read on a worker thread while the window may be adding tasks
+TAG_LOCK = threading.Lock()
+
+# Tags are lower case words; "#" is allowed in front and dropped
+TAG_PATTERN = re.compile(r"[^\s,#]+")
+TAG_SEPARATORS = re.compile(r"[\s,]+")
+
+# "0"/"1" digits of a binary string to false/true bytes and back
+BIT_BYTES = bytes.maketrans(b"01", b"\x00\x01")
+BIT_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def intern_tag(name):
+    tag_id = TAG_IDS.get(name)
+    if tag_id is None:
+        with TAG_LOCK:
+            tag_id = TAG_IDS.get(name)
+            if tag_id is None:
+                tag_id = len(TAG_NAMES)
+                TAG_NAMES.append(name)
+                TAG_IDS[name] = tag_id
+    return tag_id
+
+
+def intern_tags(names):
+    return tuple(sorted({intern_tag(name) for name in names}))
+
+
+def tag_names(tag_ids):
+    return tuple(TAG_NAMES[tag_id] for tag_id in tag_ids)
+
+
+def check_tag(name):
+    tag = name.strip().lstrip("#").lower()
+    if not TAG_PATTERN.fullmatch(tag):
+        raise ValueError(f"Invalid tag '{name}', use a single word without commas")
+    return tag
+
+
+def check_tags(value):
+    # Tag names from a "work, home" style string or a list of names, sorted
+    # and without duplicates
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        value = [name for name in TAG_SEPARATORS.split(value) if name.strip("#")]
+    elif (not isinstance(value, (list, tuple, set, frozenset)) or
+          not all(isinstance(name, str) for name in value)):
+        raise ValueError("Tags must be a list of names")
+    return tuple(sorted({check_tag(name) for name in value}))
+
+
+def tags_match(tags, all_of=(), any_of=(), none_of=()):
+    # The test TagIndex.query() makes, for the tag names of a single task
+    tags = set(tags)
+    return (tags.issuperset(all_of) and (not any_of or not tags.isdisjoint(any_of)) and
+            tags.isdisjoint(none_of))
+
+
+def bitmap_bits(mask):
+    # One byte per id, true where the id's bit is set. Spelt out through a
+    # binary string, so the work is done in C.
+    return format(mask, "b")[::-1].encode("ascii").translate(BIT_BYTES)
+
+
+def bitmap_ids(mask):
+    # Ids whose bits are set in an integer bitmap, in increasing order
+    bits = bitmap_bits(mask)
+    return list(compress(range(len(bits)), bits))
+
+
+def bitmap_filter(mask, ids):
+    # The ids in ids whose bits are set in an integer bitmap
+    bits = bitmap_bits(mask)
+    size = len(bits)
+    return {task_id for task_id in ids if task_id < size and bits[task_id]}
+
+
+def ids_bitmap(ids):
+    # A bytearray bitmap with the bits of ids set, built one byte per id and
+    # packed through a binary string
+    if not ids:
+        return bytearray()
+    bits = bytearray(max(ids) + 1)
+    for task_id in ids:
+        bits[task_id] = 1
+    mask = int(bits[::-1].translate(BIT_DIGITS), 2)
+    return bytearray(mask.to_bytes((len(bits) + 7) // 8, "little"))
+
+
+def bitmap_count(mask):
+    return bin(mask).count("1")
+
+
+def set_bit(bitmap, position):
+    index = position >> 3
+    if index >= len(bitmap):
+        bitmap.extend(bytes(index + 1 - len(bitmap)))
+    bitmap[index] |= 1 << (position & 7)
+
+
+def clear_bit(bitmap, position):
+    index = position >> 3
+    if index < len(bitmap):
+        bitmap[index] &= ~(1 << (position & 7)) & 0xFF
+
+
+class TagIndex:
+    # One bitmap per tag over task ids, bit n of a tag's bytearray standing
+    # for task n. A tag query turns the bitmaps into integers and combines
+    # them with &, | and ~, so AND/OR/NOT over a million tasks are a few
+    # big-integer operations instead of set operations per task. A bitmap
+    # grows to the highest id carrying its tag, one bit per id.
+    def __init__(self):
+        self.bitmaps = {}
+        # tag id -> number of tasks carrying it
+        self.counts = {}
+        # Every indexed task, tagged or not, for NOT queries
+        self.all_ids = bytearray()
+        # task id -> tag ids, for tagged tasks only
+        self.entries = {}
+
+    def clear(self):
+        self.__init__()
+
+    def rebuild(self, tasks):
+        # Bulk load: ids are collected per tag and each bitmap made at once
+        self.clear()
+        all_ids = []
+        by_tag = {}
+        for task in tasks:
+            all_ids.append(task.id)
+            if task.tag_ids:
+                self.entries[task.id] = task.tag_ids
+                for tag_id in task.tag_ids:
+                    by_tag.setdefault(tag_id, []).append(task.id)
+        self.all_ids = ids_bitmap(all_ids)
+        for tag_id, ids in by_tag.items():
+            self.bitmaps[tag_id] = ids_bitmap(ids)
+            self.counts[tag_id] = len(ids)
+
+    def add(self, task):
+        set_bit(self.all_ids, task.id)
+        if task.tag_ids:
+            self.entries[task.id] = task.tag_ids
+            for tag_id in task.tag_ids:
+                self._tag(tag_id, task.id)
+
+    def update(self, task):
+        old = self.entries.get(task.id, ())
+        if old == task.tag_ids:
+            set_bit(self.all_ids, task.id)
+            return
+        self.remove(task.id)
+        self.add(task)
+
+    def update_many(self, tasks):
+        for task in tasks:
+            self.update(task)
+
+    def remove(self, task_id):
+        clear_bit(self.all_ids, task_id)
+        for tag_id in self.entries.pop(task_id, ()):
+            clear_bit(self.bitmaps[tag_id], task_id)
+            self.counts[tag_id] -= 1
+            if not self.counts[tag_id]:
+                # Unused tags give their memory back
+                del self.counts[tag_id]
+                del self.bitmaps[tag_id]
+
+    def remove_many(self, task_ids):
+        for task_id in task_ids:
+            self.remove(task_id)
+
+    def tag_counts(self):
+        # Tag name -> number of tasks, for every tag in use
+        return {TAG_NAMES[tag_id]: count for tag_id, count in self.counts.items()}
+
+    def query(self, all_of=(), any_of=(), none_of=()):
+        # Integer bitmap of the tasks carrying every tag in all_of, at least
+        # one in any_of (if given) and none in none_of; see bitmap_ids()
+        mask = self.mask(self.all_ids)
+        for name in all_of:
+            mask &= self.tag_mask(name)
+        if any_of:
+            either = 0
+            for name in any_of:
+                either |= self.tag_mask(name)
+            mask &= either
+        for name in none_of:
+            mask &= ~self.tag_mask(name)
+        return mask
+
+    def tag_mask(self, name):
+        tag_id = TAG_IDS.get(name)
+        bitmap = self.bitmaps.get(tag_id) if tag_id is not None else None
+        return 0 if bitmap is None else self.mask(bitmap)
+
+    @staticmethod
+    def mask(bitmap):
+        return int.from_bytes(bitmap, "little")
+
+    def _tag(self, tag_id, task_id):
+        bitmap = self.bitmaps.get(tag_id)
+        if bitmap is None:
+            bitmap = self.bitmaps[tag_id] = bytearray()
+        set_bit(bitmap, task_id)
+        self.counts[tag_id] = self.counts.get(tag_id, 0) + 1
+
@@ -0,0 +1,1099 @@
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+import os
+import time
+
+from perf import PERF, timed
+from recurrence import check_recurrence, occurrences, occurs_between
+from reminders import ReminderIndex
+from search_index import SearchIndex
+from sort_index import SortIndex
+from stats import TaskStats
+from sync import LOCK_TIMEOUT, FileLock, file_stamp, next_version
+from tag_index import check_tags, intern_tags, tag_names, tags_match
+from task_index import TaskIndex, PRIORITIES
+
+CREATED_FORMAT = "%Y-%m-%d %H:%M"
+DUE_DATE_FORMAT = "%Y-%m-%d"
+
+# Task fields that TaskList.update() may change
+TASK_FIELDS = ("description", "priority", "due_date", "completed", "recurrence", "tags")
+
+# Filter names shared by the sidebar and the command line; one priority, one
+# status and one due range can be combined, "All" clears them
+FILTER_NAMES = ("All",) + PRIORITIES + ("Completed", "Incomplete", "This Week")
+
+# Tag filters are a prefix and a tag name, e.g. "tag:work"; any number of
+# them combine as AND, OR and NOT
+TAG_FILTERS = {"tag:": "all_tags", "any-tag:": "any_tags", "not-tag:": "no_tags"}
+
+# How long the journal may grow before it is folded into its file:
+# COMPACT_MIN_ENTRIES records, or one per COMPACT_RATIO tasks for large lists
+COMPACT_MIN_ENTRIES = 1000
+COMPACT_RATIO = 10
+
+# Task ids are whole numbers from 1. The tag bitmaps take one bit per id up
+# to the highest, so ids are capped as well.
+MAX_TASK_ID = 1 << 26
+
+# Set TASK_MANAGER_STORE=columnar to keep tasks in a TaskStore instead of a
+# dict of Task objects, which uses far less memory for very large lists
+TASK_STORE = os.environ.get("TASK_MANAGER_STORE", "dict")
+
+
+def parse_timestamp(text):
+    # Fast path for our own "YYYY-MM-DD HH:MM" format, strptime otherwise
+    try:
+        fields = (int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                  int(text[11:13]), int(text[14:16]), 0, 0, 0, -1)
+    except (TypeError, ValueError):
+        fields = time.strptime(text, CREATED_FORMAT)
+    return int(time.mktime(fields))
+
+
+def format_timestamp(seconds):
+    return time.strftime(CREATED_FORMAT, time.localtime(seconds))
+
+
+def check_task_id(task_id):
+    # None (no id yet) or a valid id; bool is an int subclass but no id
+    if task_id is not None and (type(task_id) is not int or not 0 < task_id <= MAX_TASK_ID):
+        raise ValueError(f"Invalid task id {task_id!r}, use a whole number from 1 to {MAX_TASK_ID}")
+    return task_id
+
+
+def assign_task_id(task, taken, next_id):
+    # Keep an existing id unless it is missing or already in taken; returns
+    # the next free id. An invalid id raises ValueError.
+    check_task_id(task.id)
+    if task.id is None or task.id in taken:
+        while next_id in taken:
+            next_id += 1
+        task.id = next_id
+    return max(next_id, task.id + 1)
+
+
+def check_description(description):
+    if not isinstance(description, str):
+        raise ValueError("The task description must be text")
+    description = description.strip()
+    if not description:
+        raise ValueError("Please enter a task description")
+    return description
+
+
+def check_priority(priority):
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}', use one of {', '.join(PRIORITIES)}")
+    return priority
+
+
+def check_due_date(due_date):
+    # Blank means no due date; anything else must be a date as YYYY-MM-DD.
+    # It is stored zero-padded, e.g. 2026-1-5 as 2026-01-05, since the
+    # indexes, filters and reminders compare due dates as strings.
+    if due_date is None or (isinstance(due_date, str) and not due_date.strip()):
+        return None
+    if not isinstance(due_date, str):
+        raise ValueError("Invalid date format. Please use YYYY-MM-DD")
+    try:
+        parsed = datetime.strptime(due_date.strip(), DUE_DATE_FORMAT)
+    except ValueError:
+        raise ValueError("Invalid date format. Please use YYYY-MM-DD") from None
+    return parsed.date().isoformat()
+
+
+def check_completed(completed):
+    # Only a real boolean; bool("false") would be True
+    if type(completed) is not bool:
+        raise ValueError(f"Invalid completed value {completed!r}, use true or false")
+    return completed
+
+
+FIELD_CHECKS = {
+    "description": check_description,
+    "priority": check_priority,
+    "due_date": check_due_date,
+    "completed": check_completed,
+    "recurrence": check_recurrence,
+    "tags": check_tags,
+}
+
+
+def check_fields(fields):
+    # Validate a mapping of TASK_FIELDS, returning the cleaned values
+    for name in fields:
+        if name not in FIELD_CHECKS:
+            raise ValueError(f"Unknown task field '{name}'")
+    return {name: FIELD_CHECKS[name](value) for name, value in fields.items()}
+
+
+def check_series(recurrence, due_date):
+    # A repeating task's due date is the first date of its series
+    if recurrence and not due_date:
+        raise ValueError("A repeating task needs a due date to start from")
+
+
+def changed_attributes(values):
+    # The Task attributes set_fields() may change for checked values
+    names = ["tag_ids" if name == "tags" else name for name in values]
+    if "completed" in values:
+        names.append("completed_time")
+    return names
+
+
+def detach_task(task):
+    # A Task holding the fields of task, for keeping after it is deleted;
+    # a StoredTask view is copied since its row goes with it
+    if type(task) is Task:
+        return task
+    copy = Task.__new__(Task)
+    for name in Task.__slots__:
+        setattr(copy, name, getattr(task, name))
+    return copy
+
+
+def set_fields(task, values):
+    # Apply checked TASK_FIELDS values; completing a task records when
+    if "completed" in values and values["completed"] != task.completed:
+        task.completed_time = int(time.time()) if values["completed"] else None
+    for name, value in values.items():
+        setattr(task, name, value)
+
+
+def due_in_range(task, due_from, due_to):
+    if task.recurrence and task.due_date:
+        return occurs_between(task.recurrence, task.due_date, due_from, due_to)
+    return bool(task.due_date) and due_from <= task.due_date <= due_to
+
+
+def new_filters():
+    # No filter active; values are filter names from FILTER_NAMES, or tuples
+    # of tag names for the tag filters
+    return {"priority": None, "status": None, "due": None,
+            "all_tags": (), "any_tags": (), "no_tags": ()}
+
+
+def apply_filter(filters, name):
+    # Fold one filter name into filters
+    if name == "All":
+        filters.update(new_filters())
+    elif name in PRIORITIES:
+        filters["priority"] = name
+    elif name in ("Completed", "Incomplete"):
+        filters["status"] = name
+    elif name == "This Week":
+        filters["due"] = name
+    else:
+        for prefix, kind in TAG_FILTERS.items():
+            if name.startswith(prefix):
+                tag = check_tags([name[len(prefix):]])[0]
+                if tag not in filters[kind]:
+                    filters[kind] += (tag,)
+                return filters
+        raise ValueError(f"Unknown filter '{name}'")
+    return filters
+
+
+def clear_tag_filters(filters):
+    filters.update(all_tags=(), any_tags=(), no_tags=())
+    return filters
+
+
+def describe_filters(filters):
+    active = [filters[kind] for kind in ("priority", "status", "due") if filters[kind]]
+    active.extend(f"#{tag}" for tag in filters["all_tags"])
+    if filters["any_tags"]:
+        active.append("(" + " or ".join(f"#{tag}" for tag in filters["any_tags"]) + ")")
+    active.extend(f"not #{tag}" for tag in filters["no_tags"])
+    return " + ".join(active) if active else "All"
+
+
+def week_range(today=None):
+    # The Monday to Sunday week containing today as YYYY-MM-DD strings
+    from datetime import date, timedelta
+
+    today = today or date.today()
+    monday = today - timedelta(days=today.weekday())
+    sunday = monday + timedelta(days=6)
+    return monday.isoformat(), sunday.isoformat()
+
+
+def filter_query(filters):
+    # Turn filters into keyword arguments for TaskList.query() and matches()
+    status = filters["status"]
+    due_from, due_to = week_range() if filters["due"] == "This Week" else (None, None)
+    tags = (filters["all_tags"], filters["any_tags"], filters["no_tags"])
+    return {"priority": filters["priority"],
+            "completed": None if status is None else status == "Completed",
+            "due_from": due_from,
+            "due_to": due_to,
+            "tags": tags if any(tags) else None}
+
+
+class Task:
+    # __slots__ keeps each task free of an instance __dict__, and the creation
+    # time is held as epoch seconds rather than a formatted string
+    __slots__ = ("id", "description", "priority", "due_date", "completed", "created", "recurrence",
+                 "tag_ids", "completed_time", "version")
+
+    def __init__(self, description, priority="Medium", due_date=None, completed=False, task_id=None,
+                 recurrence=None, tags=()):
+        self.id = task_id
+        self.description = description
+        self.priority = priority
+        self.due_date = due_date
+        self.completed = completed
+        self.created = int(time.time())
+        # When the task was completed, as epoch seconds; None while it is
+        # open and for tasks completed before this was recorded
+        self.completed_time = self.created if completed else None
+        # RRULE string of a repeating task, whose series starts at due_date
+        self.recurrence = recurrence
+        # Interned ids of the tag names, see tag_index
+        self.tag_ids = intern_tags(tags)
+        # Version stamp of the last change, see sync.next_version(); 0 for
+        # tasks written before changes were stamped
+        self.version = 0
+
+    @property
+    def tags(self):
+        return tag_names(self.tag_ids)
+
+    @tags.setter
+    def tags(self, names):
+        self.tag_ids = intern_tags(names)
+
+    @property
+    def created_at(self):
+        return format_timestamp(self.created)
+
+    @created_at.setter
+    def created_at(self, value):
+        self.created = parse_timestamp(value)
+
+    @property
+    def completed_at(self):
+        return None if self.completed_time is None else format_timestamp(self.completed_time)
+
+    @completed_at.setter
+    def completed_at(self, value):
+        self.completed_time = None if value is None else parse_timestamp(value)
+
+    def to_dict(self):
+        data = {
+            "id": self.id,
+            "description": self.description,
+            "priority": self.priority,
+            "due_date": self.due_date,
+            "completed": self.completed,
+            "created_at": self.created_at
+        }
+        # Only completed, repeating, tagged and stamped tasks carry these
+        # keys, so other files stay unchanged
+        if self.completed_time is not None:
+            data["completed_at"] = self.completed_at
+        if self.recurrence:
+            data["recurrence"] = self.recurrence
+        if self.tag_ids:
+            data["tags"] = list(self.tags)
+        if self.version:
+            data["version"] = self.version
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        task = cls(data["description"], data["priority"], data["due_date"], data["completed"],
+                   check_task_id(data.get("id")), data.get("recurrence"), data.get("tags") or ())
+        task.created_at = data["created_at"]
+        task.completed_at = data.get("completed_at")
+        task.version = data.get("version", 0)
+        return task
+
+
+class LoadedFile:
+    # What read_task_file() produced, for TaskList.install(): indexes built
+    # over the tasks read, the next free id and journal records to replay,
+    # and what sync needs to pick up later changes: the file's lock, its
+    # stamp when read, the highest version stamp in it and the bytes of the
+    # journal read
+    def __init__(self, filename, index, search_index, reminders, stats, next_id, records,
+                 cancelled, lock=None, stamp=None, version=0, journal_offset=0):
+        self.filename = filename
+        self.index = index
+        self.search_index = search_index
+        self.reminders = reminders
+        self.stats = stats
+        self.next_id = next_id
+        self.records = records
+        self.cancelled = cancelled
+        self.lock = lock
+        self.stamp = stamp
+        self.version = version
+        self.journal_offset = journal_offset
+
+
+def read_task_file(filename, on_batch, progress=None, cancel=None, first_batch=1000,
+                   batch_size=5000, search=True):
+    # Stream tasks from filename with ids assigned, handing them to on_batch
+    # in lists: first_batch tasks first, then batch_size at a time. Touches
+    # no TaskList, so it can run on a worker thread. cancel is an Event that
+    # stops reading early; search=False leaves the search index unbuilt.
+    from journal import journal_path, read_journal_from
+    from storage import open_storage
+
+    loaded = []
+    taken = set()
+    next_id = 1
+    version = 0
+    # The file and its journal are read under the file's lock, so no other
+    # process folds the journal into the file in between
+    lock = FileLock(filename)
+    with lock.hold(exclusive=False):
+        stamp = file_stamp(filename)
+        storage = open_storage(filename)
+        with PERF.timing("load.read"):
+            try:
+                batch = []
+                size = first_batch
+                for task in storage.load(progress):
+                    if cancel is not None and cancel.is_set():
+                        break
+                    next_id = assign_task_id(task, taken, next_id)
+                    taken.add(task.id)
+                    if task.version > version:
+                        version = task.version
+                    loaded.append(task)
+                    batch.append(task)
+                    if len(batch) >= size:
+                        on_batch(batch)
+                        batch = []
+                        size = batch_size
+            finally:
+                storage.close()
+
+        # Changes journaled after the file was last written
+        cancelled = cancel is not None and cancel.is_set()
+        records, journal_offset = [], 0
+        if not cancelled:
+            records, journal_offset = read_journal_from(journal_path(filename), 0)
+    on_batch(batch)
+
+    with PERF.timing("load.index"):
+        index = TaskIndex()
+        index.rebuild(loaded)
+        reminders = ReminderIndex()
+        reminders.rebuild(loaded)
+        stats = TaskStats()
+        stats.rebuild(loaded)
+        search_index = None
+        if search:
+            search_index = SearchIndex()
+            search_index.rebuild(loaded)
+
+    return LoadedFile(filename, index, search_index, reminders, stats, next_id, records,
+                      cancelled, lock, stamp, version, journal_offset)
+
+
+def in_batch(label):
+    # Decorator running a TaskList change as one batch(), so even a single
+    # change is made with the file locked, after catching up with other
+    # processes, and undone as a whole; label names it in the undo history
+    def decorate(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.batch(label):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TaskList:
+    # The task list without any user interface: tasks keyed by their stable
+    # id in insertion order, the filter and search indexes, the changes
+    # since the last save and the journal. TaskManager and cli.py are views
+    # on top of it.
+    def __init__(self, store=TASK_STORE, on_journal_error=None, history=None):
+        self.store = store
+        self.tasks = self.create_store()
+        self.next_task_id = 1
+        self.index = TaskIndex()
+        # None until the first search when a file is read with search=False
+        self.search_index = SearchIndex()
+        # Sorted orders, built for a column the first time it is sorted by
+        self.sort_index = SortIndex()
+        # Upcoming due and overdue reminders, earliest first
+        self.reminders = ReminderIndex()
+        # Counts behind the statistics panel
+        self.stats = TaskStats()
+
+        # Changes since the file in synced_file was last loaded or saved, so
+        # backends that support it only write those
+        self.changed_ids = set()
+        self.deleted_ids = set()
+        self.synced_file = None
+        self.current_file = None
+
+        # Write-ahead journal of changes next to current_file. A failed write
+        # drops the journal and calls on_journal_error, or raises without one.
+        self.journal = None
+        self.on_journal_error = on_journal_error
+        # Journal records held back by batch(): task id -> "put" or "delete"
+        self.pending = None
+
+        # Other processes may change the file too: its lock, its file_stamp()
+        # when this list last read or wrote it, the highest version stamp
+        # journaled or read so far, the stamp changes in the current batch()
+        # get, and the ids other processes changed that no view has shown yet
+        self.file_lock = None
+        self.file_stamp = None
+        self.version = 0
+        self.stamp = 0
+        self.remote_ids = set()
+
+        # UndoHistory recording every batch() for undo() and redo(), or None
+        self.history = history
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self.tasks
+
+    def __getitem__(self, task_id):
+        return self.tasks[task_id]
+
+    def create_store(self):
+        if self.store == "columnar":
+            from task_store import TaskStore
+            return TaskStore()
+        return {}
+
+    def clear(self):
+        self.close()
+        self.tasks = self.create_store()
+        self.next_task_id = 1
+        self.changed_ids = set()
+        self.deleted_ids = set()
+        self.synced_file = None
+        self.current_file = None
+        self.remote_ids = set()
+        self.rebuild_indexes()
+        if self.history is not None:
+            self.history.clear()
+        if self.file_lock is not None:
+            self.file_lock.close()
+            self.file_lock = None
+        self.file_stamp = None
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    @in_batch("Add")
+    def add(self, description, priority="Medium", due_date=None, completed=False,
+            recurrence=None, tags=None):
+        task = Task(check_description(description), check_priority(priority),
+                    check_due_date(due_date), completed, recurrence=check_recurrence(recurrence),
+                    tags=check_tags(tags))
+        check_series(task.recurrence, task.due_date)
+        self.next_task_id = assign_task_id(task, self.tasks, self.next_task_id)
+        self.tasks[task.id] = task
+        task = self.tasks[task.id]
+        self.index.add(task)
+        self.sort_index.add(task)
+        self.reminders.add(task)
+        self.stats.add(task)
+        if self.search_index is not None:
+            self.search_index.add(task.id, task.description)
+        self.mark_changed(task.id)
+        if self.history is not None:
+            self.history.added([task.id])
+        return task
+
+    @in_batch("Edit")
+    def update(self, task_id, **fields):
+        # Change any of TASK_FIELDS; raises KeyError for an unknown task and
+        # ValueError for invalid values, leaving the task untouched
+        task = self.tasks[task_id]
+        values = check_fields(fields)
+        check_series(values.get("recurrence", task.recurrence), values.get("due_date", task.due_date))
+        if self.history is not None:
+            self.history.changed([task], changed_attributes(values))
+        set_fields(task, values)
+
+        self.index.update(task)
+        self.sort_index.update(task)
+        self.reminders.update(task)
+        self.stats.update(task)
+        if "description" in values and self.search_index is not None:
+            self.search_index.update(task.id, task.description)
+        self.mark_changed(task.id)
+        return task
+
+    @in_batch("Status Change")
+    def set_completed(self, task_id, completed=True):
+        return self.update(task_id, completed=completed)
+
+    @in_batch("Delete")
+    def delete(self, task_id):
+        if self.history is not None:
+            self.history.deleted([detach_task(self.tasks[task_id])])
+        del self.tasks[task_id]
+        self.index.remove(task_id)
+        self.sort_index.remove(task_id)
+        self.reminders.remove(task_id)
+        self.stats.remove(task_id)
+        if self.search_index is not None:
+            self.search_index.remove(task_id)
+        self.mark_deleted(task_id)
+
+    @in_batch("Edit")
+    def update_many(self, task_ids, **fields):
+        # update() for many tasks at once with a single index pass and one
+        # journal write. Every id and value is checked before any changes.
+        values = check_fields(fields)
+        tasks = [self.tasks[task_id] for task_id in dict.fromkeys(task_ids)]
+        if "recurrence" in values or "due_date" in values:
+            for task in tasks:
+                check_series(values.get("recurrence", task.recurrence),
+                             values.get("due_date", task.due_date))
+        if self.history is not None:
+            self.history.changed(tasks, changed_attributes(values))
+        for task in tasks:
+            set_fields(task, values)
+        self.reindex_many(tasks, "description" in values)
+        return tasks
+
+    @in_batch("Edit")
+    def restore_fields(self, task_ids, fields, columns):
+        # Put back Task attribute values kept by the undo history, one
+        # column per field in task_ids order, without checking them again.
+        # Tasks deleted meanwhile by another process are left out.
+        rows = [row for row, task_id in enumerate(task_ids) if task_id in self.tasks]
+        tasks = [self.tasks[task_ids[row]] for row in rows]
+        if self.history is not None:
+            self.history.changed(tasks, fields)
+        for name, column in zip(fields, columns):
+            for task, row in zip(tasks, rows):
+                setattr(task, name, column[row])
+        self.reindex_many(tasks, "description" in fields)
+        return tasks
+
+    def reindex_many(self, tasks, description):
+        # One index pass and one journal write for changed tasks
+        self.index.update_many(tasks)
+        self.sort_index.update_many(tasks)
+        self.reminders.update_many(tasks)
+        self.stats.update_many(tasks)
+        if description and self.search_index is not None:
+            for task in tasks:
+                self.search_index.update(task.id, task.description)
+        self.mark_changed(*(task.id for task in tasks))
+
+    @in_batch("Status Change")
+    def set_completed_many(self, task_ids, completed=True):
+        return self.update_many(task_ids, completed=completed)
+
+    @in_batch("Delete")
+    def delete_many(self, task_ids):
+        # Returns the ids deleted; an unknown id raises KeyError first
+        task_ids = list(dict.fromkeys(task_ids))
+        for task_id in task_ids:
+            if task_id not in self.tasks:
+                raise KeyError(task_id)
+        if self.history is not None:
+            self.history.deleted([detach_task(self.tasks[task_id]) for task_id in task_ids])
+        for task_id in task_ids:
+            del self.tasks[task_id]
+        self.index.remove_many(task_ids)
+        self.sort_index.remove_many(task_ids)
+        self.reminders.remove_many(task_ids)
+        self.stats.remove_many(task_ids)
+        if self.search_index is not None:
+            self.search_index.remove_many(task_ids)
+        self.mark_deleted(*task_ids)
+        return task_ids
+
+    @in_batch("Delete")
+    def delete_where(self, predicate):
+        # Delete every task predicate(task) is true for, in one pass
+        return self.delete_many([task_id for task_id, task in self.tasks.items()
+                                 if predicate(task)])
+
+    @in_batch("Delete Completed")
+    def delete_completed(self, older_than_days=None):
+        # Completed tasks, optionally only those created more than
+        # older_than_days ago; found through the index without a full scan
+        task_ids = sorted(self.index.completed)
+        if older_than_days is not None:
+            cutoff = time.time() - older_than_days * 86400
+            task_ids = [task_id for task_id in task_ids if self.tasks[task_id].created < cutoff]
+        return self.delete_many(task_ids)
+
+    @in_batch("Import")
+    def import_tasks(self, tasks):
+        # Append tasks, e.g. from another file; clashing ids get new ones.
+        # Returns the ids they were stored under. Every id is checked before
+        # the first task goes in.
+        tasks = list(tasks)
+        for task in tasks:
+            check_task_id(task.id)
+        imported = []
+        for task in tasks:
+            self.next_task_id = assign_task_id(task, self.tasks, self.next_task_id)
+            self.tasks[task.id] = task
+            imported.append(task.id)
+
+        added = [self.tasks[task_id] for task_id in imported]
+        self.index.update_many(added)
+        self.sort_index.update_many(added)
+        self.reminders.update_many(added)
+        self.stats.update_many(added)
+        if self.search_index is not None:
+            for task in added:
+                self.search_index.add(task.id, task.description)
+        self.mark_changed(*imported)
+        if self.history is not None:
+            self.history.added(imported)
+        return imported
+
+    @in_batch("Import")
+    def restore_tasks(self, tasks):
+        # import_tasks() for tasks the undo history puts back, which would
+        # otherwise end up last. In a dict each goes back in front of the
+        # first task after the lowest of them with a higher id, leaving the
+        # others in their order; a TaskStore whose ids were in order before
+        # is compacted back into id order.
+        in_order = not isinstance(self.tasks, dict) and self.tasks.rows is None
+        imported = self.import_tasks(tasks)
+        if not imported:
+            return imported
+        if isinstance(self.tasks, dict):
+            restored = sorted(imported)
+            restored_ids = set(restored)
+            tail = []
+            for task_id in reversed(self.tasks):
+                if task_id < restored[0]:
+                    break
+                if task_id not in restored_ids:
+                    tail.append(task_id)
+            order = []
+            position = 0
+            for task_id in reversed(tail):
+                while position < len(restored) and restored[position] < task_id:
+                    order.append(restored[position])
+                    position += 1
+                order.append(task_id)
+            order.extend(restored[position:])
+            for task_id in order:
+                self.tasks[task_id] = self.tasks.pop(task_id)
+        elif in_order and self.tasks.rows is not None:
+            self.tasks.compact(by_id=True)
+        return imported
+
+    def import_file(self, filename):
+        from storage import open_storage
+
+        storage = open_storage(filename)
+        try:
+            return self.import_tasks(storage.load())
+        finally:
+            storage.close()
+
+    @timed("query")
+    def query(self, priority=None, completed=None, due_from=None, due_to=None, tags=None,
+              search=None, ids=None, sort=None, descending=False):
+        # Ids of the matching tasks in list order, or ordered by the sort
+        # column (one of sort_index.SORT_KEYS). tags is an (all of, any of,
+        # none of) triple of tag names, search is a search term, ids an
+        # already computed set (e.g. search results) to stay within.
+        task_ids = self.index.query(priority=priority, completed=completed,
+                                    due_from=due_from, due_to=due_to, tags=tags)
+        if search:
+            found = self.search(search)
+            ids = found if ids is None else ids & found
+        if ids is not None:
+            task_ids = ids if task_ids is None else task_ids & ids
+
+        if sort is not None:
+            return self.sort_index.sort(sort, task_ids, self.tasks, descending)
+        if task_ids is None:
+            return list(self.tasks)
+        return sorted(task_ids)
+
+    def sorted_position(self, task_ids, task_id, sort, descending=False):
+        # Index at which task_id belongs in task_ids, a list already returned
+        # by query() with the same sort
+        self.sort_index.order(sort, self.tasks)
+        return self.sort_index.position(sort, task_ids, task_id, descending)
+
+    def matches(self, task, priority=None, completed=None, due_from=None, due_to=None,
+                tags=None, search=None):
+        # The same test as query() for a single task
+        if priority and task.priority != priority:
+            return False
+        if completed is not None and task.completed != completed:
+            return False
+        if due_from and not due_in_range(task, due_from, due_to):
+            return False
+        if tags is not None and not tags_match(task.tags, *tags):
+            return False
+        return not search or SearchIndex.matches(search.lower(), task.description.lower())
+
+    def agenda(self, due_from, due_to):
+        # Sorted (date, id) pairs for the incomplete tasks due between the
+        # two YYYY-MM-DD dates. Repeating tasks contribute each of their
+        # dates in the range, generated for this range only.
+        result = []
+        for task_id in self.index.due_between(due_from, due_to):
+            task = self.tasks[task_id]
+            if task.completed:
+                continue
+            if task.recurrence:
+                result.extend((day, task_id) for day in
+                              occurrences(task.recurrence, task.due_date, due_from, due_to))
+            else:
+                result.append((task.due_date, task_id))
+        result.sort()
+        return result
+
+    def tag_counts(self):
+        # Tag name -> number of tasks carrying it, for every tag in use
+        return self.index.tags.tag_counts()
+
+    def search(self, term):
+        return self.get_search_index().search(term.lower())
+
+    def get_search_index(self):
+        if self.search_index is None:
+            self.search_index = SearchIndex()
+            self.search_index.rebuild(self.tasks.values())
+        return self.search_index
+
+    def rebuild_indexes(self):
+        self.index.rebuild(self.tasks.values())
+        self.sort_index.rebuild(self.tasks.values())
+        self.reminders.rebuild(self.tasks.values())
+        self.stats.rebuild(self.tasks.values())
+        if self.search_index is not None:
+            self.search_index.rebuild(self.tasks.values())
+
+    @contextmanager
+    def batch(self, label=None, wait=True):
+        # Journal every change made inside the block in one write at the end.
+        # The block holds the file's lock and starts from the changes other
+        # processes journaled meanwhile; its own changes share one version
+        # stamp, higher than any of theirs, and are one step in the undo
+        # history, called label. Nested blocks are part of the outer one.
+        # Without wait it raises TimeoutError at once if the file is busy.
+        if self.pending is not None:
+            yield
+            return
+        with self.locked(wait):
+            self.catch_up()
+            self.stamp = next_version(self.version)
+            self.pending = {}
+            if self.history is not None:
+                self.history.begin(label)
+            try:
+                yield
+            finally:
+                pending, self.pending = self.pending, None
+                if self.history is not None:
+                    self.history.end()
+                if pending:
+                    self.version = self.stamp
+                    if self.journal is not None:
+                        self.write_journal(self.journal_records(pending.items()))
+
+    def undo(self):
+        # Revert the latest change in the history as one batch, making it
+        # the next to redo; returns its Step, None if there is none
+        return self.replay(self.history.take_undo(), self.history.push_redo)
+
+    def redo(self):
+        return self.replay(self.history.take_redo(), self.history.push_undo)
+
+    def replay(self, step, keep):
+        # What applying the step's operations records reverts them again,
+        # so it is handed to keep instead of starting a new change
+        if step is None:
+            return None
+        self.history.target = keep
+        try:
+            with self.batch(step.label):
+                for op in reversed(step.ops):
+                    op.apply(self)
+        finally:
+            self.history.target = None
+        return step
+
+    def locked(self, wait=True):
+        # Hold the file's lock exclusively; a list without a file has none
+        if self.file_lock is None:
+            return nullcontext()
+        return self.file_lock.hold(timeout=LOCK_TIMEOUT if wait else 0)
+
+    def mark_changed(self, *task_ids):
+        # Record changes for the next save and journal them in one write
+        for task_id in task_ids:
+            self.tasks[task_id].version = self.stamp
+        self.changed_ids.update(task_ids)
+        self.log_changes("put", task_ids)
+
+    def mark_deleted(self, *task_ids):
+        self.changed_ids.difference_update(task_ids)
+        self.deleted_ids.update(task_ids)
+        self.log_changes("delete", task_ids)
+
+    def log_changes(self, op, task_ids):
+        if self.journal is None:
+            return
+        if self.pending is None:
+            self.write_journal(self.journal_records((task_id, op) for task_id in task_ids))
+            return
+        for task_id in task_ids:
+            # Only the last change to a task matters, in the order made
+            self.pending.pop(task_id, None)
+            self.pending[task_id] = op
+
+    def journal_records(self, changes):
+        from journal import delete_record, put_record
+
+        for task_id, op in changes:
+            if op == "put":
+                yield put_record(self.tasks[task_id])
+            else:
+                yield delete_record(task_id, self.stamp)
+
+    @timed("journal")
+    def write_journal(self, records):
+        try:
+            self.journal.write(records)
+        except OSError as e:
+            self.close()
+            if self.on_journal_error is None:
+                raise
+            self.on_journal_error(e)
+
+    def replay_journal(self, records):
+        # Apply changes that were journaled but never folded into the file:
+        # left by a crash, or made by other processes. They stay pending so
+        # the next compaction writes them out. Returns the ids put and
+        # deleted.
+        from journal import apply_journal
+
+        put_ids, deleted_ids, version = apply_journal(self.tasks, records, Task.from_dict)
+        self.version = max(self.version, version)
+        self.apply_changes(put_ids, deleted_ids)
+        return put_ids, deleted_ids
+
+    def apply_changes(self, put_ids, deleted_ids):
+        # Bring the indexes up to date with tasks already put into or deleted
+        # from self.tasks
+        for task_id in deleted_ids:
+            self.index.remove(task_id)
+            self.sort_index.remove(task_id)
+            self.reminders.remove(task_id)
+            self.stats.remove(task_id)
+            if self.search_index is not None:
+                self.search_index.remove(task_id)
+        for task_id in put_ids:
+            task = self.tasks[task_id]
+            self.index.update(task)
+            self.sort_index.update(task)
+            self.reminders.update(task)
+            self.stats.update(task)
+            if self.search_index is not None:
+                self.search_index.update(task_id, task.description)
+            self.next_task_id = max(self.next_task_id, task_id + 1)
+        self.changed_ids.update(put_ids)
+        self.changed_ids.difference_update(deleted_ids)
+        self.deleted_ids.update(deleted_ids)
+
+    @timed("sync")
+    def catch_up(self):
+        # Apply what other processes changed since this list last read or
+        # wrote its file; runs with the file locked
+        if self.journal is None or self.file_lock is None:
+            return
+        stamp = file_stamp(self.journal.filename)
+        if stamp != self.file_stamp:
+            self.merge_file()
+            self.file_stamp = stamp
+            self.journal.restart()
+        records = self.journal.read_new()
+        if records:
+            self.remote_ids.update(*self.replay_journal(records))
+
+    def merge_file(self):
+        # Another process folded the journal into the file. Every change of
+        # this list was journaled, so the file holds them all: only tasks
+        # stamped later than anything seen here need reading, and tasks
+        # missing from it were deleted.
+        from storage import open_storage
+
+        storage = open_storage(self.journal.filename)
+        try:
+            changed, task_ids = storage.changes(self.version)
+        finally:
+            storage.close()
+        deleted_ids = {task_id for task_id in self.tasks if task_id not in task_ids}
+        for task_id in deleted_ids:
+            del self.tasks[task_id]
+        put_ids = set()
+        for task in changed:
+            self.tasks[task.id] = task
+            self.version = max(self.version, task.version)
+            put_ids.add(task.id)
+        self.apply_changes(put_ids, deleted_ids)
+        # The file holds every change up to here
+        self.changed_ids = set()
+        self.deleted_ids = set()
+        self.remote_ids.update(put_ids, deleted_ids)
+
+    def sync(self, wait=False):
+        # Pick up the changes other processes made, if there are any. A file
+        # another process is changing right now is left for the next call
+        # unless wait is given; returns False then.
+        if self.journal is None or self.file_lock is None:
+            return True
+        if (not self.journal.has_new() and
+                file_stamp(self.journal.filename) == self.file_stamp):
+            return True
+        if not self.file_lock.acquire(exclusive=False, timeout=LOCK_TIMEOUT if wait else 0):
+            return False
+        try:
+            self.catch_up()
+        finally:
+            self.file_lock.release()
+        return True
+
+    def take_remote_changes(self):
+        # Ids other processes changed since the last call, for the views
+        remote_ids, self.remote_ids = self.remote_ids, set()
+        return remote_ids
+
+    def add_loaded(self, tasks):
+        # A batch from read_task_file(); the indexes arrive with install(),
+        # and orders sorted meanwhile are dropped so they are rebuilt then
+        for task in tasks:
+            self.tasks[task.id] = task
+        self.sort_index.clear()
+
+    def keep_partial(self):
+        # Keep the tasks add_loaded() got before a load failed; like a
+        # cancelled load, they are not tied to the file
+        self.rebuild_indexes()
+        self.next_task_id = max(self.tasks, default=0) + 1
+
+    def install(self, loaded):
+        # Finish a load once every batch has been added. A cancelled load is
+        # only part of the file, so it is not tied to it and cannot be saved
+        # back over it.
+        from journal import Journal
+
+        self.index = loaded.index
+        self.search_index = loaded.search_index
+        self.reminders = loaded.reminders
+        self.stats = loaded.stats
+        self.sort_index.clear()
+        self.next_task_id = loaded.next_id
+        self.version = max(self.version, loaded.version)
+        if loaded.records:
+            self.replay_journal(loaded.records)
+        if not loaded.cancelled:
+            self.current_file = loaded.filename
+            self.synced_file = loaded.filename
+            self.journal = Journal(loaded.filename, loaded.journal_offset, len(loaded.records))
+            self.file_lock = loaded.lock
+            self.file_stamp = loaded.stamp
+
+    @timed("load")
+    def load(self, filename, progress=None, search=True):
+        # Replace the list with filename, replaying its journal
+        self.clear()
+        self.install(read_task_file(filename, self.add_loaded, progress, search=search))
+
+    @timed("write")
+    def write(self, filename, compact=False, incremental=False, progress=None):
+        # Write the list to filename. Safe on a worker thread as long as the
+        # list does not change meanwhile; call saved() afterwards. Writing
+        # the list's own file folds its journal in, with the file locked. That
+        # fails if another process did so first: the file would hold changes
+        # not seen here, so catch up and save again.
+        from storage import open_storage, report_progress
+
+        own = (self.journal is not None and self.file_lock is not None and
+               filename == self.journal.filename)
+        with self.locked() if own else nullcontext():
+            if own and file_stamp(filename) != self.file_stamp:
+                raise OSError(f"{filename} was changed by another process, save again")
+            storage = open_storage(filename, compact)
+            try:
+                # Backends that can update in place only get the changed rows
+                if incremental and storage.incremental:
+                    storage.save_changes([self.tasks[task_id] for task_id in self.changed_ids],
+                                         self.deleted_ids)
+                else:
+                    tasks = self.tasks.values()
+                    if progress is not None:
+                        tasks = report_progress(tasks, len(self.tasks), progress)
+                    storage.save(tasks)
+            finally:
+                storage.close()
+            if own:
+                self.journal.fold()
+                self.file_stamp = file_stamp(filename)
+
+    def saved(self, filename, export=False):
+        # filename now holds every change, so its journal can go; write()
+        # already folded the list's own one. An export leaves the list tied
+        # to its current file.
+        from journal import Journal
+
+        if self.journal is not None and self.journal.filename == filename:
+            journal = self.journal
+        else:
+            journal = Journal(filename)
+            journal.reset()
+        if export:
+            return
+
+        if self.journal is not journal:
+            self.close()
+            if self.file_lock is not None:
+                self.file_lock.close()
+            self.file_lock = FileLock(filename)
+            self.file_stamp = file_stamp(filename)
+        self.journal = journal
+        self.changed_ids = set()
+        self.deleted_ids = set()
+        self.synced_file = filename
+        self.current_file = filename
+
+    def save(self, filename, compact=False, progress=None):
+        # Catching up first means writing back to a shared file cannot fail
+        with self.locked():
+            self.catch_up()
+            self.write(filename, compact, filename == self.synced_file, progress)
+        self.saved(filename)
+
+    def export(self, filename, compact=False, progress=None):
+        self.write(filename, compact, progress=progress)
+        self.saved(filename, export=True)
+
+    def is_journaled(self):
+        # True when every change is already in a short journal next to
+        # current_file, so there is nothing worth saving yet
+        return (self.journal is not None and self.journal.filename == self.current_file and
+                not self.needs_compaction())
+
+    def needs_compaction(self):
+        return self.journal is not None and self.journal.entries >= self.compact_threshold()
+
+    def compact_threshold(self):
+        return max(COMPACT_MIN_ENTRIES, len(self.tasks) // COMPACT_RATIO)
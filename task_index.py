@@ -0,0 +1,220 @@
+from bisect import bisect_left, bisect_right, insort
+
+from recurrence import occurs_between
+from tag_index import TagIndex, bitmap_count, bitmap_filter, bitmap_ids
+
+PRIORITIES = ("High", "Medium", "Low")
+
+# Bulk changes touching at least this many due dates rebuild the sorted due
+# date list in one pass instead of moving entries one at a time
+BULK_DUE_CHANGES = 64
+
+
+class TaskIndex:
+    # Secondary indexes over the task list so filters cost time proportional
+    # to the number of matching tasks instead of the size of the list
+    def __init__(self):
+        self.by_priority = {priority: set() for priority in PRIORITIES}
+        self.completed = set()
+        self.incomplete = set()
+        # Sorted (due_date, id) pairs; YYYY-MM-DD strings sort by date
+        self.by_due_date = []
+        # Last indexed (priority, completed, due_date) for each task id
+        self.entries = {}
+        # Repeating tasks: id -> (rule, series start). Their dates are not
+        # listed in by_due_date beyond the start; due_between() asks the rule.
+        self.recurring = {}
+        # Tag bitmaps for the tag filters
+        self.tags = TagIndex()
+
+    def clear(self):
+        self.__init__()
+
+    def rebuild(self, tasks):
+        # Bulk load, sorting the due dates once at the end
+        self.clear()
+        for task in tasks:
+            entry = (task.priority, task.completed, task.due_date)
+            self.entries[task.id] = entry
+            self.by_priority.setdefault(entry[0], set()).add(task.id)
+            (self.completed if entry[1] else self.incomplete).add(task.id)
+            if entry[2]:
+                self.by_due_date.append((entry[2], task.id))
+            self._set_recurring(task)
+        self.by_due_date.sort()
+        self.tags.rebuild(tasks)
+
+    def add(self, task):
+        entry = (task.priority, task.completed, task.due_date)
+        self.entries[task.id] = entry
+        self._insert(task.id, entry)
+        self._set_recurring(task)
+        self.tags.add(task)
+
+    def remove(self, task_id):
+        entry = self.entries.pop(task_id, None)
+        self.recurring.pop(task_id, None)
+        self.tags.remove(task_id)
+        if entry is not None:
+            self._discard(task_id, entry)
+
+    def update(self, task):
+        # Only touch the indexes whose key actually changed
+        old = self.entries.get(task.id)
+        if old is None:
+            self.add(task)
+            return
+
+        self._set_recurring(task)
+        self.tags.update(task)
+        new = (task.priority, task.completed, task.due_date)
+        if old == new:
+            return
+        self.entries[task.id] = new
+
+        if old[0] != new[0]:
+            self.by_priority.get(old[0], set()).discard(task.id)
+            self.by_priority.setdefault(new[0], set()).add(task.id)
+        if old[1] != new[1]:
+            (self.completed if old[1] else self.incomplete).discard(task.id)
+            (self.completed if new[1] else self.incomplete).add(task.id)
+        if old[2] != new[2]:
+            self._remove_due(task.id, old[2])
+            if new[2]:
+                insort(self.by_due_date, (new[2], task.id))
+
+    def remove_many(self, task_ids):
+        # Like remove() for each id, with the due date list fixed up once
+        dropped = []
+        for task_id in task_ids:
+            entry = self.entries.pop(task_id, None)
+            self.recurring.pop(task_id, None)
+            self.tags.remove(task_id)
+            if entry is None:
+                continue
+            priority, completed, due_date = entry
+            self.by_priority.get(priority, set()).discard(task_id)
+            (self.completed if completed else self.incomplete).discard(task_id)
+            if due_date:
+                dropped.append((due_date, task_id))
+        self._move_due(dropped, [])
+
+    def update_many(self, tasks):
+        # Like update() for each task, with the due date list fixed up once
+        moved = []
+        added = []
+        for task in tasks:
+            self._set_recurring(task)
+            self.tags.update(task)
+            old = self.entries.get(task.id)
+            new = (task.priority, task.completed, task.due_date)
+            if old == new:
+                continue
+            self.entries[task.id] = new
+            if old is None:
+                old = (None, None, None)
+            else:
+                self.by_priority.get(old[0], set()).discard(task.id)
+                (self.completed if old[1] else self.incomplete).discard(task.id)
+            self.by_priority.setdefault(new[0], set()).add(task.id)
+            (self.completed if new[1] else self.incomplete).add(task.id)
+            if old[2] != new[2]:
+                if old[2]:
+                    moved.append((old[2], task.id))
+                if new[2]:
+                    added.append((new[2], task.id))
+        self._move_due(moved, added)
+
+    def query(self, priority=None, completed=None, due_from=None, due_to=None, tags=None):
+        # Returns the set of matching task ids, or None when no filter is set.
+        # Filters are combined by intersecting, starting from the smallest set.
+        # tags is an (all of, any of, none of) triple of tag names.
+        sets = []
+        if priority is not None:
+            sets.append(self.by_priority.get(priority, set()))
+        if completed is not None:
+            sets.append(self.completed if completed else self.incomplete)
+        if due_from is not None or due_to is not None:
+            sets.append(self.due_between(due_from, due_to))
+
+        mask = None
+        if tags is not None:
+            mask = self.tags.query(*tags)
+            # The tag matches join the other sets unless they are the larger
+            # side, then the other sets are checked against the bitmap instead
+            if not sets or bitmap_count(mask) < min(len(ids) for ids in sets):
+                sets.append(bitmap_ids(mask))
+                mask = None
+
+        if not sets:
+            return None
+
+        sets.sort(key=len)
+        result = set(sets[0])
+        for other in sets[1:]:
+            if not result:
+                break
+            result.intersection_update(other)
+        if mask is not None and result:
+            result = bitmap_filter(mask, result)
+        return result
+
+    def due_between(self, due_from=None, due_to=None):
+        # Ids of tasks due in [due_from, due_to], both YYYY-MM-DD and optional
+        start = 0 if due_from is None else bisect_left(self.by_due_date, (due_from,))
+        if due_to is None:
+            end = len(self.by_due_date)
+        else:
+            # Any id sorts after the bare date tuple, so use the next string
+            end = bisect_right(self.by_due_date, (due_to + "\x00",))
+        result = {task_id for _, task_id in self.by_due_date[start:end]}
+
+        # A repeating task matches if any of its dates falls in the range;
+        # only the dates in this range are generated
+        for task_id, (rule, series_start) in self.recurring.items():
+            if occurs_between(rule, series_start, due_from, due_to):
+                result.add(task_id)
+            else:
+                result.discard(task_id)
+        return result
+
+    def _set_recurring(self, task):
+        if task.recurrence and task.due_date:
+            self.recurring[task.id] = (task.recurrence, task.due_date)
+        else:
+            self.recurring.pop(task.id, None)
+
+    def _insert(self, task_id, entry):
+        priority, completed, due_date = entry
+        self.by_priority.setdefault(priority, set()).add(task_id)
+        (self.completed if completed else self.incomplete).add(task_id)
+        if due_date:
+            insort(self.by_due_date, (due_date, task_id))
+
+    def _discard(self, task_id, entry):
+        priority, completed, due_date = entry
+        self.by_priority.get(priority, set()).discard(task_id)
+        (self.completed if completed else self.incomplete).discard(task_id)
+        self._remove_due(task_id, due_date)
+
+    def _move_due(self, removed, added):
+        # Drop the (due_date, id) pairs in removed and insert those in added
+        if len(removed) + len(added) < BULK_DUE_CHANGES:
+            for due_date, task_id in removed:
+                self._remove_due(task_id, due_date)
+            for pair in added:
+                insort(self.by_due_date, pair)
+            return
+        if removed:
+            removed = set(removed)
+            self.by_due_date = [pair for pair in self.by_due_date if pair not in removed]
+        # Mostly sorted already, so this is close to linear
+        self.by_due_date.extend(added)
+        self.by_due_date.sort()
+
+    def _remove_due(self, task_id, due_date):
+        if not due_date:
+            return
+        position = bisect_left(self.by_due_date, (due_date, task_id))
+        if position < len(self.by_due_date) and self.by_due_date[position] == (due_date, task_id):
+            del self.by_due_date[position]
@@ -0,0 +1,351 @@
+from array import array
+from bisect import bisect_left
+import copy
+from collections.abc import MutableMapping
+from datetime import date
+
+from task_core import Task, format_timestamp, parse_timestamp
+from task_index import PRIORITIES
+
+# due_days values that are not date ordinals
+NO_DUE_DATE = 0
+RAW_DUE_DATE = -1
+
+# completed_times value of a task without a completion time
+NO_COMPLETED_TIME = -1
+
+# Compact once this many rows or description bytes are dead, and they are
+# at least half of the store
+COMPACT_MIN = 1024
+
+
+def due_to_days(due_date):
+    if not due_date:
+        return NO_DUE_DATE
+    try:
+        return date(int(due_date[0:4]), int(due_date[5:7]), int(due_date[8:10])).toordinal()
+    except (TypeError, ValueError):
+        return RAW_DUE_DATE
+
+
+class StoredTask:
+    # A view of one row of a TaskStore; reads and writes go straight to the
+    # columns, so holding one costs two references
+    __slots__ = ("store", "id")
+
+    def __init__(self, store, task_id):
+        self.store = store
+        self.id = task_id
+
+    @property
+    def description(self):
+        return self.store.get_description(self.store.row_of(self.id))
+
+    @description.setter
+    def description(self, value):
+        self.store.set_description(self.store.row_of(self.id), value)
+
+    @property
+    def priority(self):
+        return self.store.priority_names[self.store.priorities[self.store.row_of(self.id)]]
+
+    @priority.setter
+    def priority(self, value):
+        self.store.priorities[self.store.row_of(self.id)] = self.store.priority_code(value)
+
+    @property
+    def due_date(self):
+        return self.store.get_due_date(self.store.row_of(self.id))
+
+    @due_date.setter
+    def due_date(self, value):
+        self.store.set_due_date(self.store.row_of(self.id), value)
+
+    @property
+    def completed(self):
+        return self.store.get_completed(self.store.row_of(self.id))
+
+    @completed.setter
+    def completed(self, value):
+        self.store.set_completed(self.store.row_of(self.id), value)
+
+    @property
+    def created(self):
+        return self.store.created[self.store.row_of(self.id)]
+
+    @created.setter
+    def created(self, value):
+        self.store.created[self.store.row_of(self.id)] = value
+
+    @property
+    def completed_time(self):
+        seconds = self.store.completed_times[self.store.row_of(self.id)]
+        return None if seconds == NO_COMPLETED_TIME else seconds
+
+    @completed_time.setter
+    def completed_time(self, value):
+        self.store.completed_times[self.store.row_of(self.id)] = (
+            NO_COMPLETED_TIME if value is None else value)
+
+    completed_at = Task.completed_at
+
+    @property
+    def recurrence(self):
+        return self.store.recurrence.get(self.store.row_of(self.id))
+
+    @recurrence.setter
+    def recurrence(self, value):
+        self.store.set_recurrence(self.store.row_of(self.id), value)
+
+    @property
+    def tag_ids(self):
+        return self.store.tag_ids.get(self.store.row_of(self.id), ())
+
+    @tag_ids.setter
+    def tag_ids(self, value):
+        self.store.set_tag_ids(self.store.row_of(self.id), value)
+
+    tags = Task.tags
+
+    @property
+    def version(self):
+        return self.store.versions[self.store.row_of(self.id)]
+
+    @version.setter
+    def version(self, value):
+        self.store.versions[self.store.row_of(self.id)] = value
+
+    @property
+    def created_at(self):
+        return format_timestamp(self.created)
+
+    @created_at.setter
+    def created_at(self, value):
+        self.created = parse_timestamp(value)
+
+    to_dict = Task.to_dict
+
+
+class TaskStore(MutableMapping):
+    # Columnar task storage with the same id -> task mapping interface as the
+    # plain dict TaskManager uses: interned priority codes, a completion
+    # bitmap, epoch-int dates in arrays and all descriptions in one UTF-8
+    # buffer. Tasks are handed out as StoredTask views.
+    def __init__(self):
+        # Row -> id. Ids normally arrive in increasing order, so rows are
+        # found by bisecting this array; an out of order id switches to the
+        # id -> row dict instead
+        self.ids = array("q")
+        self.rows = None
+        self.dead = bytearray()
+        self.live_count = 0
+        self.priority_names = list(PRIORITIES)
+        self.priority_codes = {name: code for code, name in enumerate(PRIORITIES)}
+        self.priorities = bytearray()
+        self.completed_bits = bytearray()
+        # Due dates as date ordinals, creation and completion times as epoch
+        # seconds
+        self.due_days = array("l")
+        self.created = array("q")
+        self.completed_times = array("q")
+        self.versions = array("q")
+        # Due dates that are not YYYY-MM-DD, kept verbatim by row
+        self.raw_due = {}
+        # Recurrence rules by row; few tasks repeat, so only theirs are kept
+        self.recurrence = {}
+        # Interned tag ids by row, for tagged tasks only
+        self.tag_ids = {}
+        self.text = bytearray()
+        self.text_start = array("q")
+        self.text_length = array("l")
+        self.dead_text = 0
+
+    def __len__(self):
+        return self.live_count
+
+    def __iter__(self):
+        ids = self.ids
+        dead = self.dead
+        for row in range(len(ids)):
+            if not dead[row >> 3] & (1 << (row & 7)):
+                yield ids[row]
+
+    def __contains__(self, task_id):
+        return self.find_row(task_id) is not None
+
+    def __getitem__(self, task_id):
+        if self.find_row(task_id) is None:
+            raise KeyError(task_id)
+        return StoredTask(self, task_id)
+
+    def __setitem__(self, task_id, task):
+        row = self.find_row(task_id, include_dead=True)
+        if row is None:
+            row = self.append_row(task_id)
+        elif self.is_dead(row):
+            # Its description was counted as dead when it was deleted
+            self.dead[row >> 3] &= ~(1 << (row & 7)) & 0xFF
+            self.live_count += 1
+        else:
+            self.dead_text += self.text_length[row]
+
+        self.text_start[row] = len(self.text)
+        encoded = task.description.encode("utf-8")
+        self.text += encoded
+        self.text_length[row] = len(encoded)
+        self.priorities[row] = self.priority_code(task.priority)
+        self.set_due_date(row, task.due_date)
+        self.set_completed(row, task.completed)
+        self.set_recurrence(row, task.recurrence)
+        self.set_tag_ids(row, task.tag_ids)
+        self.created[row] = task.created
+        self.completed_times[row] = (NO_COMPLETED_TIME if task.completed_time is None
+                                     else task.completed_time)
+        self.versions[row] = task.version
+
+    def __delitem__(self, task_id):
+        row = self.row_of(task_id)
+        self.dead[row >> 3] |= 1 << (row & 7)
+        self.live_count -= 1
+        self.dead_text += self.text_length[row]
+        self.raw_due.pop(row, None)
+        self.recurrence.pop(row, None)
+        self.tag_ids.pop(row, None)
+
+        dead_rows = len(self.ids) - self.live_count
+        if dead_rows >= COMPACT_MIN and dead_rows * 2 >= len(self.ids):
+            self.compact()
+
+    def find_row(self, task_id, include_dead=False):
+        if self.rows is not None:
+            row = self.rows.get(task_id)
+        else:
+            row = bisect_left(self.ids, task_id)
+            if row == len(self.ids) or self.ids[row] != task_id:
+                return None
+        if row is None or (not include_dead and self.is_dead(row)):
+            return None
+        return row
+
+    def row_of(self, task_id):
+        row = self.find_row(task_id)
+        if row is None:
+            raise KeyError(task_id)
+        return row
+
+    def is_dead(self, row):
+        return bool(self.dead[row >> 3] & (1 << (row & 7)))
+
+    def append_row(self, task_id):
+        row = len(self.ids)
+        if self.rows is None and row and task_id < self.ids[-1]:
+            self.rows = {row_id: row_number for row_number, row_id in enumerate(self.ids)}
+        if self.rows is not None:
+            self.rows[task_id] = row
+
+        self.ids.append(task_id)
+        self.live_count += 1
+        self.priorities.append(0)
+        if row & 7 == 0:
+            self.dead.append(0)
+            self.completed_bits.append(0)
+        self.due_days.append(NO_DUE_DATE)
+        self.created.append(0)
+        self.completed_times.append(NO_COMPLETED_TIME)
+        self.versions.append(0)
+        self.text_start.append(0)
+        self.text_length.append(0)
+        return row
+
+    def priority_code(self, name):
+        code = self.priority_codes.get(name)
+        if code is None:
+            code = len(self.priority_names)
+            if code > 255:
+                raise ValueError(f"Too many distinct priorities, cannot store '{name}'")
+            self.priority_names.append(name)
+            self.priority_codes[name] = code
+        return code
+
+    def get_description(self, row):
+        start = self.text_start[row]
+        return self.text[start:start + self.text_length[row]].decode("utf-8")
+
+    def set_description(self, row, value):
+        # Edits append to the buffer; the old bytes are reclaimed by compact()
+        encoded = value.encode("utf-8")
+        self.dead_text += self.text_length[row]
+        self.text_start[row] = len(self.text)
+        self.text_length[row] = len(encoded)
+        self.text += encoded
+        if self.dead_text >= COMPACT_MIN and self.dead_text * 2 >= len(self.text):
+            self.compact()
+
+    def get_due_date(self, row):
+        days = self.due_days[row]
+        if days == NO_DUE_DATE:
+            return None
+        if days == RAW_DUE_DATE:
+            return self.raw_due[row]
+        return date.fromordinal(days).isoformat()
+
+    def set_due_date(self, row, value):
+        days = due_to_days(value)
+        self.due_days[row] = days
+        if days == RAW_DUE_DATE:
+            self.raw_due[row] = value
+        else:
+            self.raw_due.pop(row, None)
+
+    def set_recurrence(self, row, value):
+        if value:
+            self.recurrence[row] = value
+        else:
+            self.recurrence.pop(row, None)
+
+    def set_tag_ids(self, row, value):
+        if value:
+            self.tag_ids[row] = value
+        else:
+            self.tag_ids.pop(row, None)
+
+    def get_completed(self, row):
+        return bool(self.completed_bits[row >> 3] & (1 << (row & 7)))
+
+    def set_completed(self, row, value):
+        if value:
+            self.completed_bits[row >> 3] |= 1 << (row & 7)
+        else:
+            self.completed_bits[row >> 3] &= ~(1 << (row & 7)) & 0xFF
+
+    def compact(self, by_id=False):
+        # Rewrite the columns without deleted rows or dead description bytes;
+        # by_id also puts the rows in id order
+        old = copy.copy(self)
+        self.__init__()
+        self.priority_names = old.priority_names
+        self.priority_codes = old.priority_codes
+
+        old_rows = range(len(old.ids))
+        if by_id:
+            old_rows = sorted(old_rows, key=old.ids.__getitem__)
+        for old_row in old_rows:
+            if old.is_dead(old_row):
+                continue
+            row = self.append_row(old.ids[old_row])
+            start = old.text_start[old_row]
+            self.text_start[row] = len(self.text)
+            self.text += old.text[start:start + old.text_length[old_row]]
+            self.text_length[row] = old.text_length[old_row]
+            self.priorities[row] = old.priorities[old_row]
+            self.due_days[row] = old.due_days[old_row]
+            if old_row in old.raw_due:
+                self.raw_due[row] = old.raw_due[old_row]
+            if old_row in old.recurrence:
+                self.recurrence[row] = old.recurrence[old_row]
+            if old_row in old.tag_ids:
+                self.tag_ids[row] = old.tag_ids[old_row]
+            self.set_completed(row, old.get_completed(old_row))
+            self.created[row] = old.created[old_row]
+            self.completed_times[row] = old.completed_times[old_row]
+            self.versions[row] = old.versions[old_row]
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from journal import journal_path
+from server import TaskServer
+from task_core import TaskList
+
+
+def records(tasks):
+    return [task.to_dict() for task in tasks.tasks.values()]
+
+
+def journal_size(filename):
+    path = journal_path(filename)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+@pytest.fixture
+def server(tmp_path):
+    filename = str(tmp_path / "tasks.json")
+    tasks = TaskList()
+    tasks.add("Weekly", due_date="2026-01-05", recurrence="FREQ=WEEKLY")
+    tasks.add("Once", "High", "2026-02-01")
+    tasks.add("Tagged", tags=["work"])
+    tasks.save(filename)
+    tasks.close()
+    server = TaskServer(filename)
+    yield server
+    asyncio.run(server.close())
+
+
+def post_batch(server, data):
+    body = json.dumps(data).encode()
+    return asyncio.run(server.dispatch("POST", "/tasks/batch", {}, body))
+
+
+def test_batch_applies_everything_in_one_journal_write(server):
+    status, result = post_batch(server, {"add": [{"description": "New", "tags": ["home"]}],
+                                         "update": [{"id": 2, "completed": True},
+                                                    {"id": 3, "description": "Renamed"}],
+                                         "delete": [1]})
+    assert status == 200
+    assert result == {"added": [4], "imported": [], "updated": 2, "deleted": 1}
+    with open(journal_path(server.filename)) as journal:
+        assert len(journal.readlines()) == 4
+    assert sorted(server.tasks.tasks) == [2, 3, 4]
+    assert server.tasks[2].completed and server.tasks[3].description == "Renamed"
+
+
+@pytest.mark.parametrize("data, status", [
+    # A bad entry anywhere fails the whole batch
+    ({"add": [{"description": "Fine"}, {"description": ""}]}, 400),
+    ({"add": [{"description": "Fine"}], "update": [{"id": 2, "priority": "Urgent"}]}, 400),
+    ({"add": [{"description": "Fine"}], "delete": [2, 99]}, 404),
+    ({"update": [{"id": 2, "completed": True}, {"id": 99, "completed": True}]}, 404),
+    ({"import": [{"id": 7, "description": "Fine", "priority": "Low", "due_date": None,
+                  "completed": False, "created_at": "2026-01-01 10:00"}, {"id": 8}]}, 400),
+    ({"add": [{"description": "Fine"}], "import": [{"id": -3, "description": "Bad id",
+                                                    "priority": "Low", "due_date": None,
+                                                    "completed": False,
+                                                    "created_at": "2026-01-01 10:00"}]}, 400),
+    # Taking the series' start away leaves a repeat rule without dates
+    ({"add": [{"description": "Fine"}], "update": [{"id": 1, "due_date": None}]}, 400),
+    # Checked against the earlier updates of the same batch
+    ({"update": [{"id": 2, "recurrence": "FREQ=DAILY"}, {"id": 2, "due_date": None}]}, 400),
+    ({"update": [{"id": 2, "recurrence": "FREQ=HOURLY"}]}, 400),
+    # Values of the wrong JSON type
+    ({"update": [{"id": 2, "completed": "false"}]}, 400),
+    ({"add": [{"description": "Fine", "completed": 1}]}, 400),
+    ({"add": [{"description": 5}]}, 400),
+    ({"add": [{"description": None}]}, 400),
+    ({"add": [{"description": "Fine", "due_date": 5}]}, 400),
+    ({"add": [{"description": "Fine", "recurrence": ["FREQ=DAILY"]}]}, 400),
+    ({"add": [{"description": "Fine"}], "delete": [[1]]}, 400),
+    ({"add": [{"description": "Fine"}], "delete": "ab"}, 400),
+    ({"add": [{"description": "Fine"}], "delete": [True]}, 400),
+    ({"update": [{"id": [1], "completed": True}]}, 400),
+    ({"add": {"description": "Fine"}}, 400),
+])
+def test_a_failing_batch_changes_nothing(server, data, status):
+    before = records(server.tasks)
+    journaled = journal_size(server.filename)
+    assert post_batch(server, data)[0] == status
+    assert records(server.tasks) == before
+    assert server.tasks.next_task_id == 4
+    assert journal_size(server.filename) == journaled
+    assert server.tasks.query(completed=True) == []
+
+
+def test_bulk_changes_check_every_id_first():
+    tasks = TaskList()
+    for description in ("One", "Two", "Three"):
+        tasks.add(description)
+    before = records(tasks)
+    with pytest.raises(KeyError):
+        tasks.delete_many([1, 2, 42])
+    with pytest.raises(KeyError):
+        tasks.set_completed_many([3, 42])
+    with pytest.raises(ValueError):
+        tasks.update_many([1, 2], priority="Urgent")
+    assert records(tasks) == before
+    assert tasks.query(completed=True) == []
+
+
+@pytest.mark.parametrize("method, path, data", [
+    ("POST", "/tasks", {"description": "Fine", "completed": "false"}),
+    ("POST", "/tasks", {"description": 5}),
+    ("PATCH", "/tasks/2", {"completed": "no"}),
+    ("PATCH", "/tasks/2", {"due_date": 20260101}),
+])
+def test_single_changes_refuse_values_of_the_wrong_type(server, method, path, data):
+    before = records(server.tasks)
+    status, result = asyncio.run(server.dispatch(method, path, {}, json.dumps(data).encode()))
+    assert status == 400 and "error" in result
+    assert records(server.tasks) == before
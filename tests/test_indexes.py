@@ -0,0 +1,152 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from sort_index import SORT_KEYS
+from task_core import PRIORITIES, Task, TaskList
+from undo import UndoHistory
+
+TODAY = date.today()
+TAGS = ("work", "home", "urgent", "later")
+WORDS = ("report", "garden", "invoice", "call", "groceries", "review")
+
+
+def day(offset):
+    return (TODAY + timedelta(days=offset)).isoformat()
+
+
+def random_task(rng, task_id=None):
+    task = Task(f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(0, 99)}",
+                rng.choice(PRIORITIES),
+                rng.choice([None, day(rng.randint(-20, 20))]),
+                rng.random() < 0.3,
+                task_id,
+                tags=rng.sample(TAGS, rng.randint(0, 2)))
+    if task.due_date and rng.random() < 0.1:
+        task.recurrence = "FREQ=WEEKLY"
+    return task
+
+
+def snapshot(tasks):
+    # Everything the indexes answer, as plain values to compare
+    result = {"ids": sorted(tasks.tasks),
+              "tags": tasks.tag_counts(),
+              "summary": tasks.stats.summary(TODAY.isoformat()),
+              "next_reminder": tasks.reminders.next_time()}
+    for priority in PRIORITIES + (None,):
+        for completed in (True, False, None):
+            result[priority, completed] = sorted(tasks.query(priority=priority,
+                                                             completed=completed))
+    result["week"] = sorted(tasks.query(due_from=day(0), due_to=day(6)))
+    result["agenda"] = tasks.agenda(day(-7), day(7))
+    for tag in TAGS:
+        result["tag", tag] = sorted(tasks.query(tags=((tag,), (), ())))
+        result["not-tag", tag] = sorted(tasks.query(tags=((), (), (tag,))))
+    for word in WORDS:
+        result["search", word] = sorted(tasks.query(search=word))
+    for column in SORT_KEYS:
+        result["sort", column] = tasks.query(sort=column)
+    return result
+
+
+def assert_indexes_consistent(tasks):
+    # Maintained indexes answer exactly what indexes built from scratch do
+    maintained = snapshot(tasks)
+    tasks.sort_index.clear()
+    tasks.rebuild_indexes()
+    assert snapshot(tasks) == maintained
+
+
+@pytest.fixture(params=["dict", "columnar"])
+def tasks(request):
+    rng = random.Random(4)
+    tasks = TaskList(store=request.param)
+    tasks.import_tasks(random_task(rng) for _ in range(300))
+    # Build every sorted order so changes have to keep them up to date
+    for column in SORT_KEYS:
+        tasks.query(sort=column)
+    return tasks
+
+
+def test_indexes_after_import(tasks):
+    rng = random.Random(5)
+    # Clashing ids are given new ones, the others are kept
+    imported = tasks.import_tasks([random_task(rng, task_id) for task_id in (1, 2, 500, 501)] +
+                                  [random_task(rng) for _ in range(100)])
+    assert imported[2:4] == [500, 501]
+    assert len(set(imported)) == len(imported) == 104
+    assert_indexes_consistent(tasks)
+
+
+def test_indexes_after_delete(tasks):
+    rng = random.Random(6)
+    tasks.delete(7)
+    tasks.delete_many(rng.sample(sorted(tasks.tasks), 120))
+    tasks.delete_completed()
+    assert not tasks.query(completed=True)
+    assert_indexes_consistent(tasks)
+
+
+def test_indexes_after_mixed_changes(tasks):
+    rng = random.Random(7)
+    for _ in range(200):
+        task_ids = sorted(tasks.tasks)
+        choice = rng.random()
+        if choice < 0.2 or len(task_ids) < 10:
+            tasks.import_tasks([random_task(rng) for _ in range(rng.randint(1, 80))])
+        elif choice < 0.4:
+            tasks.delete_many(rng.sample(task_ids, min(len(task_ids), rng.randint(1, 80))))
+        elif choice < 0.7:
+            tasks.update(rng.choice(task_ids), description=f"{rng.choice(WORDS)} edited",
+                         priority=rng.choice(PRIORITIES), tags=rng.sample(TAGS, 1))
+        else:
+            tasks.set_completed_many(rng.sample(task_ids, min(len(task_ids), 100)),
+                                     rng.random() < 0.5)
+    assert_indexes_consistent(tasks)
+
+
+def test_indexes_after_undo_of_import_and_delete():
+    rng = random.Random(8)
+    tasks = TaskList(history=UndoHistory())
+    tasks.import_tasks(random_task(rng) for _ in range(200))
+    before = snapshot(tasks)
+    tasks.import_tasks(random_task(rng) for _ in range(50))
+    tasks.delete_many(range(1, 150, 3))
+    tasks.undo()
+    tasks.undo()
+    assert snapshot(tasks) == before
+    assert_indexes_consistent(tasks)
+
+
+def test_invalid_ids_are_refused_before_importing():
+    tasks = TaskList()
+    for task_id in (0, -3, True, "5", 1 << 40):
+        with pytest.raises(ValueError):
+            tasks.import_tasks([Task("fine", task_id=8), Task("bad", task_id=task_id)])
+    assert len(tasks) == 0
+    assert tasks.tag_counts() == {}
+
+
+def test_due_dates_are_stored_zero_padded():
+    tasks = TaskList()
+    task = tasks.add("Unpadded", due_date=" 2026-1-5 ")
+    assert task.due_date == "2026-01-05"
+    tasks.update(task.id, due_date="2026-2-3")
+    assert tasks[task.id].due_date == "2026-02-03"
+    assert tasks.query(due_from="2026-02-01", due_to="2026-02-28") == [task.id]
+    assert tasks.reminders.next_time() is not None
+    with pytest.raises(ValueError):
+        tasks.add("Impossible", due_date="2026-02-30")
+
+
+def test_search_candidates_deleted_before_verifying_are_dropped():
+    tasks = TaskList()
+    for description in ("write report", "read report", "re"):
+        tasks.add(description)
+    index = tasks.search_index
+    candidates = sorted(index.candidates("report"))
+    tasks.delete(1)
+    assert index.verify("report", candidates) == [2]
+    tasks.delete(3)
+    assert index.verify("re", [1, 2, 3]) == [2]
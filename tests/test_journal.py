@@ -0,0 +1,103 @@
+import json
+import os
+
+from journal import journal_path
+from task_core import TaskList
+
+
+def records(tasks):
+    return [task.to_dict() for task in tasks.tasks.values()]
+
+
+def saved_list(filename):
+    tasks = TaskList()
+    tasks.add("First", "High")
+    tasks.add("Second", due_date="2026-05-01")
+    tasks.add("Third", tags=["home"])
+    tasks.save(filename)
+    return tasks
+
+
+def reload(filename):
+    tasks = TaskList()
+    tasks.load(filename)
+    return tasks
+
+
+def crash(tasks):
+    # Drop the list without saving, as if the process died
+    tasks.close()
+    tasks.file_lock.close()
+
+
+def test_changes_are_replayed_from_the_journal_after_a_crash(tmp_path):
+    filename = str(tmp_path / "tasks.json")
+    tasks = saved_list(filename)
+    with open(filename) as file:
+        on_disk = file.read()
+
+    tasks.add("Fourth", "Low")
+    tasks.update(1, description="First, edited", completed=True)
+    tasks.delete(2)
+    with tasks.batch():
+        tasks.set_completed_many([3, 4])
+    expected = records(tasks)
+    crash(tasks)
+
+    with open(filename) as file:
+        assert file.read() == on_disk
+    recovered = reload(filename)
+    assert records(recovered) == expected
+    assert recovered.next_task_id == 5
+    assert recovered.query(completed=True) == [1, 3, 4]
+
+
+def test_a_half_written_last_record_is_skipped(tmp_path):
+    filename = str(tmp_path / "tasks.json")
+    tasks = saved_list(filename)
+    tasks.add("Journaled")
+    expected = records(tasks)
+    crash(tasks)
+    with open(journal_path(filename), "a") as journal:
+        journal.write('{"op":"put","task":{"id":9,"descr')
+
+    recovered = reload(filename)
+    assert records(recovered) == expected
+    # The next record starts on a line of its own, so it is read back too
+    recovered.add("After the crash")
+    expected = records(recovered)
+    crash(recovered)
+    assert records(reload(filename)) == expected
+
+
+def test_saving_folds_the_journal_into_the_file(tmp_path):
+    filename = str(tmp_path / "tasks.json")
+    tasks = saved_list(filename)
+    tasks.delete(3)
+    tasks.add("Fourth")
+    assert tasks.is_journaled()
+    with open(journal_path(filename)) as journal:
+        assert [json.loads(line)["op"] for line in journal] == ["delete", "put"]
+
+    tasks.save(filename)
+    assert not os.path.exists(journal_path(filename))
+    expected = records(tasks)
+    crash(tasks)
+    assert records(reload(filename)) == expected
+
+
+def test_replay_keeps_changes_pending_for_the_next_save(tmp_path):
+    filename = str(tmp_path / "tasks.db")
+    tasks = saved_list(filename)
+    tasks.update(2, priority="Low")
+    tasks.delete(1)
+    crash(tasks)
+
+    recovered = reload(filename)
+    assert recovered.changed_ids == {2}
+    assert recovered.deleted_ids == {1}
+    recovered.save(filename)
+    expected = records(recovered)
+    crash(recovered)
+    assert not os.path.exists(journal_path(filename))
+    assert records(reload(filename)) == expected
@@ -0,0 +1,158 @@
+import sqlite3
+
+import pytest
+
+from storage import JsonStorage, SqliteStorage, open_storage
+from task_core import Task, TaskList, assign_task_id, read_task_file
+
+
+def sample_list():
+    tasks = TaskList()
+    tasks.add("Plain")
+    tasks.add("Due, high", "High", "2026-03-01")
+    tasks.add("Done", "Low", completed=True)
+    tasks.add("Weekly", due_date="2026-01-05", recurrence="FREQ=WEEKLY;BYDAY=MO")
+    tasks.add("Tagged ünïcode \"quoted\"", tags=["work", "home"])
+    # Files from before due dates were checked may hold anything
+    tasks.import_tasks([Task("Odd due date", due_date="someday")])
+    tasks.delete(1)
+    return tasks
+
+
+def records(tasks):
+    return [task.to_dict() for task in tasks.tasks.values()]
+
+
+def reload(filename, store="dict"):
+    tasks = TaskList(store=store)
+    tasks.load(filename)
+    return tasks
+
+
+@pytest.mark.parametrize("store", ["dict", "columnar"])
+def test_json_and_sqlite_round_trip_the_same_tasks(tmp_path, store):
+    tasks = sample_list()
+    json_file = str(tmp_path / "tasks.json")
+    db_file = str(tmp_path / "tasks.db")
+    tasks.export(json_file)
+    tasks.export(db_file)
+    assert records(reload(json_file, store)) == records(tasks)
+    assert records(reload(db_file, store)) == records(tasks)
+
+
+def test_converting_between_formats_keeps_every_field(tmp_path):
+    json_file = str(tmp_path / "tasks.json")
+    db_file = str(tmp_path / "tasks.db")
+    back_file = str(tmp_path / "back.json")
+    sample_list().save(json_file)
+    reload(json_file).export(db_file)
+    reload(db_file).export(back_file)
+    with open(json_file) as original, open(back_file) as converted:
+        assert original.read() == converted.read()
+
+
+def test_sqlite_saves_only_changes_and_reloads_them(tmp_path):
+    db_file = str(tmp_path / "tasks.db")
+    tasks = sample_list()
+    tasks.save(db_file)
+    tasks.update(2, description="Changed", tags=["later"])
+    tasks.delete(3)
+    added = tasks.add("New", due_date="2026-02-02")
+    assert tasks.changed_ids == {2, added.id}
+    assert tasks.deleted_ids == {3}
+    tasks.save(db_file)
+    tasks.close()
+    assert records(reload(db_file)) == records(tasks)
+
+
+def test_storage_counts_and_changes(tmp_path):
+    tasks = sample_list()
+    for filename in ("tasks.json", "tasks.db"):
+        path = str(tmp_path / filename)
+        tasks.export(path)
+        storage = open_storage(path)
+        try:
+            version = tasks[4].version
+            changed, task_ids = storage.changes(version - 1)
+            assert task_ids == set(tasks.tasks)
+            assert [task.id for task in changed] == [task_id for task_id in tasks.tasks
+                                                      if tasks[task_id].version >= version]
+            if isinstance(storage, SqliteStorage):
+                assert storage.count() == len(tasks)
+        finally:
+            storage.close()
+
+
+def test_old_sqlite_databases_gain_the_new_columns(tmp_path):
+    db_file = str(tmp_path / "old.db")
+    connection = sqlite3.connect(db_file)
+    with connection:
+        connection.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY, description TEXT NOT NULL, "
+                           "priority TEXT NOT NULL, due_date TEXT, "
+                           "completed INTEGER NOT NULL DEFAULT 0, created_at INTEGER NOT NULL)")
+        connection.execute("INSERT INTO tasks VALUES (3, 'Old', 'High', NULL, 1, 1700000000)")
+        connection.execute("CREATE INDEX tasks_priority ON tasks (priority)")
+    connection.close()
+
+    tasks = reload(db_file)
+    task = tasks[3]
+    assert (task.description, task.priority, task.completed, task.created) == ("Old", "High", True,
+                                                                               1700000000)
+    assert (task.recurrence, task.tags, task.completed_time, task.version) == (None, (), None, 0)
+    tasks.update(3, tags=["kept"])
+    tasks.save(db_file)
+    assert reload(db_file)[3].tags == ("kept",)
+    connection = sqlite3.connect(db_file)
+    indexes = connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+    connection.close()
+    assert indexes == [("tasks_version",)]
+
+
+def test_json_file_that_is_not_a_list_is_refused(tmp_path):
+    path = tmp_path / "bad.json"
+    path.write_text('{"description": "not a list"}')
+    with pytest.raises(ValueError):
+        list(JsonStorage(str(path)).load())
+    path.write_text('[{"id": 1, "description": "cut short", "priority": "Low"')
+    with pytest.raises(ValueError):
+        list(JsonStorage(str(path)).load())
+
+
+def test_tasks_kept_from_a_failed_load_never_share_ids(tmp_path):
+    path = tmp_path / "broken.json"
+    path.write_text('[{"id": 1, "description": "loaded 1", "priority": "Low", "due_date": null, '
+                    '"completed": false, "created_at": "2026-01-01 10:00"},\n'
+                    '{"description": "loaded 2", "priority": "Low", "due_date": null, '
+                    '"completed": false, "created_at": "2026-01-01 10:00"},\n'
+                    '{"id": 3, "description": "cut short"')
+    tasks = TaskList()
+    with pytest.raises(ValueError):
+        read_task_file(str(path), tasks.add_loaded, first_batch=1, batch_size=1)
+    tasks.keep_partial()
+    added = tasks.add("new")
+    assert [task.description for task in tasks.tasks.values()] == ["loaded 1", "loaded 2", "new"]
+    assert added.id == 3
+
+
+def test_assigned_ids_skip_the_ones_taken():
+    taken = {1, 2, 3, 5}
+    task = Task("clashing", task_id=2)
+    next_id = assign_task_id(task, taken, 1)
+    assert (task.id, next_id) == (4, 5)
+    task = Task("new")
+    assert assign_task_id(task, taken | {4}, next_id) == 7
+    assert task.id == 6
+
+
+@pytest.mark.parametrize("text, message", [
+    ('[{"id": 1, "description": "no priority", "due_date": null, "completed": false, '
+     '"created_at": "2026-01-01 10:00"}]', "task record 1 is invalid, missing 'priority'"),
+    ('[{"id": 1, "description": "fine", "priority": "Low", "due_date": null, "completed": false, '
+     '"created_at": "2026-01-01 10:00"}, 1]', "task record 2 is invalid, not a task record"),
+])
+def test_bad_json_records_are_reported_with_file_and_number(tmp_path, text, message):
+    path = tmp_path / "bad.json"
+    path.write_text(text)
+    with pytest.raises(ValueError, match=message) as error:
+        list(JsonStorage(str(path)).load())
+    assert str(error.value).startswith(str(path))
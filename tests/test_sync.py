@@ -0,0 +1,105 @@
+import pytest
+
+from task_core import TaskList
+
+
+def records(tasks):
+    return sorted((task.to_dict() for task in tasks.tasks.values()), key=lambda data: data["id"])
+
+
+def open_list(filename):
+    tasks = TaskList()
+    tasks.load(filename)
+    return tasks
+
+
+@pytest.fixture(params=["tasks.json", "tasks.db"])
+def pair(tmp_path, request):
+    # Two lists on one file, as two processes would have them
+    filename = str(tmp_path / request.param)
+    tasks = TaskList()
+    tasks.add("Shared one")
+    tasks.add("Shared two", "High")
+    tasks.save(filename)
+    tasks.close()
+    first, second = open_list(filename), open_list(filename)
+    yield first, second
+    for tasks in (first, second):
+        tasks.close()
+        tasks.file_lock.close()
+
+
+def test_changes_start_from_the_other_lists_changes(pair):
+    first, second = pair
+    added = first.add("From first")
+    # second catches up before its change, so its new task gets another id
+    other = second.add("From second")
+    assert other.id == added.id + 1
+    assert second[added.id].description == "From first"
+    assert first.sync()
+    assert first.take_remote_changes() == {other.id}
+    assert records(first) == records(second)
+
+
+def test_edits_and_deletes_merge_both_ways(pair):
+    first, second = pair
+    first.update(1, description="Edited by first", tags=["mine"])
+    second.delete(2)
+    second.set_completed(1)
+    first.sync()
+    assert first[1].description == "Edited by first" and first[1].completed
+    assert 2 not in first
+    assert records(first) == records(second)
+    # The indexes follow the merged changes too
+    assert first.query(completed=True) == [1]
+    assert first.tag_counts() == {"mine": 1}
+
+
+def test_changes_survive_the_other_list_saving(pair):
+    first, second = pair
+    second.add("Seen by first only after the save")
+    first.add("Folded in")
+    first.save(first.current_file)
+    # second reads what first folded into the file before changing it
+    second.update(3, priority="Low")
+    assert [task.description for task in second.tasks.values()] == [
+        "Shared one", "Shared two", "Seen by first only after the save", "Folded in"]
+    second.save(second.current_file)
+    first.sync()
+    assert records(first) == records(second)
+    assert records(open_list(first.current_file)) == records(first)
+
+
+def test_the_later_change_to_a_task_wins(pair):
+    first, second = pair
+    first.update(1, description="Earlier")
+    second.update(1, description="Later")
+    first.sync()
+    assert first[1].description == second[1].description == "Later"
+    assert first[1].version == second[1].version
+
+
+def test_a_locked_file_refuses_changes_without_waiting(pair):
+    first, second = pair
+    with first.batch():
+        first.add("Not journaled until the batch ends")
+        # The other list cannot change the file meanwhile
+        with pytest.raises(TimeoutError):
+            with second.batch(wait=False):
+                second.add("Refused")
+        assert second.sync() and len(second) == 2
+    assert second.sync()
+    assert len(second) == 3
+
+
+def test_reads_leave_a_busy_file_for_later(pair):
+    first, second = pair
+    first.add("Journaled")
+    assert first.file_lock.acquire(timeout=0)
+    try:
+        assert not second.sync()
+        assert len(second) == 2
+    finally:
+        first.file_lock.release()
+    assert second.sync()
+    assert len(second) == 3
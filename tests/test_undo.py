@@ -0,0 +1,138 @@
+import pytest
+
+from task_core import Task, TaskList
+from undo import UndoHistory
+
+
+def records(tasks):
+    # In list order, which undo keeps as well. Undoing is a change of its
+    # own, so it stamps a new version.
+    return [{key: value for key, value in task.to_dict().items() if key != "version"}
+            for task in tasks.tasks.values()]
+
+
+def make_list(store="dict", budget=1 << 20):
+    tasks = TaskList(store=store, history=UndoHistory(budget))
+    with tasks.batch("Setup"):
+        for number in range(1, 11):
+            tasks.add(f"Task {number}", ("High", "Medium", "Low")[number % 3],
+                      f"2026-04-{number:02}", tags=["even"] if number % 2 == 0 else None)
+    return tasks
+
+
+def changes(tasks):
+    # A step of every kind
+    tasks.add("Added", due_date="2026-06-01", recurrence="FREQ=MONTHLY")
+    tasks.update(2, description="Edited", priority="Low", tags=["odd"])
+    tasks.set_completed(3)
+    tasks.delete(4)
+    tasks.set_completed_many([5, 6, 7])
+    tasks.delete_many([1, 8, 9])
+    tasks.import_tasks([Task("Imported", task_id=30), Task("Imported too", "High")])
+    tasks.delete_completed()
+
+
+@pytest.mark.parametrize("store", ["dict", "columnar"])
+def test_undo_and_redo_round_trip(store):
+    tasks = make_list(store)
+    states = [records(tasks)]
+    labels = []
+    for change in (lambda: tasks.add("Added", due_date="2026-06-01", recurrence="FREQ=MONTHLY"),
+                   lambda: tasks.update(2, description="Edited", priority="Low", tags=["odd"]),
+                   lambda: tasks.set_completed(3),
+                   lambda: tasks.delete(4),
+                   lambda: tasks.set_completed_many([5, 6, 7]),
+                   lambda: tasks.delete_many([1, 8, 9]),
+                   lambda: tasks.import_tasks([Task("Imported", task_id=30), Task("Imported too")]),
+                   tasks.delete_completed):
+        change()
+        states.append(records(tasks))
+        labels.append(tasks.history.undo_label())
+
+    for state, label in zip(reversed(states[:-1]), reversed(labels)):
+        assert tasks.undo().describe() == label
+        assert records(tasks) == state
+    assert tasks.history.undo_label() == "Setup (10 tasks)"
+    for state, label in zip(states[1:], labels):
+        assert tasks.redo().describe() == label
+        assert records(tasks) == state
+    assert tasks.redo() is None
+
+
+def test_undoing_a_delete_keeps_the_order_of_the_other_tasks():
+    tasks = make_list()
+    # A task put back under its old id ends up last, out of id order
+    tasks.delete(4)
+    tasks.import_tasks([Task("Back again", task_id=4)])
+    tasks.set_completed_many([3, 5, 9])
+    before = records(tasks)
+    tasks.delete_completed()
+    tasks.undo()
+    assert records(tasks) == before
+    assert list(tasks.tasks) == [1, 2, 3, 5, 6, 7, 8, 9, 10, 4]
+
+
+def test_labels_describe_each_step():
+    tasks = make_list()
+    changes(tasks)
+    labels = []
+    while tasks.history.undo_label() != "Setup (10 tasks)":
+        labels.append(tasks.undo().describe())
+    assert labels == ["Delete Completed (4 tasks)", "Import (2 tasks)", "Delete (3 tasks)",
+                      "Status Change (3 tasks)", "Delete", "Status Change", "Edit", "Add"]
+
+
+def test_a_new_change_clears_redo():
+    tasks = make_list()
+    tasks.update(1, description="Changed")
+    tasks.undo()
+    assert tasks.history.redo_label() == "Edit"
+    tasks.add("Something else")
+    assert tasks.history.redo_label() is None
+    assert tasks.redo() is None
+    assert tasks[1].description == "Task 1"
+
+
+def test_changes_that_change_nothing_are_not_steps():
+    tasks = make_list()
+    tasks.delete_many([])
+    tasks.import_tasks([])
+    tasks.delete_completed()
+    assert tasks.history.undo_label() == "Setup (10 tasks)"
+
+
+def test_the_oldest_steps_go_once_the_budget_is_used():
+    tasks = make_list(budget=2000)
+    for number in range(50):
+        tasks.update(1, description=f"Edit {number}")
+        assert tasks.history.size <= 2000
+    undone = 0
+    while tasks.undo() is not None:
+        undone += 1
+    assert 0 < undone < 50
+    assert tasks[1].description == f"Edit {49 - undone}"
+
+
+def test_undo_is_journaled_and_skips_tasks_others_deleted(tmp_path):
+    filename = str(tmp_path / "tasks.json")
+    tasks = make_list()
+    tasks.save(filename)
+    other = TaskList()
+    other.load(filename)
+
+    tasks.set_completed_many([1, 2, 3])
+    other.delete(2)
+    tasks.undo()
+    assert [task_id for task_id in (1, 2, 3) if task_id in tasks] == [1, 3]
+    assert not tasks[1].completed and not tasks[3].completed
+    tasks.redo()
+    assert tasks.query(completed=True) == [1, 3]
+
+    other.sync()
+    assert records(other) == records(tasks)
+    for tasks_list in (tasks, other):
+        tasks_list.close()
+        tasks_list.file_lock.close()
+    reloaded = TaskList()
+    reloaded.load(filename)
+    assert records(reloaded) == records(other)
@@ -0,0 +1,197 @@
+from array import array
+from collections import deque
+import os
+import sys
+
+# Set TASK_MANAGER_UNDO_MB to the memory, in MiB, the window's undo history
+# may hold; once it is full the oldest changes are forgotten first
+UNDO_BUDGET = int(os.environ.get("TASK_MANAGER_UNDO_MB", "64")) << 20
+
+# Rough sizes behind UndoHistory.size: a reference, and what holding on to a
+# task costs beyond its description
+REF_BYTES = 8
+TASK_BYTES = 200
+
+# Steps record changes as the small inverse operations below, never as
+# copies of the list. Applying one through TaskList changes it back, and
+# what that change records is in turn the operation that redoes it.
+
+
+class Removal:
+    # Undoes adding tasks by deleting them again
+    def __init__(self, task_ids):
+        self.task_ids = array("q", task_ids)
+
+    def __len__(self):
+        return len(self.task_ids)
+
+    def size(self):
+        return self.task_ids.itemsize * len(self.task_ids)
+
+    def merge(self, other):
+        if not isinstance(other, Removal):
+            return False
+        self.task_ids.extend(other.task_ids)
+        return True
+
+    def apply(self, tasks):
+        # Tasks another process deleted meanwhile are already gone
+        tasks.delete_many([task_id for task_id in self.task_ids if task_id in tasks])
+
+
+class Insertion:
+    # Undoes deleting tasks by putting them back under their ids; tasks are
+    # detached Task objects no list holds any more
+    def __init__(self, tasks):
+        self.tasks = list(tasks)
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def size(self):
+        return sum(TASK_BYTES + len(task.description) for task in self.tasks)
+
+    def merge(self, other):
+        if not isinstance(other, Insertion):
+            return False
+        self.tasks.extend(other.tasks)
+        return True
+
+    def apply(self, tasks):
+        tasks.restore_tasks(self.tasks)
+
+
+class FieldChange:
+    # Undoes an edit by putting back the old values of the Task attributes
+    # it changed: one column of values per attribute, in task_ids order
+    def __init__(self, task_ids, fields, columns):
+        self.task_ids = array("q", task_ids)
+        self.fields = fields
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.task_ids)
+
+    def size(self):
+        # Small ints, None and booleans are shared; strings, timestamps and
+        # tag tuples may be kept alive by the history alone
+        size = self.task_ids.itemsize * len(self.task_ids)
+        for column in self.columns:
+            size += REF_BYTES * len(column)
+            size += sum(sys.getsizeof(value) for value in column
+                        if type(value) in (str, int, tuple))
+        return size
+
+    def merge(self, other):
+        return False
+
+    def apply(self, tasks):
+        tasks.restore_fields(self.task_ids, self.fields, self.columns)
+
+
+class Step:
+    # One undoable change: everything a single TaskList batch did, as the
+    # operations reverting it, applied last to first
+    def __init__(self, label):
+        self.label = label
+        self.ops = []
+        self.size = 0
+
+    def add(self, op):
+        if not self.ops or not self.ops[-1].merge(op):
+            self.ops.append(op)
+
+    def count(self):
+        return sum(len(op) for op in self.ops)
+
+    def describe(self):
+        count = self.count()
+        return self.label if count == 1 else f"{self.label} ({count} tasks)"
+
+
+class UndoHistory:
+    # Undo and redo stacks of Steps, newest last, within a memory budget.
+    # TaskList.batch() opens a step with begin() and closes it with end();
+    # the changes in between report their inverse through added(),
+    # deleted() and changed().
+    def __init__(self, budget=UNDO_BUDGET):
+        self.budget = budget
+        self.undo_steps = deque()
+        self.redo_steps = deque()
+        self.size = 0
+        # The step being recorded, and where end() puts it: None for a new
+        # change, which also clears the redo stack
+        self.current = None
+        self.target = None
+
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+        self.size = 0
+
+    def begin(self, label):
+        self.current = Step(label or "Change")
+
+    def end(self):
+        step, self.current = self.current, None
+        if step is None or not step.ops:
+            return
+        step.size = sum(op.size() for op in step.ops)
+        if self.target is not None:
+            self.target(step)
+            return
+        while self.redo_steps:
+            self.size -= self.redo_steps.pop().size
+        self.push_undo(step)
+
+    def added(self, task_ids):
+        if self.current is not None and task_ids:
+            self.current.add(Removal(task_ids))
+
+    def deleted(self, tasks):
+        if self.current is not None and tasks:
+            self.current.add(Insertion(tasks))
+
+    def changed(self, tasks, fields):
+        # Called before the tasks change, with the attributes that will
+        if self.current is not None and tasks:
+            self.current.add(FieldChange([task.id for task in tasks], fields,
+                                         [[getattr(task, name) for task in tasks]
+                                          for name in fields]))
+
+    def push_undo(self, step):
+        self.undo_steps.append(step)
+        self.size += step.size
+        self.evict()
+
+    def push_redo(self, step):
+        self.redo_steps.append(step)
+        self.size += step.size
+        self.evict()
+
+    def take_undo(self):
+        return self.take(self.undo_steps)
+
+    def take_redo(self):
+        return self.take(self.redo_steps)
+
+    def take(self, steps):
+        if not steps:
+            return None
+        step = steps.pop()
+        self.size -= step.size
+        return step
+
+    def evict(self):
+        # Oldest first: the bottom of the undo stack, then the redo step
+        # furthest away. A step larger than the whole budget is not kept.
+        while self.size > self.budget and self.undo_steps:
+            self.size -= self.undo_steps.popleft().size
+        while self.size > self.budget and self.redo_steps:
+            self.size -= self.redo_steps.popleft().size
+
+    def undo_label(self):
+        return self.undo_steps[-1].describe() if self.undo_steps else None
+
+    def redo_label(self):
+        return self.redo_steps[-1].describe() if self.redo_steps else None